@@ -52,6 +52,8 @@ check_apper()
 try:
     from .apper import apper
     from .commands.QRCodeMaker import QRCodeMaker
+    from .commands.QRBatchMaker import QRBatchMaker
+    from .commands.QRTrace import QRTrace
 
     my_addin = apper.FusionApp(config.app_name, config.company_name, False)
     my_addin.root_path = config.app_path
@@ -87,6 +89,34 @@ try:
         }
     )
 
+    my_addin.add_command(
+        'Batch QR Codes',
+        QRBatchMaker,
+        {
+            'cmd_description': 'Generate a grid of QR Codes from a csv or jsonl list of messages.',
+            'cmd_id': 'batch_qr',
+            'workspace': 'FusionSolidEnvironment',
+            'toolbar_panel_id': 'Commands',
+            'cmd_resources': 'make_qr_icons',
+            'command_visible': True,
+            'command_promoted': False
+        }
+    )
+
+    my_addin.add_command(
+        'QR Trace',
+        QRTrace,
+        {
+            'cmd_description': 'Record timing of the QR Code preview stages and save it as JSON or a Chrome trace.',
+            'cmd_id': 'trace_qr',
+            'workspace': 'FusionSolidEnvironment',
+            'toolbar_panel_id': 'Commands',
+            'cmd_resources': 'make_qr_icons',
+            'command_visible': True,
+            'command_promoted': False
+        }
+    )
+
 except:
     app = adsk.core.Application.get()
     ui = app.userInterface
@@ -103,4 +133,3 @@ def run(context):
 
 def stop(context):
     my_addin.stop_app()
-
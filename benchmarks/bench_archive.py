@@ -0,0 +1,155 @@
+"""
+Check the QR archive against separate csv files and time fetching codes from both.
+
+A library of codes is written as one csv file per code and as a single archive.  Every code must read
+back identical by key and by position, and the time to fetch a random code from each is compared.  Damaged
+copies of a small archive, with a bad magic, a cut off end, a malformed hash table or offsets past the end of
+the file, must fail to open with a ValueError, a lookup in a hash table without an empty slot must end, and
+matrices that are not a QR code size must not be written.
+
+    python -m benchmarks.bench_archive
+"""
+import csv
+import os
+import random
+import struct
+import tempfile
+import time
+
+from core import encoder
+from core.archive import ArchiveReader, pack_files, write_archive
+from core.matrix import QRMatrix
+
+COUNT = 1000
+
+# Offsets of the header fields and the first index row, see the layout in core.archive
+_COUNT_OFFSET = 8
+_SLOTS_OFFSET = 12
+_INDEX_START = 16
+_ENTRY_SIZE = 20
+
+
+def _read_csv(file_name):
+    with open(file_name, newline='') as f:
+        return QRMatrix.from_rows(csv.reader(f))
+
+
+def _patched(data: bytes, *patches) -> bytes:
+    data = bytearray(data)
+    for fmt, offset, value in patches:
+        struct.pack_into(fmt, data, offset, value)
+    return bytes(data)
+
+
+def _damaged_archives(data: bytes, slots: int):
+    table = _INDEX_START + 3 * _ENTRY_SIZE
+    yield 'bad magic', _patched(data, ('<4s', 0, b'QRCX'))
+    yield 'cut off', data[:-1]
+    yield 'slots not a power of two', _patched(data, ('<I', _SLOTS_OFFSET, slots - 2))
+    yield 'fewer slots than entries', _patched(data, ('<I', _SLOTS_OFFSET, 2))
+    yield 'table past the end', _patched(data, ('<I', _SLOTS_OFFSET, 1 << 20))
+    yield 'entries past the end', _patched(data, ('<I', _COUNT_OFFSET, 1 << 24))
+    yield 'key past the end', _patched(data, ('<I', _INDEX_START, len(data)))
+    yield 'data past the end', _patched(data, ('<Q', _INDEX_START + 12, len(data)))
+    yield 'version 0', _patched(data, ('<H', _INDEX_START + 8, 0))
+    yield 'version 41', _patched(data, ('<H', table - _ENTRY_SIZE + 8, 41))
+
+
+def check_damaged(directory: str) -> int:
+    failures = 0
+    archive_name = os.path.join(directory, 'small.qra')
+    write_archive(archive_name, [(f'QR-{k}', encoder.encode(f'SN-{k}', version=k + 1)) for k in range(3)])
+    with open(archive_name, 'rb') as f:
+        data = f.read()
+    slots = struct.unpack_from('<I', data, _SLOTS_OFFSET)[0]
+
+    damaged_name = os.path.join(directory, 'damaged.qra')
+    for label, damaged in _damaged_archives(data, slots):
+        with open(damaged_name, 'wb') as f:
+            f.write(damaged)
+        try:
+            ArchiveReader(damaged_name).close()
+        except ValueError:
+            continue
+        failures += 1
+        print(f'{label}: archive opened')
+
+    # Every slot taken, a key that is not there has to stop after one pass over the table
+    table = _INDEX_START + 3 * _ENTRY_SIZE
+    with open(damaged_name, 'wb') as f:
+        f.write(_patched(data, *[('<I', table + 4 * slot, slot % 3 + 1) for slot in range(slots)]))
+    with ArchiveReader(damaged_name) as reader:
+        if reader.get('missing') is not None or reader['QR-1'] != encoder.encode('SN-1', version=2):
+            failures += 1
+            print('full hash table: wrong lookup')
+
+    with open(damaged_name, 'wb') as f:
+        f.write(_patched(data, *[('<I', table + 4 * slot, 9) for slot in range(slots)]))
+    with ArchiveReader(damaged_name) as reader:
+        try:
+            reader.find('missing')
+            failures += 1
+            print('slot past the last entry: no error')
+        except ValueError:
+            pass
+
+    for size in (5, 22, 181):
+        try:
+            write_archive(damaged_name, [('bad', QRMatrix(size, bytes(size * size)))])
+            failures += 1
+            print(f'{size}x{size} matrix written')
+        except ValueError:
+            pass
+    return failures
+
+
+def run(seed=1):
+    rng = random.Random(seed)
+    codes = {f'QR-{k:05d}': encoder.encode(f'SN-{k:05d}', version=rng.randint(1, 10)) for k in range(COUNT)}
+    mismatches = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_names = []
+        for key, qr_data in codes.items():
+            file_name = os.path.join(directory, f'{key}.csv')
+            with open(file_name, 'w', newline='') as f:
+                csv.writer(f).writerows(qr_data.to_rows())
+            file_names.append(file_name)
+
+        archive_name = os.path.join(directory, 'library.qra')
+        start = time.perf_counter()
+        pack_files(archive_name, file_names)
+        print(f'Packed {COUNT} files in {time.perf_counter() - start:.2f} s, '
+              f'archive {os.path.getsize(archive_name)} bytes, '
+              f'csv {sum(os.path.getsize(name) for name in file_names)} bytes')
+
+        lookups = [rng.choice(list(codes)) for _ in range(COUNT)]
+
+        start = time.perf_counter()
+        for key in lookups:
+            _read_csv(os.path.join(directory, f'{key}.csv'))
+        csv_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ArchiveReader(archive_name) as reader:
+            for key in lookups:
+                reader[key]
+            archive_time = time.perf_counter() - start
+
+            for number, (key, qr_data) in enumerate(codes.items()):
+                if reader[key] != qr_data or reader.matrix(number) != qr_data or reader.entry(number).key != key:
+                    mismatches += 1
+                    print(f'Mismatch for {key}')
+            if reader.get('missing') is not None:
+                mismatches += 1
+
+        mismatches += check_damaged(directory)
+
+    print(f'csv files {csv_time / COUNT * 1e6:8.1f} us per code')
+    print(f'archive   {archive_time / COUNT * 1e6:8.1f} us per code')
+    print(f'{mismatches} mismatches or damaged archives accepted')
+    return mismatches
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
@@ -0,0 +1,122 @@
+"""
+Check and time connected component labelling, and compare union schedules for codes without a base plate.
+
+Labels are compared with a flood fill for every version and for random matrices.  For each version the boxes
+of a code with zero base height are joined two ways against a fake backend that tracks which components a
+body holds: one balanced union over all boxes, as before, and one union per component joined smallest first.
+Unions whose operands share no component join bodies that can not touch, lumps counts the components carried
+through every boolean and cost the operand faces, as in ``bench_unions``.
+
+    python -m benchmarks.bench_components
+"""
+import random
+import time
+
+from core import encoder
+from core.components import component_stats, label_components, rectangle_components
+from core.matrix import QRMatrix
+from core.rectangles import merge_rectangles
+from core.unions import UnionBackend, balanced_union, smallest_first_union
+
+
+class FakeBody:
+    __slots__ = ('faces', 'components')
+
+    def __init__(self, component: int):
+        self.faces = 6
+        self.components = {component}
+
+
+class RecordingBackend(UnionBackend):
+    def __init__(self):
+        self.unions = 0
+        self.disjoint = 0
+        self.cost = 0
+        self.lumps = 0
+
+    def union(self, target, tool):
+        self.unions += 1
+        self.disjoint += target.components.isdisjoint(tool.components)
+        self.cost += target.faces + tool.faces
+        self.lumps += len(target.components) + len(tool.components)
+        target.faces += tool.faces
+        target.components |= tool.components
+
+
+def _flood_fill(qr_data: QRMatrix):
+    size = len(qr_data)
+    data = qr_data.data
+    labels = [-1] * (size * size)
+    sizes = []
+    for seed in range(size * size):
+        if not data[seed] or labels[seed] >= 0:
+            continue
+        labels[seed] = len(sizes)
+        stack = [seed]
+        count = 0
+        while stack:
+            index = stack.pop()
+            count += 1
+            row, col = divmod(index, size)
+            for r, c in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if 0 <= r < size and 0 <= c < size and data[r * size + c] and labels[r * size + c] < 0:
+                    labels[r * size + c] = len(sizes)
+                    stack.append(r * size + c)
+        sizes.append(count)
+    return labels, sizes
+
+
+def _schedules(qr_data: QRMatrix):
+    components = label_components(qr_data)
+    labels = rectangle_components(merge_rectangles(qr_data), components)
+
+    before = RecordingBackend()
+    balanced_union([FakeBody(label) for label in labels], before)
+
+    after = RecordingBackend()
+    groups = {}
+    for label in labels:
+        groups.setdefault(label, []).append(FakeBody(label))
+    bodies = [balanced_union(group, after) for group in groups.values()]
+    smallest_first_union(bodies, [len(group) for group in groups.values()], after)
+    return before, after
+
+
+def run():
+    failures = 0
+    rng = random.Random(7)
+    matrices = [encoder.encode('QRCODER', version=version, error='L') for version in range(1, 41)]
+    randoms = [
+        QRMatrix(size, bytes(rng.random() < density for _ in range(size * size)))
+        for size, density in ((rng.randint(1, 60), rng.random()) for _ in range(200))
+    ]
+    for qr_data in matrices + randoms:
+        components = label_components(qr_data)
+        labels, sizes = _flood_fill(qr_data)
+        if list(components.labels) != labels or components.sizes != sizes:
+            failures += 1
+            print(f'{len(qr_data)} modules wide: labels differ from the flood fill')
+
+    start = time.perf_counter()
+    for qr_data in matrices:
+        label_components(qr_data)
+    print(f'Labelled versions 1-40 in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    print('version  components  largest  singles  unions  disjoint before/after  lumps before/after  cost before/after')
+    for version in (1, 5, 10, 20, 30, 40):
+        qr_data = matrices[version - 1]
+        stats = component_stats(label_components(qr_data))
+        before, after = _schedules(qr_data)
+        if after.unions != before.unions or after.disjoint != stats['count'] - 1:
+            failures += 1
+        print(f'{version:7}  {stats["count"]:10}  {stats["largest"]:7}  {stats["singles"]:7}  {before.unions:6}  '
+              f'{before.disjoint:10} /{after.disjoint:7}  {before.lumps:9} /{after.lumps:8}  '
+              f'{before.cost:8} /{after.cost:7}')
+    print(f'Sizes for version 40: {component_stats(label_components(matrices[-1]))["histogram"]}')
+
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
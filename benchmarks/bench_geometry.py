@@ -0,0 +1,119 @@
+"""
+Sweep the add-in geometry path over QR versions, error levels and base heights against the fake adsk backend.
+
+Each case runs the stages the preview runs (encode, layout, solid, placement) plus the preview mesh, with
+empty caches, and records wall time, simulated kernel time and API call counts per stage.  The standalone
+importer script is run once on its bundled csv.  Results are written as JSON so runs on different commits
+can be diffed.
+
+    python -m benchmarks.bench_geometry --output results.json
+    python -m benchmarks.bench_geometry --versions 1-10 --errors LH
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+
+from benchmarks import fake_adsk
+from core.mesh import build_mesh
+from core.rectangles import merge_rectangles
+
+SIDE = 1.27
+HEIGHT = .635
+MESSAGE = 'QRCODER'
+
+
+def _versions(text: str):
+    first, _, last = text.partition('-')
+    return range(int(first), int(last or first) + 1)
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=fake_adsk.ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(commands, root, sketch_point, version: int, error: str, base: float) -> dict:
+    recorder = fake_adsk.recorder
+    recorder.reset()
+    commands.matrix_cache.invalidate()
+    commands.solid_cache.invalidate()
+    root.bRepBodies.items[:] = [fake_adsk.BRepBody(6, root)]
+
+    start = time.perf_counter()
+    with recorder.measure('encode'):
+        qr_data = commands.build_qr_code(MESSAGE, {'version': version, 'error': error})
+    with recorder.measure('layout'):
+        cover = merge_rectangles(qr_data)
+    with recorder.measure('solid'):
+        local_body = commands.get_cached_local_geometry(qr_data, cover, SIDE, HEIGHT, base)
+    with recorder.measure('placement'):
+        target_body = commands.get_target_body(sketch_point)
+        commands.make_real_geometry(target_body, commands.place_qr_geometry(local_body, sketch_point))
+    with recorder.measure('mesh'):
+        build_mesh(qr_data, SIDE, HEIGHT, base)
+
+    return {
+        'version': version,
+        'error': error,
+        'base': base,
+        'modules': qr_data.dark_count,
+        'boxes': cover.box_count + (1 if base > 0 else 0),
+        'seconds': time.perf_counter() - start,
+        'simulated_seconds': sum(recorder.simulated.values()),
+        'stages': recorder.report(),
+    }
+
+
+def run_importer_script(root) -> dict:
+    recorder = fake_adsk.recorder
+    recorder.reset()
+    root.bRepBodies.items[:] = [fake_adsk.BRepBody(6, root)]
+    script = fake_adsk.load_importer_script()
+    with recorder.measure('importer_script'):
+        script.run(None)
+    return recorder.report()['importer_script']
+
+
+def run(versions=range(1, 41), errors='LMQH', bases=(0.0, .635), output=None):
+    commands, root, sketch_point = fake_adsk.install()
+    cases = []
+    print(f'{"version":>7} {"error":>5} {"base":>5} {"boxes":>6} {"wall ms":>9} {"kernel ms":>10} {"unions":>7}')
+    for version in versions:
+        for error in errors:
+            for base in bases:
+                case = run_case(commands, root, sketch_point, version, error, base)
+                cases.append(case)
+                unions = case['stages']['solid']['calls'].get('TemporaryBRepManager.booleanOperation', 0)
+                print(
+                    f'{version:>7} {error:>5} {base:>5g} {case["boxes"]:>6} {case["seconds"] * 1000:>9.2f} '
+                    f'{case["simulated_seconds"] * 1000:>10.2f} {unions:>7}'
+                )
+
+    results = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'costs': {name: list(cost) for name, cost in fake_adsk.COSTS.items()},
+        'cases': cases,
+        'importer_script': run_importer_script(root),
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f'Results written to {output}')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_geometry')
+    parser.add_argument('--versions', default='1-40', help='version or range, for example 1-40')
+    parser.add_argument('--errors', default='LMQH', help='error levels, for example LH')
+    parser.add_argument('--no-base', action='store_true', help='only run without a base')
+    parser.add_argument('--output', help='JSON file to write')
+    args = parser.parse_args()
+    run(_versions(args.versions), args.errors, (0.0,) if args.no_base else (0.0, .635), args.output)
@@ -0,0 +1,148 @@
+"""
+Check and time the matrix importers on a synthetic 177x177 code.
+
+A version 40 code is written in every supported format, the image formats with a quiet zone and several
+pixels per module and the PNG with every row filter type.  Each file must read back to the same matrix.
+The csv file is also read with the original csv.reader loop for comparison.  Damaged PNG files, with a
+corrupt image stream, a short header, a wrong CRC or cut off, must fail with a ValueError.
+
+    python -m benchmarks.bench_importers
+"""
+import csv
+import os
+import struct
+import tempfile
+import timeit
+import zlib
+
+from core import encoder
+from core.importers import parse_matrix, read_matrix
+from core.matrix import QRMatrix
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+QUIET_ZONE = 4
+SCALE = 3
+
+
+def _pack_row(bits) -> bytes:
+    padded = bytes(bits) + bytes(-len(bits) % 8)
+    return bytes(int(''.join(map(str, padded[k:k + 8])), 2) for k in range(0, len(padded), 8))
+
+
+def _image_rows(qr_data: QRMatrix):
+    # Dark is 1, with a quiet zone and SCALE pixels per module
+    width = (qr_data.size + 2 * QUIET_ZONE) * SCALE
+    blank = bytes(width)
+    rows = [blank] * (QUIET_ZONE * SCALE)
+    for row in qr_data:
+        pixels = bytes(QUIET_ZONE * SCALE) + bytes(b for b in row for _ in range(SCALE)) + bytes(QUIET_ZONE * SCALE)
+        rows.extend([pixels] * SCALE)
+    rows.extend([blank] * (QUIET_ZONE * SCALE))
+    return width, rows
+
+
+def _filter(kind: int, row: bytes, previous: bytes) -> bytes:
+    out = bytearray()
+    for x, value in enumerate(row):
+        a = row[x - 1] if x else 0
+        b = previous[x]
+        c = previous[x - 1] if x else 0
+        if kind == 0:
+            predictor = 0
+        elif kind == 1:
+            predictor = a
+        elif kind == 2:
+            predictor = b
+        elif kind == 3:
+            predictor = (a + b) >> 1
+        else:
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            predictor = a if pa <= pb and pa <= pc else b if pb <= pc else c
+        out.append((value - predictor) & 0xFF)
+    return bytes((kind,)) + bytes(out)
+
+
+def _chunk(kind: bytes, body: bytes) -> bytes:
+    return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+
+
+def _png(qr_data: QRMatrix) -> bytes:
+    width, rows = _image_rows(qr_data)
+    # Grayscale, so black (dark) is 0
+    packed = [_pack_row([1 - bit for bit in row]) for row in rows]
+    previous = bytes(len(packed[0]))
+    raw = bytearray()
+    for y, row in enumerate(packed):
+        raw += _filter(y % 5, row, previous)
+        previous = row
+
+    header = struct.pack('>IIBBBBB', width, len(rows), 1, 0, 0, 0, 0)
+    return _PNG_SIGNATURE + _chunk(b'IHDR', header) + _chunk(b'IDAT', zlib.compress(bytes(raw))) + _chunk(b'IEND', b'')
+
+
+def _files(qr_data: QRMatrix):
+    rows = qr_data.to_rows()
+    width, image = _image_rows(qr_data)
+    yield 'csv', '\n'.join(','.join(str(bit) for bit in row) for row in rows).encode()
+    yield 'bits', '\n'.join(''.join(str(bit) for bit in row) for row in rows).encode()
+    yield 'hex', '\n'.join(_pack_row(row).hex()[:(qr_data.size + 3) // 4] for row in rows).encode()
+    yield 'pbm', f'P1\n# QRCoder\n{width} {len(image)}\n'.encode() + b'\n'.join(
+        b' '.join(b'1' if bit else b'0' for bit in row) for row in image
+    )
+    yield 'pbm', f'P4\n{width} {len(image)}\n'.encode() + b''.join(_pack_row(row) for row in image)
+    yield 'png', _png(qr_data)
+
+
+def _damaged_pngs(png: bytes):
+    # The header chunk comes right after the signature and holds 13 bytes
+    header_end = len(_PNG_SIGNATURE) + 8 + 13 + 4
+    header = png[len(_PNG_SIGNATURE) + 8:header_end - 4]
+    image_data = _chunk(b'IDAT', b'not a zlib stream') + _chunk(b'IEND', b'')
+    yield 'corrupt image data', png[:header_end] + image_data
+    yield 'short header', _PNG_SIGNATURE + _chunk(b'IHDR', header[:5]) + png[header_end:]
+    yield 'wrong CRC', png[:header_end - 1] + bytes((png[header_end - 1] ^ 1,)) + png[header_end:]
+    yield 'cut off', png[:len(png) // 2]
+
+
+def _csv_reader(file_name):
+    with open(file_name, newline='') as f:
+        return QRMatrix.from_rows(csv.reader(f))
+
+
+def run(repeat=50):
+    qr_data = encoder.encode('QRCODER', version=40, error='H')
+    mismatches = 0
+    print(f'{"format":>8} {"bytes":>8} {"ms":>8} {"MB/s":>8}')
+    with tempfile.TemporaryDirectory() as directory:
+        for number, (file_format, data) in enumerate(_files(qr_data)):
+            file_name = os.path.join(directory, f'qr_{number}.{file_format}')
+            with open(file_name, 'wb') as f:
+                f.write(data)
+
+            if read_matrix(file_name) != qr_data:
+                mismatches += 1
+                print(f'Mismatch reading {file_format}')
+
+            elapsed = timeit.timeit(lambda: read_matrix(file_name), number=repeat) / repeat
+            print(f'{file_format:>8} {len(data):>8} {elapsed * 1000:>8.3f} {len(data) / elapsed / 1e6:>8.1f}')
+
+            if file_format == 'csv':
+                elapsed = timeit.timeit(lambda: _csv_reader(file_name), number=repeat) / repeat
+                print(f'{"reader":>8} {len(data):>8} {elapsed * 1000:>8.3f} {len(data) / elapsed / 1e6:>8.1f}')
+
+    for name, data in _damaged_pngs(_png(qr_data)):
+        try:
+            parse_matrix(data, 'png')
+            mismatches += 1
+            print(f'PNG with {name} was read')
+        except ValueError:
+            pass
+
+    print(f'{mismatches} mismatches')
+    return mismatches
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
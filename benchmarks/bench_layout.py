@@ -0,0 +1,73 @@
+"""
+Time the box and module layout and check it against per box arithmetic.
+
+For every version the layout is computed in the local frame and in a tilted sketch frame, with NumPy when
+it is installed and in plain python, and compared with centers worked out one rectangle at a time.
+
+    python -m benchmarks.bench_layout
+"""
+import math
+import time
+
+from core import encoder
+from core.layout import Frame, box_layout, module_centers
+from core.optional import load_numpy
+from core.rectangles import merge_rectangles
+
+SIDE = 1.27
+HEIGHT = .635
+BASE = .635
+
+_c, _s = math.cos(.3), math.sin(.3)
+SKETCH_FRAME = Frame((2.0, -1.0, 5.0), (_c, _s, 0.0), (-_s * _c, _c * _c, _s), (_s * _s, -_c * _s, _c))
+
+
+def _place(frame, x, y, z):
+    return tuple(
+        frame.origin[k] + x * frame.x_axis[k] + y * frame.y_axis[k] + z * frame.z_axis[k] for k in range(3)
+    )
+
+
+def _reference(cover, qr_size, frame):
+    start_x = (.5 * SIDE) * (1 - qr_size)
+    start_y = (.5 * SIDE) * (qr_size - 1)
+    centers = [_place(frame, 0, 0, .5 * BASE)]
+    for rectangle in cover.rectangles:
+        centers.append(_place(
+            frame,
+            start_x + (rectangle.col + .5 * (rectangle.width - 1)) * SIDE,
+            start_y - (rectangle.row + .5 * (rectangle.height - 1)) * SIDE,
+            .5 * HEIGHT + BASE
+        ))
+    return centers
+
+
+def run():
+    backends = [False] if load_numpy() is None else [False, True]
+    failures = 0
+    timings = {use_numpy: 0.0 for use_numpy in backends}
+    for version in range(1, 41):
+        qr_data = encoder.encode('QRCODER', version=version, error='H')
+        cover = merge_rectangles(qr_data)
+        for frame in (Frame((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0)), SKETCH_FRAME):
+            expected = _reference(cover, len(qr_data), frame)
+            for use_numpy in backends:
+                start = time.perf_counter()
+                layout = box_layout(cover, len(qr_data), SIDE, HEIGHT, BASE, frame, use_numpy)
+                centers = module_centers(qr_data, SIDE, 0.0, frame, use_numpy)
+                timings[use_numpy] += time.perf_counter() - start
+
+                found = [tuple(layout.centers[k:k + 3]) for k in range(0, len(layout.centers), 3)]
+                if len(found) != len(expected) or len(centers) != 3 * qr_data.dark_count or any(
+                        math.dist(a, b) > 1e-9 for a, b in zip(found, expected)):
+                    failures += 1
+                    print(f'Version {version} numpy={use_numpy}: layout differs')
+
+    for use_numpy, elapsed in timings.items():
+        print(f'{"numpy " if use_numpy else "python"} {elapsed * 1000:8.2f} ms for versions 1-40 in two frames')
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
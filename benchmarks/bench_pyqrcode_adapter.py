@@ -0,0 +1,40 @@
+"""
+Check matrix_from_pyqrcode against the text round trip and time both, for every version and error level.
+
+Needs pyqrcode on the path, for example the copy installed into the add-in lib directory.
+
+    python -m benchmarks.bench_pyqrcode_adapter
+"""
+import timeit
+
+import pyqrcode
+
+from benchmarks.pyqrcode_adapter import matrix_from_pyqrcode, matrix_from_text
+
+ERROR_LEVELS = ('L', 'M', 'Q', 'H')
+MESSAGE = 'QRCODER'
+
+
+def run(repeat=20):
+    mismatches = 0
+    print(f'{"version":>7} {"error":>5}  {"text ms":>9}  {"direct ms":>9}  speedup')
+    for version in range(1, 41):
+        for error in ERROR_LEVELS:
+            qr = pyqrcode.create(MESSAGE, version=version, error=error)
+            if matrix_from_pyqrcode(qr) != matrix_from_text(qr):
+                mismatches += 1
+                print(f'Mismatch at version {version} error {error}')
+
+            text_time = timeit.timeit(lambda: matrix_from_text(qr), number=repeat) / repeat
+            direct_time = timeit.timeit(lambda: matrix_from_pyqrcode(qr), number=repeat) / repeat
+            print(
+                f'{version:>7} {error:>5}  {text_time * 1000:>9.3f}  {direct_time * 1000:>9.3f}  '
+                f'{text_time / direct_time:>6.1f}x'
+            )
+
+    print(f'{mismatches} mismatches')
+    return mismatches
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
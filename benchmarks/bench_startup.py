@@ -0,0 +1,67 @@
+"""
+Add-in load time and first preview time, each measured in a fresh interpreter.
+
+Every run starts a new python process that loads the command modules against the fake adsk backend, then
+runs one preview of the default message.  The median of the runs is printed together with the optional or
+heavy modules that were already loaded after startup, which should only appear once a command needs them.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 20
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from benchmarks import fake_adsk
+
+# Modules that are slow to import and only needed by some commands
+WATCHED = ('numpy', 'multiprocessing', 'concurrent.futures', 'tracemalloc', 'tempfile', 'sqlite3', 'hashlib')
+
+# Add-in modules the commands import on first use
+WATCHED_CORE = ('archive', 'batch', 'components', 'decoder', 'encoder', 'importers', 'mesh', 'outline', 'store')
+
+_CHILD = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+from benchmarks import fake_adsk
+commands, root, sketch_point = fake_adsk.install()
+for name in ('QRBatchMaker', 'QRTrace'):
+    importlib.import_module(f'{fake_adsk.PACKAGE}.commands.{name}')
+loaded = time.perf_counter()
+watched = [name for name in WATCHED if name in sys.modules]
+watched += [f'core.{name}' for name in WATCHED_CORE if f'{fake_adsk.PACKAGE}.core.{name}' in sys.modules]
+
+qr_data = commands.build_qr_code(commands.MESSAGE, {})
+cover = commands.layout_stage({'geometry_strategy': commands.STRATEGY_BOXES}, qr_data)
+local_body = commands.get_cached_local_geometry(qr_data, cover, 1.27, .635, .635)
+commands.make_real_geometry(
+    commands.get_target_body(sketch_point), commands.place_qr_geometry(local_body, sketch_point)
+)
+previewed = time.perf_counter()
+print(json.dumps({'load': loaded - start, 'preview': previewed - loaded, 'watched': watched}))
+'''
+
+
+def run_child() -> dict:
+    code = f'WATCHED = {WATCHED!r}\nWATCHED_CORE = {WATCHED_CORE!r}\n{_CHILD}'
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=fake_adsk.ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output)
+
+
+def run(runs: int = 10):
+    results = [run_child() for _ in range(runs)]
+    load = statistics.median(result['load'] for result in results)
+    preview = statistics.median(result['preview'] for result in results)
+    print(f'Load {load * 1000:7.2f} ms, first preview {preview * 1000:7.2f} ms (median of {runs} runs)')
+    print(f'Loaded at startup: {", ".join(results[0]["watched"]) or "none"}')
+    return load, preview
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_startup')
+    parser.add_argument('--runs', type=int, default=10)
+    run(parser.parse_args().runs)
@@ -0,0 +1,102 @@
+"""
+Time the disk cache against encoding and check it under concurrent writers.
+
+Messages are encoded once through an empty cache file and then read back, the covers of their codes are
+merged and read back the same way.  Reading back with the default error level spelled out has to hit the
+same entries.  Then several processes encode the same messages in random order into one small file at the
+same time, which has to leave every stored matrix intact, the file within its size limit and every lookup
+counted, although the counts are written in batches.
+
+    python -m benchmarks.bench_store
+"""
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from core import encoder
+from core.rectangles import merge_rectangles
+from core.store import DiskCache, encode_cached, merge_cached
+
+MESSAGES = [f'https://example.com/item/{number:05d}' for number in range(200)]
+PROCESSES = 6
+SMALL_BYTES = 16 * 1024
+
+
+def _timed(function):
+    start = time.perf_counter()
+    results = function()
+    return results, time.perf_counter() - start
+
+
+def _writer(path: str, seed: int):
+    # Each process in its own order, the file holds about three quarters of the matrices
+    messages = MESSAGES * 2
+    random.Random(seed).shuffle(messages)
+    with DiskCache(path, SMALL_BYTES) as cache:
+        for message in messages:
+            encode_cached(cache, message, {'error': 'M'})
+
+
+def run():
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        with DiskCache(os.path.join(directory, 'cache.sqlite')) as cache:
+            encoded, miss_time = _timed(lambda: [encode_cached(cache, message, {}) for message in MESSAGES])
+            read, hit_time = _timed(lambda: [encode_cached(cache, message, {}) for message in MESSAGES])
+            covers, cover_miss_time = _timed(lambda: [merge_cached(cache, qr_data) for qr_data in read])
+            cached_covers, cover_hit_time = _timed(lambda: [merge_cached(cache, qr_data) for qr_data in read])
+            spelled_out = [encode_cached(cache, message, {'error': 'H', 'version': None}) for message in MESSAGES]
+            stats = cache.stats
+
+        count = len(MESSAGES)
+        if spelled_out != read or (stats['hits'], stats['misses']) != (3 * count, 2 * count):
+            failures += 1
+            print(f'{stats["hits"]} hits and {stats["misses"]} misses, expected {3 * count} and {2 * count}')
+
+        if encoded != read or read != [encoder.encode(message) for message in MESSAGES]:
+            failures += 1
+            print('Matrices read back differ')
+        if cached_covers != covers or covers != [merge_rectangles(qr_data) for qr_data in read]:
+            failures += 1
+            print('Covers read back differ')
+
+        for name, miss, hit in (('encode', miss_time, hit_time), ('merge', cover_miss_time, cover_hit_time)):
+            print(f'{name:6} {miss / count * 1e6:8.1f} us per code, read back {hit / count * 1e6:8.1f} us')
+        print(f'{stats["entries"]} entries in {stats["bytes"]} bytes, hit rate {stats["hit_rate"]:.1%}')
+
+        path = os.path.join(directory, 'shared.sqlite')
+        DiskCache(path, SMALL_BYTES).close()
+        processes = [
+            multiprocessing.Process(target=_writer, args=(path, number))
+            for number in range(PROCESSES)
+        ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        with DiskCache(path, SMALL_BYTES) as cache:
+            stats = cache.stats
+            intact = all(
+                encode_cached(cache, message, {'error': 'M'}) == encoder.encode(message, error='M')
+                for message in MESSAGES
+            )
+        if any(process.exitcode != 0 for process in processes) or not intact or stats['bytes'] > SMALL_BYTES:
+            failures += 1
+            print('Concurrent writers left a broken or oversized cache')
+        if stats['hits'] + stats['misses'] != PROCESSES * 2 * count:
+            failures += 1
+            print(f'{stats["hits"] + stats["misses"]} lookups counted, {PROCESSES * 2 * count} made')
+        print(f'{PROCESSES} processes in {elapsed:.2f} s: {stats["hits"]} hits, {stats["misses"]} misses, '
+              f'{stats["evictions"]} evicted, {stats["bytes"]} of {SMALL_BYTES} bytes, {stats["errors"]} errors')
+
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
@@ -0,0 +1,85 @@
+"""
+Cost of the preview instrumentation, with tracing off and on.
+
+Times a bare disabled span, then runs the preview geometry path for a few versions against the fake adsk
+backend with the tracer off, on, and on with memory tracking.  Turning memory tracking off again, with the
+tracer left on or not, must stop tracemalloc.  Pass a file name to save the recorded spans, names ending in
+.trace.json are written as a Chrome trace.
+
+    python -m benchmarks.bench_trace
+    python -m benchmarks.bench_trace preview.trace.json
+"""
+import sys
+import time
+import tracemalloc
+
+from benchmarks import fake_adsk
+from core.trace import Tracer
+
+SIDE = 1.27
+HEIGHT = .635
+BASE = .635
+VERSIONS = (1, 10, 25, 40)
+REPEATS = 5
+
+
+def time_null_span(count: int = 1_000_000) -> float:
+    tracer = Tracer()
+    start = time.perf_counter()
+    for _ in range(count):
+        with tracer.span('off'):
+            pass
+    return (time.perf_counter() - start) / count
+
+
+def time_preview(commands, root, sketch_point) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for version in VERSIONS:
+            commands.matrix_cache.invalidate()
+            commands.solid_cache.invalidate()
+            root.bRepBodies.items[:] = [fake_adsk.BRepBody(6, root)]
+            with commands.tracer.span('preview', version=version):
+                qr_data = commands.build_qr_code('QRCODER', {'version': version, 'error': 'H'})
+                cover = commands.layout_stage({'geometry_strategy': commands.STRATEGY_BOXES}, qr_data)
+                local_body = commands.get_cached_local_geometry(qr_data, cover, SIDE, HEIGHT, BASE)
+                target_body = commands.get_target_body(sketch_point)
+                commands.make_real_geometry(target_body, commands.place_qr_geometry(local_body, sketch_point))
+    return time.perf_counter() - start
+
+
+def check_memory_off(tracer: Tracer) -> int:
+    failures = 0
+    for label, enabled in (('tracer left on', True), ('tracer off', False)):
+        tracer.configure(tracer.capacity, True, True)
+        tracer.configure(tracer.capacity, enabled, False)
+        tracer.disable()
+        if tracemalloc.is_tracing():
+            failures += 1
+            print(f'Memory tracking off with the {label} left tracemalloc running')
+            tracemalloc.stop()
+    return failures
+
+
+def run(output=None):
+    print(f'Disabled span: {time_null_span() * 1e9:.0f} ns')
+
+    commands, root, sketch_point = fake_adsk.install()
+    tracer = commands.tracer
+    for label, enabled, memory in (('off', False, False), ('on', True, False), ('on, memory', True, True)):
+        tracer.clear()
+        tracer.configure(tracer.capacity, enabled, memory)
+        seconds = time_preview(commands, root, sketch_point)
+        print(f'Preview, tracing {label:10}: {seconds * 1000 / REPEATS:8.2f} ms per sweep, {len(tracer)} spans')
+        if enabled and not memory and output:
+            tracer.dump(output)
+            print(f'Spans written to {output}')
+    tracer.configure(tracer.capacity, False)
+
+    failures = check_memory_off(tracer)
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run(sys.argv[1] if len(sys.argv) > 1 else None) else 0)
@@ -0,0 +1,59 @@
+"""
+Compare union schedules against a fake body manager.
+
+The fake treats the face count of a body as the cost of a boolean, which is close enough to how the
+modeling kernel behaves to show the difference between accumulating and tree shaped unions.
+
+    python -m benchmarks.bench_unions
+"""
+import time
+
+from core.unions import UnionBackend, balanced_union, batched_union, sequential_union, smallest_first_union
+
+
+class FakeBody:
+    __slots__ = ('faces',)
+
+    def __init__(self, faces=6):
+        self.faces = faces
+
+
+class RecordingBackend(UnionBackend):
+    def __init__(self):
+        self.operand_sizes = []
+
+    def union(self, target, tool):
+        self.operand_sizes.append((target.faces, tool.faces))
+        target.faces += tool.faces
+
+    @property
+    def cost(self):
+        return sum(a + b for a, b in self.operand_sizes)
+
+    @property
+    def largest_operand(self):
+        return max((max(pair) for pair in self.operand_sizes), default=0)
+
+
+def run(counts=(100, 1000, 15000)):
+    schedules = [
+        ('sequential', sequential_union),
+        ('balanced', balanced_union),
+        ('batched', batched_union),
+        ('smallest', lambda bodies, backend: smallest_first_union(bodies, [1] * len(bodies), backend)),
+    ]
+    for count in counts:
+        for name, schedule in schedules:
+            backend = RecordingBackend()
+            start = time.perf_counter()
+            schedule([FakeBody() for _ in range(count)], backend)
+            elapsed = time.perf_counter() - start
+            print(
+                f'{count:>6} bodies  {name:<10}  unions: {len(backend.operand_sizes):>6}  '
+                f'cost: {backend.cost:>12}  largest operand: {backend.largest_operand:>7}  '
+                f'{elapsed * 1000:.1f} ms'
+            )
+
+
+if __name__ == '__main__':
+    run()
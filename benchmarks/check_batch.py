@@ -0,0 +1,91 @@
+"""
+Check that a batch is encoded completely and in order whether or not its process pool holds up.
+
+The same message list is encoded in this process, with a working spawn pool, with a worker interpreter that
+exits at once, with the workers killed after the first result and with an item that can not be sent to a
+worker.  Every run must give the in-process results in input order, and report progress once per item.  Only
+the working pool may report that the pool encoded everything.
+
+    python -m benchmarks.check_batch
+"""
+import multiprocessing
+import os
+import stat
+import tempfile
+import time
+
+from core import batch
+
+MESSAGES = [f'BATCH ITEM {number} ' * 8 for number in range(400)]
+
+
+def _dead_python(directory: str) -> str:
+    # An interpreter that exits before a worker can start
+    name = os.path.join(directory, 'python3')
+    with open(name, 'w') as f:
+        f.write('#!/bin/sh\nexit 1\n')
+    os.chmod(name, os.stat(name).st_mode | stat.S_IEXEC)
+    return name
+
+
+def _kill_workers(done: int, total: int):
+    if done == 1:
+        for process in multiprocessing.active_children():
+            process.kill()
+
+
+def _problems(items, expected, workers, python=None, progress=None, pooled_expected=False) -> list:
+    problems = []
+    calls = []
+
+    def record(done, total):
+        calls.append((done, total))
+        if progress is not None:
+            progress(done, total)
+
+    start = time.perf_counter()
+    results, pooled = batch.encode_batch(items, workers, python, record)
+    elapsed = time.perf_counter() - start
+    if pooled != pooled_expected:
+        problems.append(f'pooled is {pooled}')
+    if [result.index for result in results] != list(range(len(items))):
+        problems.append('results out of order')
+    wrong = sum(result.message != want.message or result.error != want.error or
+                (result.qr_data is None) != (want.qr_data is None) or
+                (result.qr_data is not None and result.qr_data.to_packed_bits() != want.qr_data.to_packed_bits())
+                for result, want in zip(results, expected))
+    if wrong:
+        problems.append(f'{wrong} results differ from the in-process ones')
+    if calls != [(done, len(items)) for done in range(1, len(items) + 1)]:
+        problems.append(f'progress called {len(calls)} times, not once per item in order')
+    return problems or [f'ok in {elapsed:.2f} s']
+
+
+def run():
+    items = [batch.BatchItem(index, message, {}, None) for index, message in enumerate(MESSAGES)]
+    expected, _ = batch.encode_batch(items, 1)
+
+    # A lambda can not be pickled, so the pool fails on this item while the others are in flight
+    unsendable = list(items)
+    unsendable[200] = batch.BatchItem(200, MESSAGES[200], {'version': lambda: 1}, None)
+    unsendable_expected = list(expected)
+    unsendable_expected[200] = batch._encode_item(unsendable[200])
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        runs = [
+            ('in process', _problems(items, expected, 1)),
+            ('process pool', _problems(items, expected, 4, pooled_expected=True)),
+            ('workers that can not start', _problems(items, expected, 4, _dead_python(directory))),
+            ('workers killed', _problems(items, expected, 4, progress=_kill_workers)),
+            ('item that can not be sent', _problems(unsendable, unsendable_expected, 4)),
+        ]
+    for name, problems in runs:
+        print(f'{name}: {"; ".join(problems)}')
+        failures += not problems[0].startswith('ok')
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
@@ -0,0 +1,94 @@
+"""
+Check that one failing item does not stop a batch run and that a rerun picks up only what is left.
+
+A message list with one poisoned message is run through ``core.cli``, in process and with a worker pool.  Writing
+the poisoned item raises an exception no code path expects.  Every other item must still be written and
+recorded as done in the manifest, the poisoned one recorded as failed.  A rerun with the poison gone must find
+only that item pending, build it, and leave nothing pending after.
+
+    python -m benchmarks.check_cli
+"""
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+
+from core import cli
+
+MESSAGES = [f'ITEM {number}' for number in range(24)]
+POISON = 'POISON'
+
+
+def _poisoned_write(write):
+    def poisoned(qr_data, settings, file_name):
+        if POISON in os.path.basename(file_name):
+            raise RuntimeError('poisoned item')
+        write(qr_data, settings, file_name)
+    return poisoned
+
+
+def _manifest_errors(output_dir: str) -> dict:
+    errors = {}
+    with open(os.path.join(output_dir, cli.MANIFEST), encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            errors[record['name']] = record['error']
+    return errors
+
+
+def _check(workers: int) -> list:
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        input_name = os.path.join(directory, 'messages.csv')
+        with open(input_name, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(MESSAGES[:10] + [POISON] + MESSAGES[10:]) + '\n')
+        output_dir = os.path.join(directory, 'out')
+        os.makedirs(output_dir)
+        settings = cli.Settings(output_dir, 'bits', 12.7, 6.35, 6.35, None, 0, False)
+        tasks = cli.make_tasks(input_name, settings)
+        poisoned = [task.name for task in tasks if task.message == POISON]
+
+        write = cli._write
+        cli._write = _poisoned_write(write)
+        try:
+            finished, failed = cli.run(tasks, settings, workers, log=io.StringIO())
+        finally:
+            cli._write = write
+        if (finished, failed) != (len(MESSAGES), 1):
+            problems.append(f'{finished} finished and {failed} failed, expected {len(MESSAGES)} and 1')
+
+        errors = _manifest_errors(output_dir)
+        if len(errors) != len(tasks):
+            problems.append(f'{len(errors)} items in the manifest, expected {len(tasks)}')
+        if not (errors.get(poisoned[0]) or '').startswith('RuntimeError'):
+            problems.append(f'poisoned item recorded with error {errors.get(poisoned[0])!r}')
+        missing = [task.name for task in tasks if task.name not in poisoned and
+                   not os.path.exists(cli.output_path(settings, task.name))]
+        if missing:
+            problems.append(f'{len(missing)} outputs missing')
+
+        pending = cli.pending_tasks(tasks, settings)
+        if [task.name for task in pending] != poisoned:
+            problems.append(f'{len(pending)} items pending after the first run, expected the poisoned one')
+        finished, failed = cli.run(pending, settings, workers, log=io.StringIO())
+        if (finished, failed) != (1, 0) or cli.pending_tasks(tasks, settings):
+            problems.append(f'rerun finished {finished} and failed {failed}, '
+                            f'{len(cli.pending_tasks(tasks, settings))} still pending')
+    return problems
+
+
+def run():
+    failures = 0
+    # The poison is patched into this process, spawned workers would not see it
+    runs = [1, 4] if multiprocessing.get_start_method() == 'fork' else [1]
+    for workers in runs:
+        problems = _check(workers)
+        print(f'{workers} workers: {"; ".join(problems) or "ok"}')
+        failures += len(problems)
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
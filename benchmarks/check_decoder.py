@@ -0,0 +1,98 @@
+"""
+Round trip the built-in encoder through the decoder and time it.
+
+Every version and error level is encoded with numeric, alphanumeric, byte and kanji messages and must decode
+back to the message.  Then codes are damaged: up to half the error correction words of a block and up to 3
+format bits, which must be corrected, and far beyond that, which must never decode to the original message.
+Last, the decode rate for small tags and full size codes.
+
+    python -m benchmarks.check_decoder
+"""
+import random
+import time
+
+from core import encoder
+from core import qr_tables as tables
+from core.decoder import _block_readers, _version_reader, decode, verify
+from core.matrix import QRMatrix
+
+MESSAGES = ['HELLO WORLD', '0123456789012', 'https://tapnair.github.io/QRCoder/', 'héllo wörld', 'こんにちは']
+
+
+def _damage(qr_data: QRMatrix, error: str, rng: random.Random, words_per_block, format_bits: int) -> QRMatrix:
+    version = (len(qr_data) - 17) // 4
+    _, _, _, format_indices, _, _, data_order = _version_reader(version)
+    modules = bytearray(qr_data.data)
+    positions = list(range(len(data_order) // 8))
+    ec_words = tables.BLOCK_LAYOUT[version][error][0]
+    for _, getter in _block_readers(version, error):
+        for word in rng.sample(getter(positions), words_per_block(ec_words)):
+            # At least one bit of every picked word flips
+            for bit in rng.sample(range(8), rng.randint(1, 8)):
+                modules[data_order[8 * word + bit]] ^= 1
+    for index in rng.sample(format_indices[:15], format_bits):
+        modules[index] ^= 1
+    return QRMatrix(len(qr_data), bytes(modules))
+
+
+def run():
+    failures = 0
+    rng = random.Random(25)
+
+    checked = 0
+    for version in range(1, 41):
+        for error in 'LMQH':
+            for message in MESSAGES:
+                try:
+                    qr_data = encoder.encode(message, error=error, version=version)
+                except ValueError:
+                    continue
+                checked += 1
+                try:
+                    decoded = verify(qr_data, message)
+                    if (decoded.version, decoded.error, decoded.corrected) != (version, error, 0):
+                        raise ValueError(f'read as {decoded.version}-{decoded.error}')
+                except ValueError as e:
+                    failures += 1
+                    print(f'{version}-{error} {message!r}: {e}')
+    print(f'{checked} codes round tripped')
+
+    corrected = wrong = 0
+    for trial in range(400):
+        error = rng.choice('LMQH')
+        message = f'SN-{trial:05d}'
+        qr_data = encoder.encode(message, error=error, version=rng.randint(1, 15))
+        damaged = _damage(qr_data, error, rng, lambda ec_words: rng.randint(0, ec_words // 2), rng.randint(0, 3))
+        try:
+            verify(damaged, message)
+            corrected += 1
+        except ValueError as e:
+            failures += 1
+            print(f'{message}: {e}')
+
+        ruined = _damage(qr_data, error, rng, lambda ec_words: ec_words, 0)
+        try:
+            wrong += decode(ruined).text == message
+        except ValueError:
+            pass
+    failures += wrong
+    print(f'{corrected} of 400 damaged codes corrected, {wrong} ruined codes read as the original')
+
+    for label, messages, error in (
+            ('tags, version 1-2', [f'SN-{number:06d}' for number in range(3000)], 'M'),
+            ('urls, version 3-4', [f'https://example.com/item/{number:06d}' for number in range(2000)], 'H'),
+            ('version 40', ['x' * 1200] * 20, 'H'),
+    ):
+        codes = [encoder.encode(message, error=error) for message in messages]
+        start = time.perf_counter()
+        for qr_data in codes:
+            decode(qr_data)
+        elapsed = time.perf_counter() - start
+        print(f'{label:<18} {len(codes) / elapsed:8.0f} codes per s')
+
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
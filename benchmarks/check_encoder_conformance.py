@@ -0,0 +1,86 @@
+"""
+Check the built-in encoder against pyqrcode and time both.
+
+Every version and error level is encoded with both libraries, in automatic and forced modes, and the
+module matrices must be identical.  Runs the pure python mask scoring and, when NumPy is installed,
+the NumPy scoring as well.  Needs pyqrcode on the path.
+
+pyqrcode's capacity table lists 3514 numeric characters for version 27-L where the standard allows
+3517, so for 3515 to 3517 digits at that level the automatic version choice differs by design.
+
+    python -m benchmarks.check_encoder_conformance
+"""
+import random
+import time
+
+import pyqrcode
+
+from benchmarks.pyqrcode_adapter import matrix_from_pyqrcode
+from core import encoder
+
+ALPHANUMERIC = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:'
+
+
+def _messages(rng):
+    yield 'https://tapnair.github.io/QRCoder/'
+    yield 'QRCODER'
+    yield '0123456789' * 3
+    yield 'こんにちは'
+    for _ in range(40):
+        length = rng.randint(1, 200)
+        yield ''.join(rng.choice('0123456789') for _ in range(length))
+        yield ''.join(rng.choice(ALPHANUMERIC) for _ in range(length))
+        yield ''.join(chr(rng.randint(32, 255)) for _ in range(length))
+
+
+def _encode(function, message, args):
+    try:
+        return function(message, **args)
+    except Exception:
+        return None
+
+
+def _cases(rng):
+    for version in range(1, 41):
+        for error in 'LMQH':
+            yield 'QRCODER', {'version': version, 'error': error}
+    for message in _messages(rng):
+        for error in 'LMQH':
+            for mode in (None, 'binary', 'alphanumeric'):
+                args = {'error': error}
+                if mode:
+                    args['mode'] = mode
+                yield message, args
+
+
+def run(seed=1):
+    rng = random.Random(seed)
+    backends = [False] if encoder.load_numpy() is None else [False, True]
+    mismatches = 0
+    count = 0
+    reference_time = 0.0
+    builtin_time = {use_numpy: 0.0 for use_numpy in backends}
+
+    for message, args in _cases(rng):
+        count += 1
+        start = time.perf_counter()
+        reference = _encode(lambda m, **a: matrix_from_pyqrcode(pyqrcode.create(m, **a)), message, args)
+        reference_time += time.perf_counter() - start
+
+        for use_numpy in backends:
+            start = time.perf_counter()
+            result = _encode(lambda m, **a: encoder.encode(m, use_numpy=use_numpy, **a), message, args)
+            builtin_time[use_numpy] += time.perf_counter() - start
+            if result != reference:
+                mismatches += 1
+                print(f'Mismatch for {message[:30]!r} {args} numpy={use_numpy}')
+
+    print(f'{count} cases, {mismatches} mismatches')
+    print(f'pyqrcode        {reference_time:8.2f} s')
+    for use_numpy, elapsed in builtin_time.items():
+        print(f'built-in {"numpy " if use_numpy else "python"} {elapsed:8.2f} s')
+    return mismatches
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
@@ -0,0 +1,84 @@
+"""
+Check the headless STL and 3MF export and time it.
+
+For every version, with and without a base, the merged triangles must form a watertight mesh that encloses
+the same volume as the unmerged preview mesh.  Triangle counts of both are printed for a few versions,
+together with the time to stream a binary STL and a 3MF file.
+
+    python -m benchmarks.check_export
+"""
+import io
+import time
+from array import array
+
+from core import encoder
+from core.export import iter_triangles, write_3mf, write_stl
+from core.mesh import Mesh, build_mesh, is_watertight, triangle_count
+
+SIDE = 12.7
+HEIGHT = 6.35
+
+
+def _volume(triangles):
+    volume = 0.0
+    for (ax, ay, az), (bx, by, bz), (cx, cy, cz) in triangles:
+        volume += ax * (by * cz - bz * cy) - ay * (bx * cz - bz * cx) + az * (bx * cy - by * cx)
+    return volume / 6
+
+
+def _indexed(triangles) -> Mesh:
+    vertices = {}
+    coordinates = array('d')
+    indices = array('i')
+    for triangle in triangles:
+        for vertex in triangle:
+            if vertex not in vertices:
+                vertices[vertex] = len(vertices)
+                coordinates.extend(vertex)
+            indices.append(vertices[vertex])
+    return Mesh(coordinates, indices)
+
+
+def _mesh_triangles(mesh: Mesh):
+    c = mesh.coordinates
+    indices = mesh.indices
+    for k in range(0, len(indices), 3):
+        yield tuple(tuple(c[3 * indices[k + j]:3 * indices[k + j] + 3]) for j in range(3))
+
+
+def run():
+    failures = 0
+    for version in range(1, 41):
+        qr_data = encoder.encode('QRCODER', version=version, error='H')
+        for base in (0.0, 6.35):
+            triangles = list(iter_triangles(qr_data, SIDE, HEIGHT, base))
+            reference = build_mesh(qr_data, SIDE, HEIGHT, base)
+            merged = _indexed(triangles)
+            volume = _volume(triangles)
+            expected = _volume(_mesh_triangles(reference))
+            if not is_watertight(merged) or abs(volume - expected) > 1e-6 * expected:
+                failures += 1
+                print(f'Version {version} base {base}: watertight {is_watertight(merged)}, '
+                      f'volume {volume:.3f}, expected {expected:.3f}')
+
+            if version in (1, 10, 25, 40) and base > 0:
+                start = time.perf_counter()
+                stl = io.BytesIO()
+                write_stl(stl, qr_data, SIDE, HEIGHT, base)
+                stl_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                package = io.BytesIO()
+                write_3mf(package, qr_data, SIDE, HEIGHT, base)
+                package_time = time.perf_counter() - start
+
+                print(f'Version {version:2}: {len(triangles):6} merged, {triangle_count(reference):6} unmerged '
+                      f'triangles, STL {len(stl.getvalue()) / 1e6:5.2f} MB in {stl_time:.2f} s, '
+                      f'3MF {len(package.getvalue()) / 1e6:5.2f} MB in {package_time:.2f} s')
+
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
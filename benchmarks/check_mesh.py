@@ -0,0 +1,80 @@
+"""
+Check the preview mesh and time it.
+
+For every version, with and without a base, the mesh must be watertight, enclose the volume of the plate
+plus the dark module columns, and have exactly the triangles left after culling shared faces: two for the
+top and bottom of every filled module and two per height step on every boundary between modules.
+
+    python -m benchmarks.check_mesh
+"""
+import time
+
+from core import encoder
+from core.mesh import build_mesh, is_watertight, module_z_range, triangle_count
+
+SIDE = .5
+HEIGHT = .25
+
+
+def _volume(mesh):
+    c = mesh.coordinates
+    indices = mesh.indices
+    volume = 0.0
+    for k in range(0, len(indices), 3):
+        ax, ay, az = c[3 * indices[k]:3 * indices[k] + 3]
+        bx, by, bz = c[3 * indices[k + 1]:3 * indices[k + 1] + 3]
+        cx, cy, cz = c[3 * indices[k + 2]:3 * indices[k + 2] + 3]
+        volume += ax * (by * cz - bz * cy) - ay * (bx * cz - bz * cx) + az * (bx * cy - by * cx)
+    return volume / 6
+
+
+def _expected(qr_data, base):
+    size = qr_data.size
+    bottom, top = module_z_range(HEIGHT, base)
+    level = [0.0, bottom, top] if base > 0 else [0.0, top]
+
+    def height(row, col):
+        if 0 <= row < size and 0 <= col < size:
+            return top if qr_data[row, col] else (base if base > 0 else 0.0)
+        return 0.0
+
+    triangles = 0
+    for r in range(-1, size):
+        for c in range(-1, size):
+            if r >= 0 and c >= 0 and height(r, c) > 0:
+                triangles += 4
+            for low, high in ((height(r, c), height(r, c + 1)), (height(r, c), height(r + 1, c))):
+                low, high = sorted((low, high))
+                triangles += 2 * (level.index(high) - level.index(low))
+
+    dark = qr_data.dark_count
+    volume = SIDE * SIDE * (size * size * base + dark * (top - bottom) if base > 0 else dark * top)
+    return triangles, volume
+
+
+def run():
+    failures = 0
+    elapsed = 0.0
+    for version in range(1, 41):
+        qr_data = encoder.encode('QRCODER', version=version, error='H')
+        for base in (0.0, .25):
+            start = time.perf_counter()
+            mesh = build_mesh(qr_data, SIDE, HEIGHT, base)
+            elapsed += time.perf_counter() - start
+
+            triangles, volume = _expected(qr_data, base)
+            if not is_watertight(mesh) or triangle_count(mesh) != triangles or abs(_volume(mesh) - volume) > 1e-6:
+                failures += 1
+                print(f'Version {version} base {base}: {triangle_count(mesh)} triangles, expected {triangles}, '
+                      f'volume {_volume(mesh):.4f}, expected {volume:.4f}, watertight {is_watertight(mesh)}')
+
+        if version in (1, 10, 25, 40):
+            unculled = 12 * (qr_data.dark_count + 1)
+            print(f'Version {version:2}: {triangle_count(mesh):6} triangles, {unculled:6} as separate boxes')
+
+    print(f'{failures} failures, {elapsed:.2f} s building meshes')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
@@ -0,0 +1,215 @@
+"""
+Check the outline tracer and time it.
+
+Small hand made matrices cover islands, holes, holes inside islands inside holes and modules that only touch
+at a corner, with known polygon counts.  Those, every version and random matrices are then checked the same
+way: polygons are closed, axis aligned and without collinear corners, every segment has a dark module on the
+side ``segment_dark_sides`` names and a light one on the other, each dark to light module side is traced
+exactly once, the signed areas add up to the dark modules, there is one outer polygon per connected component
+and one hole per enclosed light region.
+
+The outline strategy extrudes the base plate and the dark profiles from the sketch plane, the box strategy
+places boxes from ``box_layout``.  For several block and base heights the solid both make over a dark and over a
+light module must span the same heights.
+
+    python -m benchmarks.check_outline
+"""
+import random
+import time
+
+from core import encoder
+from core.components import label_components
+from core.layout import box_layout
+from core.matrix import QRMatrix
+from core.mesh import outline_extrude_distances
+from core.outline import segment_dark_sides, signed_area, trace_outlines
+from core.rectangles import merge_rectangles
+
+# Name, rows, outer polygons, holes
+CASES = [
+    ('single module', ['1'], 1, 0),
+    ('islands', ['101', '000', '101'], 4, 0),
+    ('hole', ['111', '101', '111'], 1, 1),
+    ('two holes', ['11111', '10101', '11111', '00000', '00000'], 1, 2),
+    ('island in a hole', ['11111', '10001', '10101', '10001', '11111'], 2, 1),
+    ('diagonal', ['10', '01'], 2, 0),
+    ('anti diagonal', ['01', '10'], 2, 0),
+    ('diagonal chain', ['1000', '0100', '0010', '0001'], 4, 0),
+    ('checkerboard', ['101', '010', '101'], 5, 0),
+    ('diagonal hole', ['1111', '1101', '1011', '1111'], 1, 1),
+    ('diagonal in a hole', ['111111', '100001', '101001', '100101', '100001', '111111'], 3, 1),
+    ('empty', ['000', '000', '000'], 0, 0),
+    ('full', ['11', '11'], 1, 0),
+]
+
+# Block size, block height, base height
+HEIGHTS = [(1.27, .635, .635), (1.27, .635, 0.0), (1.0, 2.0, .1), (.5, .1, 3.0), (2.0, 1e-3, 1e-3)]
+
+
+def _dark(qr_data: QRMatrix, row: int, col: int) -> bool:
+    return 0 <= row < qr_data.size and 0 <= col < qr_data.size and qr_data[row, col] == 1
+
+
+def _enclosed_light_regions(qr_data: QRMatrix) -> int:
+    # Light modules are 8-connected when dark ones are 4-connected.  The grid gets a light border, the region
+    # holding it is the outside
+    size = qr_data.size + 2
+    seen = [False] * (size * size)
+    regions = 0
+    for seed in range(size * size):
+        if seen[seed] or _dark(qr_data, seed // size - 1, seed % size - 1):
+            continue
+        regions += 1
+        seen[seed] = True
+        stack = [seed]
+        while stack:
+            row, col = divmod(stack.pop(), size)
+            for r in range(row - 1, row + 2):
+                for c in range(col - 1, col + 2):
+                    if 0 <= r < size and 0 <= c < size and not seen[r * size + c] and not _dark(qr_data, r - 1, c - 1):
+                        seen[r * size + c] = True
+                        stack.append(r * size + c)
+    return regions - 1
+
+
+def _boundary_sides(qr_data: QRMatrix) -> int:
+    count = 0
+    for row in range(qr_data.size):
+        for col in range(qr_data.size):
+            if _dark(qr_data, row, col):
+                count += sum(not _dark(qr_data, r, c) for r, c in
+                             ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)))
+    return count
+
+
+def _problems(qr_data: QRMatrix, polygons) -> list:
+    problems = []
+    sides = segment_dark_sides(polygons)
+    segments = 0
+    traced = set()
+    for polygon in polygons:
+        points = polygon.points
+        if len(points) < 4 or len(points) % 2:
+            problems.append(f'polygon with {len(points)} corners')
+            continue
+        if (signed_area(points) < 0) != polygon.is_hole:
+            problems.append('hole flag does not match the winding')
+        for k, (x0, y0) in enumerate(points):
+            x1, y1 = points[(k + 1) % len(points)]
+            x2, y2 = points[(k + 2) % len(points)]
+            if (x0 != x1) == (y0 != y1):
+                problems.append(f'segment {(x0, y0)} to {(x1, y1)} is not axis aligned')
+                continue
+            if (x1 - x0) * (y2 - y1) == (y1 - y0) * (x2 - x1):
+                problems.append(f'corner {(x1, y1)} is collinear')
+            segments += 1
+
+            dx, dy = (x1 > x0) - (x1 < x0), (y1 > y0) - (y1 < y0)
+            nx, ny = sides.get((x0 + x1, y0 + y1), (0, 0))
+            if (nx, ny) != (-dy, dx):
+                problems.append(f'segment {(x0, y0)} to {(x1, y1)} has dark side {(nx, ny)}')
+                continue
+            for step in range(abs(x1 - x0) + abs(y1 - y0)):
+                x, y = x0 + step * dx, y0 + step * dy
+                # Module on each side of the unit edge from (x, y), found from the doubled edge midpoint
+                mid_x, mid_y = 2 * x + dx, 2 * y + dy
+                dark_module = ((mid_y + ny) // 2, (mid_x + nx) // 2)
+                light_module = ((mid_y - ny) // 2, (mid_x - nx) // 2)
+                if not _dark(qr_data, *dark_module) or _dark(qr_data, *light_module):
+                    problems.append(f'unit edge at {(x, y)} is not between a dark and a light module')
+                if (mid_x, mid_y) in traced:
+                    problems.append(f'unit edge at {(x, y)} traced twice')
+                traced.add((mid_x, mid_y))
+
+    if len(sides) != segments:
+        problems.append(f'{segments} segments share {len(sides)} midpoints')
+    if len(traced) != _boundary_sides(qr_data):
+        problems.append(f'{len(traced)} unit edges traced, {_boundary_sides(qr_data)} module sides on the boundary')
+    area = sum(signed_area(polygon.points) for polygon in polygons)
+    if area != qr_data.dark_count:
+        problems.append(f'area {area}, {qr_data.dark_count} dark modules')
+    outer = sum(not polygon.is_hole for polygon in polygons)
+    if outer != label_components(qr_data).count:
+        problems.append(f'{outer} outer polygons, {label_components(qr_data).count} components')
+    holes = len(polygons) - outer
+    if holes != _enclosed_light_regions(qr_data):
+        problems.append(f'{holes} holes, {_enclosed_light_regions(qr_data)} enclosed light regions')
+    return problems
+
+
+def _union(ranges) -> list:
+    # Overlapping or touching (bottom, top) ranges joined
+    joined = []
+    for bottom, top in sorted(ranges):
+        if joined and bottom <= joined[-1][1] + 1e-9:
+            joined[-1][1] = max(joined[-1][1], top)
+        else:
+            joined.append([bottom, top])
+    return [(round(bottom, 9), round(top, 9)) for bottom, top in joined]
+
+
+def check_extrusions() -> int:
+    qr_data = encoder.encode('QRCODER', version=1)
+    cover = merge_rectangles(qr_data)
+    failures = 0
+    for side, height, base in HEIGHTS:
+        layout = box_layout(cover, qr_data.size, side, height, base)
+        z_ranges = [(layout.centers[3 * k + 2] - .5 * layout.sizes[3 * k + 2],
+                     layout.centers[3 * k + 2] + .5 * layout.sizes[3 * k + 2]) for k in range(layout.box_count)]
+        plate = z_ranges[:1] if base > 0 else []
+        boxes_dark = _union(plate + z_ranges[len(plate):])
+        boxes_light = _union(plate)
+
+        plate_distance, module_distance = outline_extrude_distances(height, base)
+        outline_plate = [(0.0, plate_distance)] if plate_distance > 0 else []
+        outline_dark = _union(outline_plate + [(0.0, module_distance)])
+        outline_light = _union(outline_plate)
+
+        if outline_dark != boxes_dark or outline_light != boxes_light:
+            failures += 1
+            print(f'height {height}, base {base}: outline spans {outline_dark} over dark and {outline_light} over '
+                  f'light modules, boxes {boxes_dark} and {boxes_light}')
+    return failures
+
+
+def run():
+    failures = check_extrusions()
+    for name, rows, outer, holes in CASES:
+        qr_data = QRMatrix.from_rows(rows)
+        polygons = trace_outlines(qr_data)
+        problems = _problems(qr_data, polygons)
+        counts = (sum(not polygon.is_hole for polygon in polygons), sum(polygon.is_hole for polygon in polygons))
+        if counts != (outer, holes):
+            problems.append(f'{counts[0]} outer polygons and {counts[1]} holes, expected {outer} and {holes}')
+        if problems:
+            failures += 1
+            print(f'{name}: {"; ".join(problems[:3])}')
+
+    rng = random.Random(3)
+    matrices = [(f'version {version}', encoder.encode('QRCODER', version=version, error='H'))
+                for version in range(1, 41)]
+    for number in range(200):
+        size, density = rng.randint(1, 30), rng.random()
+        matrices.append((f'random {number}', QRMatrix(size, bytes(rng.random() < density for _ in range(size * size)))))
+
+    elapsed = 0.0
+    for name, qr_data in matrices:
+        start = time.perf_counter()
+        polygons = trace_outlines(qr_data)
+        elapsed += time.perf_counter() - start
+        problems = _problems(qr_data, polygons)
+        if problems:
+            failures += 1
+            print(f'{name}: {"; ".join(problems[:3])}')
+
+    version_40 = matrices[39][1]
+    polygons = trace_outlines(version_40)
+    corners = sum(len(polygon.points) for polygon in polygons)
+    print(f'Version 40: {len(polygons)} polygons, {sum(polygon.is_hole for polygon in polygons)} holes, '
+          f'{corners} corners')
+    print(f'{failures} failures, {elapsed:.2f} s tracing')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
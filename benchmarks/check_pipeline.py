@@ -0,0 +1,88 @@
+"""
+Check which preview stages rerun when one input changes, against the fake adsk backend.
+
+The make command's pipeline is run the way the preview and OK run it, once with the box solid preview and once
+with the mesh preview.  After every input change the stages that ran, from ``run_counts``, must be exactly the
+ones downstream of that input: a new sketch point only places the code again, a new block height rebuilds the
+solid and the mesh but keeps the matrix and layout, and an encoding option that yields the same matrix stops
+at the encode stage.  Placement runs on every pass, it draws the preview or makes the features.
+
+    python -m benchmarks.check_pipeline
+"""
+from benchmarks import fake_adsk
+
+ALL = {'encode', 'layout', 'solid', 'mesh', 'placement'}
+
+# Label, changed inputs, stages that must run
+CHANGES = [
+    ('first preview', {}, ALL),
+    ('nothing', {}, {'placement'}),
+    ('sketch_point', {'sketch_point': 'moved'}, {'placement'}),
+    ('block_height', {'block_height': .5}, {'solid', 'mesh', 'placement'}),
+    ('block_size', {'block_size': 1.0}, {'solid', 'mesh', 'placement'}),
+    ('base_height', {'base_height': 0.0}, {'solid', 'mesh', 'placement'}),
+    ('same matrix', {'error_type': 'H'}, {'encode', 'placement'}),
+    ('message', {'message': 'QRCODER 2'}, ALL),
+    ('error_type', {'error_type': 'L'}, ALL),
+    ('geometry_strategy', {'geometry_strategy': 'Outline'}, {'layout', 'solid', 'mesh', 'placement'}),
+    ('geometry_strategy back', {'geometry_strategy': 'Boxes'}, {'layout', 'solid', 'mesh', 'placement'}),
+    ('sketch_point again', {'sketch_point': 'moved back'}, {'placement'}),
+]
+
+
+def _input_values(sketch_point, mesh_preview: bool) -> dict:
+    return {
+        'message': 'QRCODER', 'use_user_size': False, 'user_size': 1, 'mode': 'Automatic', 'error_type': 'Automatic',
+        'geometry_strategy': 'Boxes', 'block_size': 1.27, 'block_height': .635, 'base_height': .635,
+        'mesh_preview': mesh_preview, 'sketch_point': [sketch_point],
+    }
+
+
+def _ran(pipeline, before: dict) -> set:
+    return {name for name, count in pipeline.run_counts.items() if count != before[name]}
+
+
+def run():
+    commands, root, sketch_point = fake_adsk.install()
+    failures = 0
+    for mesh_preview in (False, True):
+        commands.matrix_cache.invalidate()
+        commands.layout_cache.invalidate()
+        commands.solid_cache.invalidate()
+        maker = commands.QRCodeMaker('qr_check', {'is_make_qr': True})
+        maker.graphics_group = fake_adsk.CustomGraphicsGroup()
+        pipeline = maker.pipeline
+        input_values = _input_values(sketch_point, mesh_preview)
+
+        print(f'{"mesh" if mesh_preview else "solid"} preview')
+        for label, changes, expected in CHANGES:
+            for input_id, value in changes.items():
+                if input_id == 'sketch_point':
+                    value = [fake_adsk.SketchPoint(sketch_point.parentSketch, len(label), 0.0, 0.0)]
+                input_values = dict(input_values, **{input_id: value})
+
+            before = dict(pipeline.run_counts)
+            fake_adsk.recorder.reset()
+            maker.run_preview(input_values)
+            ran = _ran(pipeline, before)
+            boxes = fake_adsk.recorder.calls[None]['TemporaryBRepManager.createBox']
+            status = 'ok' if ran == expected else f'expected {", ".join(sorted(expected))}'
+            if ran != expected:
+                failures += 1
+            print(f'  {label:<24} {", ".join(sorted(ran)):<38} {boxes:5} boxes  {status}')
+
+        # OK reuses every result of the last preview and only makes the features
+        before = dict(pipeline.run_counts)
+        root.bRepBodies.items[:] = [fake_adsk.BRepBody(6, root)]
+        maker.on_execute(None, None, None, input_values)
+        ran = _ran(pipeline, before)
+        if ran != {'placement'} or len(root.bRepBodies.items) != 2:
+            failures += 1
+            print(f'  execute ran {", ".join(sorted(ran))} and made {len(root.bRepBodies.items) - 1} bodies')
+
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
@@ -0,0 +1,84 @@
+"""
+Check the rectangle cover that the box geometry is built from.
+
+For every version and for random matrices of all densities the rectangles must lie inside the matrix, cover
+every dark module and no light one, and not overlap, so the boxes add up to exactly the code.  The counts the
+cover reports must match: ``module_count`` is the dark module count and ``boxes_saved`` is the boxes saved
+against one box per module.  Stacking runs never adds boxes, so there are at most as many rectangles as
+horizontal runs.  Plain row lists must give the same cover as a QRMatrix.
+
+    python -m benchmarks.check_rectangles
+"""
+import random
+import time
+
+from core import encoder
+from core.matrix import QRMatrix
+from core.rectangles import merge_rectangles, row_runs
+
+
+def _problems(qr_data: QRMatrix, cover) -> list:
+    problems = []
+    size = qr_data.size
+    covered = bytearray(size * size)
+    for rectangle in cover.rectangles:
+        row, col, height, width = rectangle
+        if height < 1 or width < 1 or row < 0 or col < 0 or row + height > size or col + width > size:
+            problems.append(f'{rectangle} is outside the {size}x{size} matrix')
+            continue
+        for r in range(row, row + height):
+            for c in range(col, col + width):
+                covered[r * size + c] += 1
+
+    overlaps = sum(count > 1 for count in covered)
+    if overlaps:
+        problems.append(f'{overlaps} modules covered more than once')
+    dark = bytes(qr_data[r, c] for r in range(size) for c in range(size))
+    wrong = sum((count > 0) != (module == 1) for count, module in zip(covered, dark))
+    if wrong:
+        problems.append(f'{wrong} modules where the boxes and the dark modules differ')
+
+    runs = sum(len(row_runs(row)) for row in qr_data)
+    if cover.module_count != qr_data.dark_count:
+        problems.append(f'module_count {cover.module_count}, {qr_data.dark_count} dark modules')
+    if cover.boxes_saved != qr_data.dark_count - len(cover.rectangles):
+        problems.append(f'boxes_saved {cover.boxes_saved}, '
+                        f'{qr_data.dark_count} modules in {len(cover.rectangles)} boxes')
+    if cover.box_count > runs:
+        problems.append(f'{cover.box_count} boxes for {runs} runs')
+    if merge_rectangles([list(row) for row in qr_data]) != cover:
+        problems.append('row lists give a different cover')
+    return problems
+
+
+def run():
+    rng = random.Random(1)
+    matrices = [(f'version {version}', encoder.encode('QRCODER', version=version, error=error))
+                for version in range(1, 41) for error in ('L', 'H')]
+    for number in range(300):
+        size, density = rng.randint(1, 40), rng.random()
+        matrices.append((f'random {number}', QRMatrix(size, bytes(rng.random() < density for _ in range(size * size)))))
+    matrices.append(('empty', QRMatrix(21, bytes(21 * 21))))
+    matrices.append(('full', QRMatrix(21, bytes([1]) * (21 * 21))))
+
+    failures = 0
+    elapsed = 0.0
+    for name, qr_data in matrices:
+        start = time.perf_counter()
+        cover = merge_rectangles(qr_data)
+        elapsed += time.perf_counter() - start
+        problems = _problems(qr_data, cover)
+        if problems:
+            failures += 1
+            print(f'{name}: {"; ".join(problems[:3])}')
+
+    version_40 = merge_rectangles(matrices[79][1])
+    runs = sum(len(row_runs(row)) for row in matrices[79][1])
+    print(f'Version 40-H: {version_40.module_count} modules, {runs} runs, {version_40.box_count} boxes, '
+          f'{version_40.boxes_saved} saved')
+    print(f'{failures} failures, {elapsed:.2f} s merging')
+    return failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if run() else 0)
@@ -0,0 +1,503 @@
+"""
+Stand-in for the parts of the Fusion 360 API the add-in uses, for benchmarks outside Fusion.
+
+``install()`` registers fake ``adsk.core``, ``adsk.fusion`` and ``adsk.cam`` modules and a fake ``apper``,
+then imports the add-in's command module against them.  Every API call is counted by a ``Recorder`` under
+the stage that is active, together with a simulated kernel cost from ``COSTS`` so results reflect how many
+and how large kernel operations a change makes, not just python time.  Bodies only track a face count,
+booleans add the face counts of their operands like ``bench_unions`` does.
+
+Names the benchmarks never call resolve to placeholders, so annotations in the add-in still import.
+"""
+import importlib
+import importlib.util
+import math
+import os
+import sys
+import time
+import types
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = 'qrcoder_bench'
+
+# Simulated seconds per call, and per face of the operands for calls that scale with body size.
+# Rough orders of magnitude, only meant to rank changes against each other
+COSTS = {
+    'TemporaryBRepManager.createBox': (20e-6, 0.0),
+    'TemporaryBRepManager.booleanOperation': (50e-6, 4e-6),
+    'TemporaryBRepManager.copy': (10e-6, 1e-6),
+    'TemporaryBRepManager.transform': (10e-6, 1e-6),
+    'BaseFeatures.add': (20e-3, 0.0),
+    'BaseFeature.startEdit': (5e-3, 0.0),
+    'BaseFeature.finishEdit': (30e-3, 0.0),
+    'BRepBodies.add': (1e-3, 2e-6),
+    'CombineFeatures.add': (30e-3, 4e-6),
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.stage = None
+        self.calls = defaultdict(Counter)
+        self.simulated = Counter()
+        self.wall = Counter()
+
+    def record(self, name: str, faces: int = 0):
+        self.calls[self.stage][name] += 1
+        fixed, per_face = COSTS.get(name, (0.0, 0.0))
+        self.simulated[self.stage] += fixed + per_face * faces
+
+    @contextmanager
+    def measure(self, stage: str):
+        previous = self.stage
+        self.stage = stage
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.wall[stage] += time.perf_counter() - start
+            self.stage = previous
+
+    def reset(self):
+        self.__init__()
+
+    def report(self) -> dict:
+        stages = [stage for stage in self.wall]
+        return {
+            stage: {
+                'seconds': self.wall[stage],
+                'simulated_seconds': self.simulated[stage],
+                'calls': dict(self.calls[stage]),
+            }
+            for stage in stages
+        }
+
+
+recorder = Recorder()
+
+
+# adsk.core
+
+class Point3D:
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+    @staticmethod
+    def create(x=0.0, y=0.0, z=0.0):
+        recorder.record('Point3D.create')
+        return Point3D(x, y, z)
+
+    def copy(self):
+        recorder.record('Point3D.copy')
+        return Point3D(self.x, self.y, self.z)
+
+    def translateBy(self, vector):
+        recorder.record('Point3D.translateBy')
+        self.x += vector.x
+        self.y += vector.y
+        self.z += vector.z
+        return True
+
+
+class Vector3D(Point3D):
+    __slots__ = ()
+
+    @staticmethod
+    def create(x=0.0, y=0.0, z=0.0):
+        recorder.record('Vector3D.create')
+        return Vector3D(x, y, z)
+
+    def copy(self):
+        recorder.record('Vector3D.copy')
+        return Vector3D(self.x, self.y, self.z)
+
+    def normalize(self):
+        recorder.record('Vector3D.normalize')
+        length = math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z) or 1.0
+        self.x, self.y, self.z = self.x / length, self.y / length, self.z / length
+        return True
+
+    def scaleBy(self, scale):
+        recorder.record('Vector3D.scaleBy')
+        self.x, self.y, self.z = self.x * scale, self.y * scale, self.z * scale
+        return True
+
+    def crossProduct(self, other):
+        recorder.record('Vector3D.crossProduct')
+        return Vector3D(
+            self.y * other.z - self.z * other.y,
+            self.z * other.x - self.x * other.z,
+            self.x * other.y - self.y * other.x,
+        )
+
+
+class Matrix3D:
+    def __init__(self):
+        self.cells = [[1.0 if i == j else 0.0 for j in range(4)] for i in range(4)]
+
+    @staticmethod
+    def create():
+        recorder.record('Matrix3D.create')
+        return Matrix3D()
+
+    def setWithCoordinateSystem(self, origin, x_axis, y_axis, z_axis):
+        recorder.record('Matrix3D.setWithCoordinateSystem')
+        for row, axis in enumerate((x_axis, y_axis, z_axis)):
+            self.cells[0][row], self.cells[1][row], self.cells[2][row] = axis.x, axis.y, axis.z
+        self.cells[0][3], self.cells[1][3], self.cells[2][3] = origin.x, origin.y, origin.z
+        return True
+
+    @property
+    def translation(self):
+        return Vector3D(self.cells[0][3], self.cells[1][3], self.cells[2][3])
+
+    @translation.setter
+    def translation(self, vector):
+        self.cells[0][3], self.cells[1][3], self.cells[2][3] = vector.x, vector.y, vector.z
+
+    def transformBy(self, matrix):
+        recorder.record('Matrix3D.transformBy')
+        a, b = matrix.cells, self.cells
+        self.cells = [[sum(a[i][k] * b[k][j] for k in range(4)) for j in range(4)] for i in range(4)]
+        return True
+
+
+class OrientedBoundingBox3D:
+    def __init__(self, center, length_direction, width_direction, length, width, height):
+        self.centerPoint = center
+        self.lengthDirection = length_direction
+        self.widthDirection = width_direction
+        self.length, self.width, self.height = length, width, height
+
+    @staticmethod
+    def create(center, length_direction, width_direction, length, width, height):
+        recorder.record('OrientedBoundingBox3D.create')
+        return OrientedBoundingBox3D(center, length_direction, width_direction, length, width, height)
+
+
+class ObjectCollection:
+    def __init__(self):
+        self.items = []
+
+    @staticmethod
+    def create():
+        recorder.record('ObjectCollection.create')
+        return ObjectCollection()
+
+    def add(self, item):
+        recorder.record('ObjectCollection.add')
+        self.items.append(item)
+        return True
+
+    @property
+    def count(self):
+        return len(self.items)
+
+    def item(self, index):
+        return self.items[index]
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class Color:
+    @staticmethod
+    def create(red, green, blue, opacity):
+        return Color()
+
+
+class _UserInterface:
+    def __init__(self):
+        self.messages = []
+        self.selection = None
+
+    def messageBox(self, text, *args):
+        self.messages.append(text)
+
+    def selectEntity(self, prompt, filter_string):
+        return types.SimpleNamespace(entity=self.selection)
+
+
+class Application:
+    _instance = None
+
+    def __init__(self):
+        self.userInterface = _UserInterface()
+        self.activeViewport = types.SimpleNamespace(refresh=lambda: None)
+
+    @staticmethod
+    def get():
+        if Application._instance is None:
+            Application._instance = Application()
+        return Application._instance
+
+
+# adsk.fusion
+
+class BooleanTypes:
+    UnionBooleanType = 0
+    CutBooleanType = 1
+    IntersectBooleanType = 2
+
+
+class BRepEntityTypes:
+    BRepBodyEntityType = 0
+
+
+class FeatureOperations:
+    JoinFeatureOperation = 0
+    CutFeatureOperation = 1
+    IntersectFeatureOperation = 2
+    NewBodyFeatureOperation = 3
+
+
+class BRepBody:
+    __slots__ = ('faces', 'parentComponent')
+
+    def __init__(self, faces=6, component=None):
+        self.faces = faces
+        self.parentComponent = component
+
+
+class _CustomGraphicsEntity:
+    def __init__(self, group):
+        self.group = group
+        self.isValid = True
+        self.transform = None
+        self.color = None
+
+    def deleteMe(self):
+        self.isValid = False
+        self.group.items.remove(self)
+        return True
+
+
+class CustomGraphicsGroup(ObjectCollection):
+    def __iter__(self):
+        # Entities delete themselves while the add-in walks the group
+        return iter(list(self.items))
+
+    def addBRepBody(self, body):
+        recorder.record('CustomGraphicsGroup.addBRepBody', body.faces)
+        return self._add_entity()
+
+    def addMesh(self, coordinates, indices, normal_vectors, normal_indices):
+        recorder.record('CustomGraphicsGroup.addMesh')
+        return self._add_entity()
+
+    def _add_entity(self):
+        entity = _CustomGraphicsEntity(self)
+        self.items.append(entity)
+        return entity
+
+
+class CustomGraphicsSolidColorEffect:
+    @staticmethod
+    def create(color):
+        return CustomGraphicsSolidColorEffect()
+
+
+class CustomGraphicsCoordinates:
+    @staticmethod
+    def create(coordinates):
+        return CustomGraphicsCoordinates()
+
+
+class TemporaryBRepManager:
+    _instance = None
+
+    @staticmethod
+    def get():
+        if TemporaryBRepManager._instance is None:
+            TemporaryBRepManager._instance = TemporaryBRepManager()
+        return TemporaryBRepManager._instance
+
+    def createBox(self, box):
+        recorder.record('TemporaryBRepManager.createBox', 6)
+        return BRepBody(6)
+
+    def booleanOperation(self, target, tool, boolean_type):
+        recorder.record('TemporaryBRepManager.booleanOperation', target.faces + tool.faces)
+        target.faces += tool.faces
+        return True
+
+    def copy(self, body):
+        recorder.record('TemporaryBRepManager.copy', body.faces)
+        return BRepBody(body.faces)
+
+    def transform(self, body, matrix):
+        recorder.record('TemporaryBRepManager.transform', body.faces)
+        return True
+
+
+class _Bodies(ObjectCollection):
+    def __init__(self, component):
+        super().__init__()
+        self.component = component
+
+    def add(self, body, base_feature=None):
+        recorder.record('BRepBodies.add', body.faces)
+        real_body = BRepBody(body.faces, self.component)
+        self.items.append(real_body)
+        if base_feature is not None:
+            base_feature.bodies.items.append(real_body)
+        return real_body
+
+
+class BaseFeature:
+    def __init__(self):
+        self.bodies = ObjectCollection()
+
+    def startEdit(self):
+        recorder.record('BaseFeature.startEdit')
+        return True
+
+    def finishEdit(self):
+        recorder.record('BaseFeature.finishEdit')
+        return True
+
+
+class _BaseFeatures:
+    def add(self):
+        recorder.record('BaseFeatures.add')
+        return BaseFeature()
+
+
+class _CombineFeatures:
+    def createInput(self, target, tools):
+        recorder.record('CombineFeatures.createInput')
+        return types.SimpleNamespace(target=target, tools=tools)
+
+    def add(self, combine_input):
+        faces = combine_input.target.faces + sum(tool.faces for tool in combine_input.tools)
+        recorder.record('CombineFeatures.add', faces)
+        combine_input.target.faces = faces
+        return types.SimpleNamespace()
+
+
+class Component:
+    def __init__(self):
+        self.bRepBodies = _Bodies(self)
+        self.features = types.SimpleNamespace(baseFeatures=_BaseFeatures(), combineFeatures=_CombineFeatures())
+
+    def findBRepUsingPoint(self, point, entity_type, proximity, visible_only):
+        recorder.record('Component.findBRepUsingPoint')
+        found = ObjectCollection()
+        found.items.extend(self.bRepBodies.items[:1])
+        return found
+
+
+class Sketch:
+    def __init__(self, component):
+        self.parentComponent = component
+        self.referencePlane = None
+
+    @property
+    def xDirection(self):
+        return Vector3D(1.0, 0.0, 0.0)
+
+    @property
+    def yDirection(self):
+        return Vector3D(0.0, 1.0, 0.0)
+
+
+class SketchPoint:
+    def __init__(self, sketch, x=0.0, y=0.0, z=0.0):
+        self.parentSketch = sketch
+        self.worldGeometry = Point3D(x, y, z)
+
+    @staticmethod
+    def cast(entity):
+        return entity
+
+
+def _placeholder_module(name: str, attributes: dict) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+
+    def missing(attribute):
+        # Only reached for names the benchmarks never call, such as annotations of UI types
+        if attribute.startswith('__'):
+            raise AttributeError(attribute)
+        placeholder = type(attribute, (), {})
+        setattr(module, attribute, placeholder)
+        return placeholder
+
+    module.__getattr__ = missing
+    return module
+
+
+def _fake_apper(root: Component) -> types.ModuleType:
+    class AppObjects:
+        def __init__(self):
+            self.app = Application.get()
+            self.ui = self.app.userInterface
+            self.root_comp = root
+            self.design = types.SimpleNamespace(activeComponent=root, rootComponent=root)
+
+    class Fusion360CommandBase:
+        def __init__(self, name, options):
+            self.name = name
+            self.options = options
+
+    return _placeholder_module('apper', {'AppObjects': AppObjects, 'Fusion360CommandBase': Fusion360CommandBase})
+
+
+_installed = None
+
+
+def install():
+    """Register the fakes and return (command module, root component, sketch point)"""
+    global _installed
+    if _installed is not None:
+        return _installed
+
+    core = _placeholder_module('adsk.core', {
+        'Point3D': Point3D, 'Vector3D': Vector3D, 'Matrix3D': Matrix3D, 'OrientedBoundingBox3D': OrientedBoundingBox3D,
+        'ObjectCollection': ObjectCollection, 'Color': Color, 'Application': Application,
+    })
+    fusion = _placeholder_module('adsk.fusion', {
+        'BooleanTypes': BooleanTypes, 'BRepEntityTypes': BRepEntityTypes, 'FeatureOperations': FeatureOperations,
+        'BRepBody': BRepBody, 'TemporaryBRepManager': TemporaryBRepManager, 'Component': Component,
+        'Sketch': Sketch, 'SketchPoint': SketchPoint, 'CustomGraphicsGroup': CustomGraphicsGroup,
+        'CustomGraphicsSolidColorEffect': CustomGraphicsSolidColorEffect,
+        'CustomGraphicsCoordinates': CustomGraphicsCoordinates,
+    })
+    cam = _placeholder_module('adsk.cam', {})
+    adsk = _placeholder_module('adsk', {'core': core, 'fusion': fusion, 'cam': cam, 'doEvents': lambda: None})
+    sys.modules.update({'adsk': adsk, 'adsk.core': core, 'adsk.fusion': fusion, 'adsk.cam': cam})
+
+    root = Component()
+    # An existing body under the point, so placement goes through the combine path
+    root.bRepBodies.items.append(BRepBody(6, root))
+    sketch_point = SketchPoint(Sketch(root))
+    Application.get().userInterface.selection = sketch_point
+
+    # The add-in directory as a package, with apper replaced
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [ROOT]
+    sys.modules[PACKAGE] = package
+    apper_package = types.ModuleType(f'{PACKAGE}.apper')
+    apper_package.__path__ = []
+    apper_package.apper = _fake_apper(root)
+    sys.modules[f'{PACKAGE}.apper'] = apper_package
+    sys.modules[f'{PACKAGE}.apper.apper'] = apper_package.apper
+
+    commands = importlib.import_module(f'{PACKAGE}.commands.QRCodeMaker')
+    # Benchmarks time the encoding, entries left in the add-in's cache file by earlier runs would hide it
+    commands.config.disk_cache = False
+    _installed = commands, root, sketch_point
+    return _installed
+
+
+def load_importer_script():
+    """The standalone importer script, loaded as a module against the fakes"""
+    path = os.path.join(ROOT, 'scripts', 'QRCodeImporter', 'QRCodeImporter.py')
+    spec = importlib.util.spec_from_file_location('qrcoder_bench_importer', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
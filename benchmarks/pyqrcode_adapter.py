@@ -0,0 +1,27 @@
+"""
+Read pyqrcode's module structure straight into a QRMatrix, for the checks that compare against pyqrcode.
+
+``pyqrcode.QRCode.code`` holds the final module rows without a quiet zone, 1 for dark and 0 for light.
+Converting that directly skips rendering and re-parsing the text form of the code.  The add-in encodes with
+``core.encoder`` and never imports pyqrcode, so this lives with the benchmarks.
+"""
+from core.matrix import QRMatrix
+
+
+def matrix_from_pyqrcode(qr) -> QRMatrix:
+    code = qr.code
+    size = len(code)
+    packed = bytearray()
+    for row in code:
+        try:
+            # Rows are lists of 0 and 1 ints, which bytearray can take in one C level copy
+            packed.extend(row)
+        except (TypeError, ValueError):
+            packed.extend(1 if bit == 1 else 0 for bit in row)
+    return QRMatrix(size, packed)
+
+
+def matrix_from_text(qr) -> QRMatrix:
+    """The original text round trip, kept as the reference for matrix_from_pyqrcode"""
+    qr_text = qr.text(quiet_zone=0)
+    return QRMatrix.from_rows(x.strip() for x in qr_text.splitlines())
@@ -0,0 +1,153 @@
+"""
+QRCoder, a Fusion 360 add-in
+================================
+Batch creation of QR Codes from a list of messages.
+
+:copyright: (c) 2021 by Patrick Rainsberry.
+:license: MIT, see LICENSE for more details.
+"""
+import os.path
+import time
+
+import adsk.core
+import adsk.fusion
+import adsk.cam
+
+from ..apper import apper
+from .. import config
+from .QRCodeMaker import BASE, BLOCK, HEIGHT, get_cached_local_geometry, get_placement
+
+# Defaults
+SPACING = '.5 in'
+COLUMNS = 5
+
+
+def get_grid_placement(placement: adsk.core.Matrix3D, x: float, y: float) -> adsk.core.Matrix3D:
+    # Offset in the sketch plane first, then the sketch point placement
+    grid_placement = adsk.core.Matrix3D.create()
+    grid_placement.translation = adsk.core.Vector3D.create(x, y, 0)
+    grid_placement.transformBy(placement)
+    return grid_placement
+
+
+def make_batch_geometry(results, input_values) -> int:
+    from ..core import batch
+    from ..core.rectangles import merge_rectangles
+
+    side: float = input_values['block_size']
+    height: float = input_values['block_height']
+    base: float = input_values['base_height']
+    sketch_point: adsk.fusion.SketchPoint = input_values['sketch_point'][0]
+
+    encoded = [result for result in results if result.qr_data is not None]
+    if len(encoded) == 0:
+        return 0
+
+    offsets = batch.grid_offsets([len(result.qr_data) for result in encoded], side,
+                                 input_values['spacing'], input_values['columns'])
+    placement = get_placement(sketch_point)
+    b_mgr = adsk.fusion.TemporaryBRepManager.get()
+
+    ao = apper.AppObjects()
+    component = ao.design.activeComponent
+
+    # All codes go into one base feature edit
+    base_feature = component.features.baseFeatures.add()
+    base_feature.startEdit()
+    for result, (x, y) in zip(encoded, offsets):
+        local_body = get_cached_local_geometry(result.qr_data, merge_rectangles(result.qr_data), side, height, base)
+        placed_body = b_mgr.copy(local_body)
+        b_mgr.transform(placed_body, get_grid_placement(placement, x, y))
+        component.bRepBodies.add(placed_body, base_feature)
+    base_feature.finishEdit()
+    return len(encoded)
+
+
+def browse_for_messages():
+    ao = apper.AppObjects()
+
+    file_dialog = ao.ui.createFileDialog()
+    file_dialog.initialDirectory = config.app_path
+    file_dialog.filter = "Message lists (*.csv *.jsonl);;All files (*.*)"
+    file_dialog.isMultiSelectEnabled = False
+    file_dialog.title = 'Select message list to encode'
+    dialog_results = file_dialog.showOpen()
+
+    if dialog_results == adsk.core.DialogResults.DialogOK:
+        file_names = file_dialog.filenames
+        return file_names[0]
+    else:
+        return ''
+
+
+class QRBatchMaker(apper.Fusion360CommandBase):
+    def on_input_changed(self, command, inputs, changed_input, input_values):
+        if changed_input.id == 'browse':
+            changed_input.value = False
+            file_name = browse_for_messages()
+            if len(file_name) > 0:
+                inputs.itemById('file_name').value = file_name
+
+    def on_execute(self, command, inputs, args, input_values):
+        # The encoder and the pool are only loaded once a batch runs
+        from ..core import batch
+        ao = apper.AppObjects()
+        file_name: str = input_values['file_name']
+
+        try:
+            items = batch.read_messages(file_name)
+        except (OSError, ValueError) as e:
+            ao.ui.messageBox(f'Could not read message list: {e}')
+            return
+
+        progress_dialog = ao.ui.createProgressDialog()
+        progress_dialog.isCancelButtonShown = False
+        progress_dialog.show('QR Code Batch', 'Encoding %v of %m', 0, max(1, len(items)), 0)
+
+        def progress(done, total):
+            progress_dialog.progressValue = done
+            adsk.doEvents()
+
+        start = time.perf_counter()
+        try:
+            results, pooled = batch.encode_batch(items, config.batch_workers, config.batch_python or None, progress)
+            progress_dialog.message = 'Building geometry'
+            adsk.doEvents()
+            make_batch_geometry(results, input_values)
+        finally:
+            progress_dialog.hide()
+        elapsed = time.perf_counter() - start
+
+        report_name = os.path.splitext(file_name)[0] + '.report.csv'
+        try:
+            batch.write_report(results, report_name)
+            report_note = f'\nPer item timing written to {report_name}'
+        except OSError:
+            report_note = ''
+
+        ao.ui.messageBox(batch.summary(results, elapsed, pooled) + report_note)
+
+    def on_create(self, command, inputs):
+        ao = apper.AppObjects()
+
+        default_block_size = adsk.core.ValueInput.createByString(BLOCK)
+        default_block_height = adsk.core.ValueInput.createByString(HEIGHT)
+        default_base_height = adsk.core.ValueInput.createByString(BASE)
+        default_spacing = adsk.core.ValueInput.createByString(SPACING)
+        default_units = ao.units_manager.defaultLengthUnits
+
+        selection_input = inputs.addSelectionInput('sketch_point', "First Code Center", "Pick Sketch Point for center")
+        selection_input.addSelectionFilter("SketchPoints")
+
+        inputs.addValueInput('block_size', 'QR Block Size', default_units, default_block_size)
+        inputs.addValueInput('block_height', 'QR Block Height', default_units, default_block_height)
+        inputs.addValueInput('base_height', 'Base Height (Can be zero)', default_units, default_base_height)
+
+        group_input = inputs.addGroupCommandInput('group', 'Message List')
+        group_input.children.addStringValueInput('file_name', "File to encode (csv or jsonl)", '')
+        browse_button = group_input.children.addBoolValueInput('browse', 'Browse', False, '', False)
+        browse_button.isFullWidth = True
+
+        grid_input = inputs.addGroupCommandInput('grid', 'Grid Layout')
+        grid_input.children.addIntegerSpinnerCommandInput('columns', 'Codes per Row', 1, 1000, 1, COLUMNS)
+        grid_input.children.addValueInput('spacing', 'Spacing between Codes', default_units, default_spacing)
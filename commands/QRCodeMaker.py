@@ -42,8 +42,11 @@ QRCoder leverages the pyqrcode library:
     (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
     SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
-import csv
+import os
 import os.path
+import traceback
+from itertools import groupby
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 import adsk.core
 import adsk.fusion
@@ -51,6 +54,22 @@ import adsk.cam
 
 from ..apper import apper
 from .. import config
+from ..core.cache import LRUCache
+from ..core.chunks import FINISHED, ChunkRunner, ChunkStatus
+from ..core.layout import box_layout
+from ..core.matrix import QRMatrix
+from ..core.pipeline import StagePipeline
+from ..core.rectangles import RectangleCover
+from ..core.trace import tracer
+from ..core.unions import UnionBackend, balanced_union, smallest_first_union
+from ..core.worker import JobResult, LatestWorker
+
+# Only needed by some inputs and strategies, imported where they are used so loading the add-in stays cheap:
+# archives, decoding, file formats, meshes, outlines, components and the disk cache
+if TYPE_CHECKING:
+    from ..core.mesh import Mesh
+    from ..core.outline import Polygon
+    from ..core.store import DiskCache
 
 # Defaults
 BLOCK = '.5 in'
@@ -61,6 +80,35 @@ MESSAGE = 'https://tapnair.github.io/QRCoder/'
 # File assumed to be in script root directory
 FILE_NAME = 'QR-17x.csv'
 
+# Geometry strategies
+STRATEGY_BOXES = 'Boxes'
+STRATEGY_OUTLINE = 'Outline'
+
+# Preview stages
+STAGE_ENCODE = 'encode'
+STAGE_LAYOUT = 'layout'
+STAGE_SOLID = 'solid'
+STAGE_MESH = 'mesh'
+STAGE_PLACEMENT = 'placement'
+
+# Matrices keyed by encoding parameters, or by file path, modification time and size for imports
+matrix_cache = LRUCache(config.matrix_cache_entries, config.matrix_cache_bytes, lambda qr_data: len(qr_data.data))
+
+# Rectangle covers and outlines keyed by geometry strategy and matrix
+layout_cache = LRUCache(config.matrix_cache_entries)
+
+# Local frame QR solids keyed by matrix, block size, height and base
+solid_cache = LRUCache(config.solid_cache_entries)
+
+# Opened on first use, None when switched off in config or the file can not be opened
+_disk_cache = {}
+
+# How the SVG importer maps the written document into sketch space, learned on first use
+_svg_import = {'scale': 1.0, 'flip_y': False}
+
+# Recording stays off unless config switches it on, the QR Trace command changes it at run time
+tracer.configure(config.trace_buffer_size, config.trace_enabled, config.trace_memory)
+
 
 def get_target_body(sketch_point):
     ao = apper.AppObjects()
@@ -82,16 +130,18 @@ def make_real_geometry(target_body: adsk.fusion.BRepBody, temp_body: adsk.fusion
     else:
         component = target_body.parentComponent
 
-    base_feature = component.features.baseFeatures.add()
-    base_feature.startEdit()
-    component.bRepBodies.add(temp_body, base_feature)
-    base_feature.finishEdit()
+    with tracer.span('base_feature'):
+        base_feature = component.features.baseFeatures.add()
+        base_feature.startEdit()
+        component.bRepBodies.add(temp_body, base_feature)
+        base_feature.finishEdit()
 
     if target_body is not None:
-        tools = adsk.core.ObjectCollection.create()
-        tools.add(base_feature.bodies.item(0))
-        combine_input = component.features.combineFeatures.createInput(component.bRepBodies.item(0), tools)
-        component.features.combineFeatures.add(combine_input)
+        with tracer.span('combine'):
+            tools = adsk.core.ObjectCollection.create()
+            tools.add(base_feature.bodies.item(0))
+            combine_input = component.features.combineFeatures.createInput(component.bRepBodies.item(0), tools)
+            component.features.combineFeatures.add(combine_input)
 
 
 def clear_graphics(graphics_group: adsk.fusion.CustomGraphicsGroup):
@@ -100,20 +150,127 @@ def clear_graphics(graphics_group: adsk.fusion.CustomGraphicsGroup):
             entity.deleteMe()
 
 
-def make_graphics(t_body: adsk.fusion.BRepBody, graphics_group: adsk.fusion.CustomGraphicsGroup):
-    clear_graphics(graphics_group)
+def make_graphics(t_body: adsk.fusion.BRepBody, placement: adsk.core.Matrix3D,
+                  graphics_group: adsk.fusion.CustomGraphicsGroup):
+    with tracer.span('solid_graphics'):
+        clear_graphics(graphics_group)
+        color = adsk.core.Color.create(250, 162, 27, 255)
+        color_effect = adsk.fusion.CustomGraphicsSolidColorEffect.create(color)
+        graphics_body = graphics_group.addBRepBody(t_body)
+        graphics_body.transform = placement
+        graphics_body.color = color_effect
+
+
+def add_chunk_graphics(t_bodies: List[adsk.fusion.BRepBody], placement: adsk.core.Matrix3D,
+                       graphics_group: adsk.fusion.CustomGraphicsGroup):
+    # Partial preview of a chunked build, drawn as each chunk finishes
     color = adsk.core.Color.create(250, 162, 27, 255)
-    color_effect = adsk.fusion.CustomGraphicsSolidColorEffect.create(color)
-    graphics_body = graphics_group.addBRepBody(t_body)
-    graphics_body.color = color_effect
+    for t_body in t_bodies:
+        graphics_body = graphics_group.addBRepBody(t_body)
+        graphics_body.transform = placement
+        graphics_body.color = adsk.fusion.CustomGraphicsSolidColorEffect.create(color)
+    apper.AppObjects().app.activeViewport.refresh()
 
 
-def get_qr_temp_geometry(qr_data, input_values):
-    side: float = input_values['block_size']
-    height: float = input_values['block_height']
-    base: float = input_values['base_height']
-    sketch_point: adsk.fusion.SketchPoint = input_values['sketch_point'][0]
+def make_mesh_graphics(mesh: 'Mesh', placement: adsk.core.Matrix3D, graphics_group: adsk.fusion.CustomGraphicsGroup):
+    # The whole code as one mesh entity, Fusion computes the normals
+    with tracer.span('mesh_graphics', triangles=len(mesh.indices) // 3):
+        clear_graphics(graphics_group)
+        color = adsk.core.Color.create(250, 162, 27, 255)
+        color_effect = adsk.fusion.CustomGraphicsSolidColorEffect.create(color)
+        coordinates = adsk.fusion.CustomGraphicsCoordinates.create(mesh.coordinates.tolist())
+        graphics_mesh = graphics_group.addMesh(coordinates, mesh.indices.tolist(), [], [])
+        graphics_mesh.transform = placement
+        graphics_mesh.color = color_effect
+
+
+class TemporaryBRepUnion(UnionBackend):
+    def __init__(self, b_mgr: adsk.fusion.TemporaryBRepManager):
+        self.b_mgr = b_mgr
+
+    def union(self, target, tool):
+        self.b_mgr.booleanOperation(target, tool, adsk.fusion.BooleanTypes.UnionBooleanType)
+
+
+def box_components(qr_data: QRMatrix, cover: RectangleCover, base: float) -> List[int]:
+    # The base plate joins everything into one component, without it every island of modules is its own
+    if base > 0:
+        return [0] * (cover.box_count + 1)
 
+    from ..core.components import label_components, rectangle_components
+    with tracer.span('components', modules=qr_data.dark_count) as span:
+        components = label_components(qr_data)
+        span.set(components=components.count, largest=max(components.sizes, default=0))
+    return rectangle_components(cover, components)
+
+
+def build_qr_local_geometry(qr_data: QRMatrix, cover: RectangleCover, side: float, height: float, base: float,
+                            runner: ChunkRunner, on_chunk=None) -> Tuple[Optional[adsk.fusion.BRepBody], ChunkStatus]:
+    # Built centered on the origin in the XY plane, placement moves it onto the sketch point afterwards.
+    # Boxes are made in the chunks of the runner, base plate first and then rows top down, and joined per
+    # connected component, so only boxes that touch are unioned until the last step, which puts the component
+    # bodies together as the lumps of one body.  The joined pieces of every chunk are passed to on_chunk.
+    # The body is None when the runner stopped early.
+    x_dir = adsk.core.Vector3D.create(1, 0, 0)
+    y_dir = adsk.core.Vector3D.create(0, 1, 0)
+
+    b_mgr = adsk.fusion.TemporaryBRepManager.get()
+    union_backend = TemporaryBRepUnion(b_mgr)
+
+    with tracer.span('box_layout'):
+        layout = box_layout(cover, len(qr_data), side, height, base)
+    centers = layout.centers
+    sizes = layout.sizes
+
+    labels = box_components(qr_data, cover, base)
+    # Boxes of a component next to each other, in layout order within it
+    order = sorted(range(layout.box_count), key=labels.__getitem__)
+    # Joined bodies and their box counts per component
+    pieces: Dict[int, Tuple[list, list]] = {}
+
+    def build_chunk(start: int, end: int):
+        with tracer.span('chunk', boxes=end - start):
+            chunk_pieces = []
+            for label, boxes in groupby(order[start:end], labels.__getitem__):
+                t_bodies = []
+                with tracer.span('create_boxes') as span:
+                    for k in boxes:
+                        c_point = adsk.core.Point3D.create(centers[3 * k], centers[3 * k + 1], centers[3 * k + 2])
+                        b_box = adsk.core.OrientedBoundingBox3D.create(
+                            c_point, x_dir, y_dir, sizes[3 * k], sizes[3 * k + 1], sizes[3 * k + 2]
+                        )
+                        t_bodies.append(b_mgr.createBox(b_box))
+                    span.set(boxes=len(t_bodies))
+
+                with tracer.span('unions', unions=len(t_bodies) - 1):
+                    piece = balanced_union(t_bodies, union_backend)
+                bodies, weights = pieces.setdefault(label, ([], []))
+                bodies.append(piece)
+                weights.append(len(t_bodies))
+                chunk_pieces.append(piece)
+            if on_chunk is not None:
+                on_chunk(chunk_pieces)
+
+    status = runner.run(layout.box_count, build_chunk)
+    if status.state != FINISHED or len(pieces) == 0:
+        return None, status
+
+    with tracer.span('unions', unions=sum(len(bodies) for bodies, _ in pieces.values()) - 1):
+        component_bodies = [smallest_first_union(bodies, weights, union_backend) for bodies, weights in pieces.values()]
+        component_weights = [sum(weights) for _, weights in pieces.values()]
+        return smallest_first_union(component_bodies, component_weights, union_backend), status
+
+
+def get_qr_local_geometry(qr_data: QRMatrix, cover: RectangleCover, side: float, height: float, base: float):
+    return build_qr_local_geometry(qr_data, cover, side, height, base, ChunkRunner())[0]
+
+
+def get_cached_local_geometry(qr_data: QRMatrix, cover: RectangleCover, side: float, height: float, base: float):
+    key = (qr_data, side, height, base)
+    return solid_cache.get_or_create(key, lambda: get_qr_local_geometry(qr_data, cover, side, height, base))
+
+
+def get_placement(sketch_point: adsk.fusion.SketchPoint) -> adsk.core.Matrix3D:
     x_dir = sketch_point.parentSketch.xDirection
     x_dir.normalize()
     y_dir = sketch_point.parentSketch.yDirection
@@ -121,89 +278,263 @@ def get_qr_temp_geometry(qr_data, input_values):
     z_dir = x_dir.crossProduct(y_dir)
     z_dir.normalize()
 
-    qr_size = len(qr_data)
-    middle_point = sketch_point.worldGeometry
-    start_point = middle_point.copy()
+    placement = adsk.core.Matrix3D.create()
+    placement.setWithCoordinateSystem(sketch_point.worldGeometry, x_dir, y_dir, z_dir)
+    return placement
 
-    x_start_move = x_dir.copy()
-    x_start_move.scaleBy((.5 * side) * (1 - qr_size))
-    start_point.translateBy(x_start_move)
 
-    y_start_move = y_dir.copy()
-    y_start_move.scaleBy((.5 * side) * (qr_size - 1))
-    start_point.translateBy(y_start_move)
+def place_qr_geometry(local_body: adsk.fusion.BRepBody, sketch_point: adsk.fusion.SketchPoint):
+    # Works on a copy so the local body can be placed again when only the point changes
+    with tracer.span('place'):
+        b_mgr = adsk.fusion.TemporaryBRepManager.get()
+        placed_body = b_mgr.copy(local_body)
+        b_mgr.transform(placed_body, get_placement(sketch_point))
+    return placed_body
 
-    z_start_move = z_dir.copy()
-    z_start_move.scaleBy((.5 * height) + base)
-    start_point.translateBy(z_start_move)
 
-    base_point = middle_point.copy()
-    z_base_move = z_dir.copy()
-    z_base_move.scaleBy((.5 * base))
-    base_point.translateBy(z_base_move)
+def get_qr_temp_geometry(qr_data: QRMatrix, input_values):
+    local_body = get_cached_local_geometry(
+        qr_data, get_cached_layout(STRATEGY_BOXES, qr_data),
+        input_values['block_size'], input_values['block_height'], input_values['base_height']
+    )
+    return place_qr_geometry(local_body, input_values['sketch_point'][0])
 
-    b_mgr = adsk.fusion.TemporaryBRepManager.get()
 
-    has_base = True
-    if base > 0:
-        full_size = side * qr_size
-        base_t_box = adsk.core.OrientedBoundingBox3D.create(base_point, x_dir, y_dir, full_size, full_size, base)
-        base_t_body = b_mgr.createBox(base_t_box)
+def _import_outline_sketch(component, plane, polygons, qr_size, side):
+    sketch = component.sketches.add(plane)
+    sketch.isComputeDeferred = True
+
+    # Only the outline strategy writes files, so tempfile is not loaded with the add-in
+    import tempfile
+    from ..core.outline import svg_document
+    file_handle, svg_name = tempfile.mkstemp(suffix='.svg')
+    try:
+        with os.fdopen(file_handle, 'w') as f:
+            f.write(svg_document(polygons, qr_size, side * _svg_import['scale'], _svg_import['flip_y']))
+        sketch.importSVG(svg_name, 0, 0, 1)
+    finally:
+        os.remove(svg_name)
+
+    sketch.isComputeDeferred = False
+    return sketch
+
+
+def _measure_outline_sketch(sketch, polygons):
+    # Returns the imported module size and whether rows run down the sketch y axis as written
+    from ..core.outline import segment_dark_sides
+    x_values = [point[0] for polygon in polygons for point in polygon.points]
+    lines = sketch.sketchCurves.sketchLines
+    sketch_x = [line.startSketchPoint.geometry.x for line in lines]
+    module_size = (max(sketch_x) - min(sketch_x)) / (max(x_values) - min(x_values))
+
+    sides = segment_dark_sides(polygons)
+    y_values = [point[1] for polygon in polygons for point in polygon.points]
+    sketch_y = [line.startSketchPoint.geometry.y for line in lines]
+    matches = 0
+    for line in lines:
+        start = line.startSketchPoint.geometry
+        end = line.endSketchPoint.geometry
+        mid_x = round((start.x + end.x - 2 * min(sketch_x)) / module_size) + 2 * min(x_values)
+        mid_y = round((2 * max(sketch_y) - start.y - end.y) / module_size) + 2 * min(y_values)
+        if (mid_x, mid_y) in sides:
+            matches += 1
+
+    return module_size, matches * 2 >= lines.count
+
+
+def _dark_profiles(sketch, polygons, origin_x, origin_y, side):
+    # A profile is dark if it lies on the dark side of the top most segment of its outer loop
+    from ..core.outline import segment_dark_sides
+    sides = segment_dark_sides(polygons)
+    dark = adsk.core.ObjectCollection.create()
+    for profile in sketch.profiles:
+        for loop in profile.profileLoops:
+            if not loop.isOuter:
+                continue
+            top = None
+            for curve in loop.profileCurves:
+                line = curve.geometry
+                if abs(line.startPoint.y - line.endPoint.y) < 1e-9 * side:
+                    if top is None or line.startPoint.y > top.startPoint.y:
+                        top = line
+            mid_x = round((top.startPoint.x + top.endPoint.x - 2 * origin_x) / side)
+            mid_y = round((2 * origin_y - top.startPoint.y - top.endPoint.y) / side)
+            if sides.get((mid_x, mid_y)) == (0, 1):
+                dark.add(profile)
+    return dark
+
+
+def make_outline_geometry(qr_data: QRMatrix, input_values, target_body, polygons: List['Polygon'] = None):
+    from ..core.mesh import outline_extrude_distances
+    from ..core.outline import trace_outlines
+
+    side: float = input_values['block_size']
+    height: float = input_values['block_height']
+    base: float = input_values['base_height']
+    sketch_point: adsk.fusion.SketchPoint = input_values['sketch_point'][0]
+
+    ao = apper.AppObjects()
+    if target_body is None:
+        component = ao.design.activeComponent
     else:
-        has_base = False
+        component = target_body.parentComponent
+
+    qr_size = len(qr_data)
+    if polygons is None:
+        polygons = trace_outlines(qr_data)
+    plane = sketch_point.parentSketch.referencePlane
+
+    with tracer.span('import_svg', polygons=len(polygons)):
+        sketch = _import_outline_sketch(component, plane, polygons, qr_size, side)
+        module_size, rows_down = _measure_outline_sketch(sketch, polygons)
+        if abs(module_size - side) > 1e-6 * side or not rows_down:
+            # The importer units or axis convention differ from what was written, correct once per session
+            _svg_import['scale'] *= side / module_size
+            _svg_import['flip_y'] ^= not rows_down
+            sketch.deleteMe()
+            sketch = _import_outline_sketch(component, plane, polygons, qr_size, side)
+
+    # Move the code so the module grid is centered on the selected point
+    center = sketch.modelToSketchSpace(sketch_point.worldGeometry)
+    x_values = [line.startSketchPoint.geometry.x for line in sketch.sketchCurves.sketchLines]
+    y_values = [line.startSketchPoint.geometry.y for line in sketch.sketchCurves.sketchLines]
+    grid_x = [point[0] for polygon in polygons for point in polygon.points]
+    grid_y = [point[1] for polygon in polygons for point in polygon.points]
+    origin_x = min(x_values) - min(grid_x) * side
+    origin_y = max(y_values) + min(grid_y) * side
+
+    move = adsk.core.Matrix3D.create()
+    move.translation = adsk.core.Vector3D.create(
+        center.x - origin_x - .5 * side * qr_size, center.y - origin_y + .5 * side * qr_size, 0
+    )
+    curves = adsk.core.ObjectCollection.create()
+    for curve in sketch.sketchCurves:
+        curves.add(curve)
+    sketch.move(curves, move)
+    origin_x += move.translation.x
+    origin_y += move.translation.y
+
+    extrudes = component.features.extrudeFeatures
+    join = adsk.fusion.FeatureOperations.JoinFeatureOperation
+    new_body = adsk.fusion.FeatureOperations.NewBodyFeatureOperation
+    has_body = target_body is not None
+
+    plate_distance, module_distance = outline_extrude_distances(height, base)
+    if plate_distance > 0:
+        plate_sketch = component.sketches.add(plane)
+        full_size = side * qr_size
+        plate_sketch.sketchCurves.sketchLines.addCenterPointRectangle(
+            center, adsk.core.Point3D.create(center.x + .5 * full_size, center.y + .5 * full_size, 0)
+        )
+        extrudes.addSimple(
+            plate_sketch.profiles.item(0), adsk.core.ValueInput.createByReal(plate_distance),
+            join if has_body else new_body
+        )
+        has_body = True
+
+    # One extrude for every dark profile, up to the same module top as the boxes and the preview mesh
+    with tracer.span('extrude') as span:
+        dark = _dark_profiles(sketch, polygons, origin_x, origin_y, side)
+        span.set(profiles=dark.count)
+        extrudes.addSimple(dark, adsk.core.ValueInput.createByReal(module_distance), join if has_body else new_body)
+
+
+def get_disk_cache() -> Optional['DiskCache']:
+    if 'cache' not in _disk_cache:
+        cache = None
+        if config.disk_cache:
+            from ..core.store import open_cache
+            cache = open_cache(config.disk_cache_path, config.disk_cache_bytes)
+        _disk_cache['cache'] = cache
+    return _disk_cache['cache']
+
+
+def check_import(qr_data: QRMatrix, file_name: str) -> QRMatrix:
+    # Runs on every import, cached matrices included, before anything is built.  Raises ValueError for matrices
+    # that do not decode, unless building them anyway is switched on in config
+    if config.verify_imports:
+        from ..core.decoder import decode
+        with tracer.span('verify', size=len(qr_data)):
+            try:
+                decode(qr_data)
+            except ValueError as e:
+                if not config.build_unverified_imports:
+                    raise ValueError(f'not a valid QR code, {e}')
+                ao = apper.AppObjects()
+                ao.ui.messageBox(f'{os.path.basename(file_name)} does not read as a QR code and may not scan: {e}')
+    return qr_data
+
+
+def import_qr_from_file(file_name) -> QRMatrix:
+    from ..core.importers import read_matrix
+    qr_data = QRMatrix()
 
-    for i, row in enumerate(qr_data):
-        for j, col in enumerate(row):
-            if int(col) == 1:
-                x_move = x_dir.copy()
-                y_move = y_dir.copy()
-                x_move.scaleBy(j * side)
-                y_move.scaleBy(-1 * i * side)
+    if os.path.exists(file_name):
+        try:
+            # A file that is locked, removed or unreadable raises OSError, reported like a malformed one
+            stat = os.stat(file_name)
+            key = ('file', os.path.abspath(file_name), stat.st_mtime_ns, stat.st_size)
+            qr_data = check_import(matrix_cache.get_or_create(key, lambda: read_matrix(file_name)), file_name)
 
-                c_point = start_point.copy()
-                c_point.translateBy(x_move)
-                c_point.translateBy(y_move)
+        except (OSError, ValueError) as e:
+            ao = apper.AppObjects()
+            ao.ui.messageBox(f'Problem reading {os.path.basename(file_name)}: {e}')
 
-                b_box = adsk.core.OrientedBoundingBox3D.create(c_point, x_dir, y_dir, side, side, height + base)
-                t_body = b_mgr.createBox(b_box)
+    return qr_data
 
-                if not has_base:
-                    base_t_body = t_body
-                    has_base = True
-                else:
-                    b_mgr.booleanOperation(base_t_body, t_body, adsk.fusion.BooleanTypes.UnionBooleanType)
 
-    return base_t_body
+def is_archive(file_name: str) -> bool:
+    from ..core.archive import EXTENSION as ARCHIVE_EXTENSION
+    return file_name.lower().endswith(ARCHIVE_EXTENSION)
 
 
-def import_qr_from_file(file_name):
-    qr_data = []
+def import_qr_from_archive(file_name, number: int) -> QRMatrix:
+    from ..core.archive import ArchiveReader
+    qr_data = QRMatrix()
 
     if os.path.exists(file_name):
-        with open(file_name, newline='') as f:
-            reader = csv.reader(f)
-            qr_data = list(reader)
+        def read_entry():
+            with ArchiveReader(file_name) as reader:
+                return reader.matrix(number)
+
+        try:
+            stat = os.stat(file_name)
+            key = ('archive', os.path.abspath(file_name), stat.st_mtime_ns, stat.st_size, number)
+            qr_data = check_import(matrix_cache.get_or_create(key, read_entry), file_name)
+
+        except (OSError, ValueError, IndexError) as e:
+            ao = apper.AppObjects()
+            ao.ui.messageBox(f'Problem reading {os.path.basename(file_name)}: {e}')
 
     return qr_data
 
 
-@apper.lib_import(config.lib_path)
-def build_qr_code(message, args):
-    import pyqrcode
+def message_key(message, args) -> tuple:
+    from ..core.store import message_identity
+    return ('message',) + message_identity(message, args)
+
+
+def encode_message(message, args) -> QRMatrix:
+    from ..core.store import encode_cached
+    with tracer.span('encode', characters=len(message)) as span:
+        qr_data = matrix_cache.get_or_create(
+            message_key(message, args), lambda: encode_cached(get_disk_cache(), message, args)
+        )
+        span.set(size=len(qr_data), modules=qr_data.dark_count)
+    return qr_data
+
+
+def build_qr_code(message, args) -> QRMatrix:
     try:
-        qr = pyqrcode.create(message, **args)
-        qr_text = qr.text(quiet_zone=0)
-        qr_data = [[char for char in y] for y in (x.strip() for x in qr_text.splitlines()) if y]
-        return qr_data
+        return encode_message(message, args)
 
     except ValueError as e:
         ao = apper.AppObjects()
         ao.ui.messageBox(f'Problem with inputs: {e}')
-        return []
+        return QRMatrix()
 
 
-def make_qr_from_message(input_values):
-    message: str = input_values['message']
+def message_args(input_values) -> dict:
     use_user_size: bool = input_values['use_user_size']
     user_size: int = input_values['user_size']
     mode: str = input_values['mode']
@@ -216,12 +547,85 @@ def make_qr_from_message(input_values):
         args['mode'] = mode
     if error_type != 'Automatic':
         args['error'] = error_type
+    return args
+
+
+def make_qr_from_message(input_values) -> QRMatrix:
+    return build_qr_code(input_values['message'], message_args(input_values))
+
+
+def make_layout(strategy: str, qr_data: QRMatrix):
+    if strategy == STRATEGY_OUTLINE:
+        from ..core.outline import trace_outlines
+        with tracer.span('trace_outlines') as span:
+            polygons = trace_outlines(qr_data)
+            span.set(polygons=len(polygons))
+        return polygons
+
+    from ..core.store import merge_cached
+    with tracer.span('merge_rectangles', modules=qr_data.dark_count) as span:
+        cover = merge_cached(get_disk_cache(), qr_data)
+        span.set(boxes=cover.box_count)
+    return cover
+
+
+def get_cached_layout(strategy: str, qr_data: QRMatrix):
+    return layout_cache.get_or_create((strategy, qr_data), lambda: make_layout(strategy, qr_data))
+
+
+def layout_stage(input_values, qr_data: QRMatrix):
+    return get_cached_layout(input_values['geometry_strategy'], qr_data)
+
+
+def plan_message(message: str, args: dict, strategy: str):
+    # Runs on the worker thread, touches no API objects and leaves its results in the caches
+    with tracer.span('plan'):
+        get_cached_layout(strategy, encode_message(message, args))
+
+
+def is_planned(message: str, args: dict, strategy: str) -> bool:
+    qr_data = matrix_cache.get(message_key(message, args))
+    return qr_data is not None and (strategy, qr_data) in layout_cache
+
+
+class PlanReadyHandler(adsk.core.CustomEventHandler):
+    def __init__(self, command_maker: 'QRCodeMaker'):
+        super().__init__()
+        self.command_maker = command_maker
+
+    def notify(self, args: adsk.core.CustomEventArgs):
+        try:
+            self.command_maker.on_plan_ready(int(args.additionalInfo))
+        except:
+            apper.AppObjects().ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
+
+
+def mesh_stage(input_values, qr_data: QRMatrix):
+    # The outline strategy makes sketches and extrudes, which are too slow to redo for every preview
+    mesh_preview = input_values['mesh_preview'] or input_values['geometry_strategy'] == STRATEGY_OUTLINE
+    if len(qr_data) == 0 or not mesh_preview:
+        return None
+    from ..core.mesh import build_mesh
+    with tracer.span('build_mesh') as span:
+        mesh = build_mesh(
+            qr_data, input_values['block_size'], input_values['block_height'], input_values['base_height']
+        )
+        span.set(triangles=len(mesh.indices) // 3)
+    return mesh
 
-    success = apper.check_dependency('pyqrcode', config.lib_path)
 
-    if success:
-        qr_data = build_qr_code(message, args)
-        return qr_data
+def make_qr_geometry(input_values, qr_data: QRMatrix, layout, local_body):
+    sketch_point = input_values['sketch_point'][0]
+    target_body = get_target_body(sketch_point)
+
+    if input_values['geometry_strategy'] == STRATEGY_OUTLINE:
+        make_outline_geometry(qr_data, input_values, target_body, layout)
+    else:
+        if local_body is None:
+            local_body = get_cached_local_geometry(
+                qr_data, layout, input_values['block_size'], input_values['block_height'], input_values['base_height']
+            )
+        make_real_geometry(target_body, place_qr_geometry(local_body, sketch_point))
 
 
 def add_make_inputs(inputs: adsk.core.CommandInputs):
@@ -250,12 +654,73 @@ def add_make_inputs(inputs: adsk.core.CommandInputs):
     error_items.add('H', False, '')
 
 
+def add_strategy_input(inputs: adsk.core.CommandInputs):
+    drop_style = adsk.core.DropDownStyles.TextListDropDownStyle
+    strategy_input = inputs.addDropDownCommandInput('geometry_strategy', 'Geometry Strategy', drop_style)
+    strategy_items = strategy_input.listItems
+    strategy_items.add(STRATEGY_BOXES, True, '')
+    strategy_items.add(STRATEGY_OUTLINE, False, '')
+
+
 def add_csv_inputs(inputs: adsk.core.CommandInputs):
     inputs.addStringValueInput('file_name', "File to import", '')
 
     browse_button = inputs.addBoolValueInput('browse', 'Browse', False, '', False)
     browse_button.isFullWidth = True
 
+    # Only shown for archives
+    inputs.addStringValueInput('archive_key', 'Archive Key', '')
+    inputs.addIntegerSpinnerCommandInput('archive_entry', 'Archive Entry', 1, 1, 1, 1)
+    inputs.addTextBoxCommandInput('archive_info', 'Selected Code', '', 1, True)
+    update_archive_inputs(inputs, '')
+
+
+def update_archive_inputs(inputs: adsk.core.CommandInputs, file_name: str):
+    archive_inputs = [inputs.itemById(input_id) for input_id in ('archive_key', 'archive_entry', 'archive_info')]
+    count = 0
+    if is_archive(file_name) and os.path.exists(file_name):
+        from ..core.archive import ArchiveReader
+        try:
+            with ArchiveReader(file_name) as reader:
+                count = len(reader)
+        except (OSError, ValueError):
+            count = 0
+
+    for archive_input in archive_inputs:
+        archive_input.isVisible = count > 0
+    if count > 0:
+        entry_input = archive_inputs[1]
+        entry_input.maximumValue = count
+        entry_input.value = min(max(entry_input.value, 1), count)
+        show_archive_entry(inputs, file_name)
+
+
+def show_archive_entry(inputs: adsk.core.CommandInputs, file_name: str):
+    info_input = inputs.itemById('archive_info')
+    number = inputs.itemById('archive_entry').value - 1
+    from ..core.archive import ArchiveReader
+    try:
+        with ArchiveReader(file_name) as reader:
+            entry = reader.entry(number)
+            info_input.text = f'{entry.key} (version {entry.version})'
+    except (OSError, ValueError, IndexError):
+        info_input.text = ''
+
+
+def find_archive_entry(inputs: adsk.core.CommandInputs, file_name: str, key: str):
+    from ..core.archive import ArchiveReader
+    try:
+        with ArchiveReader(file_name) as reader:
+            number = reader.find(key)
+    except (OSError, ValueError):
+        number = None
+
+    if number is None:
+        inputs.itemById('archive_info').text = f'{key} not found'
+    else:
+        inputs.itemById('archive_entry').value = number + 1
+        show_archive_entry(inputs, file_name)
+
 
 # Create file browser dialog box
 def browse_for_csv():
@@ -263,9 +728,9 @@ def browse_for_csv():
 
     file_dialog = ao.ui.createFileDialog()
     file_dialog.initialDirectory = config.app_path
-    file_dialog.filter = ".csv files (*.csv)"
+    file_dialog.filter = "QR matrix files (*.csv *.txt *.bits *.hex *.pbm *.png *.qra);;All files (*.*)"
     file_dialog.isMultiSelectEnabled = False
-    file_dialog.title = 'Select csv file to import'
+    file_dialog.title = 'Select QR matrix file to import'
     dialog_results = file_dialog.showOpen()
 
     if dialog_results == adsk.core.DialogResults.DialogOK:
@@ -278,12 +743,150 @@ def browse_for_csv():
 class QRCodeMaker(apper.Fusion360CommandBase):
     def __init__(self, name: str, options: dict):
         super().__init__(name, options)
-        # self.graphics_group = None
+        self.graphics_group = None
         self.make_preview = True
+        self.executing = False
+        # Bumped on every input change, a chunked build started under an older value is stale
+        self.generation = 0
+        self.solid_status: Optional[ChunkStatus] = None
+        self.previewing = False
+        self.pending_values = None
         self.is_make_qr = options.get('is_make_qr', False)
+        self.pipeline = self.make_pipeline()
+
+        # Encoding and planning of messages on a worker thread, see plan_ready
+        self.command = None
+        self.worker = LatestWorker(self.on_plan_done)
+        self.plan_event = None
+        self.plan_handler = None
+        self.plan_event_id = f"{config.app_name}_{options.get('cmd_id', name)}_plan_ready"
+        self.plan_request = None
+        self.failed_request = None
+        self.plan_result: Optional[JobResult] = None
+
+    def make_pipeline(self) -> StagePipeline:
+        # Stages only rerun when one of their inputs or upstream results changed.  Placement draws the preview
+        # graphics, or makes the features on execute from the same stage results, so it runs every time.
+        if self.is_make_qr:
+            encode_inputs = ('message', 'use_user_size', 'user_size', 'mode', 'error_type')
+        else:
+            encode_inputs = ('file_name', 'archive_entry')
+
+        pipeline = StagePipeline(tracer=tracer)
+        pipeline.add_stage(STAGE_ENCODE, self.encode_stage, encode_inputs, compare=True)
+        pipeline.add_stage(STAGE_LAYOUT, layout_stage, ('geometry_strategy',), (STAGE_ENCODE,))
+        pipeline.add_stage(
+            STAGE_SOLID, self.solid_stage, ('block_size', 'block_height', 'base_height', 'mesh_preview'),
+            (STAGE_ENCODE, STAGE_LAYOUT)
+        )
+        pipeline.add_stage(
+            STAGE_MESH, mesh_stage, ('block_size', 'block_height', 'base_height', 'mesh_preview', 'geometry_strategy'),
+            (STAGE_ENCODE,)
+        )
+        pipeline.add_stage(
+            STAGE_PLACEMENT, self.placement_stage, ('sketch_point',),
+            (STAGE_ENCODE, STAGE_LAYOUT, STAGE_SOLID, STAGE_MESH), always=True
+        )
+        return pipeline
+
+    def encode_stage(self, input_values) -> QRMatrix:
+        if self.is_make_qr:
+            return make_qr_from_message(input_values)
+
+        file_name = input_values['file_name']
+        if is_archive(file_name):
+            return import_qr_from_archive(file_name, input_values['archive_entry'] - 1)
+        if len(file_name) > 0:
+            return import_qr_from_file(file_name)
+        return QRMatrix()
+
+    def make_runner(self) -> ChunkRunner:
+        # Execute builds everything in one go, the preview yields to Fusion between chunks
+        if self.executing:
+            return ChunkRunner()
+        generation = self.generation
+        budget = config.preview_budget if config.preview_budget > 0 else None
+        return ChunkRunner(budget, config.preview_chunk_time, adsk.doEvents, lambda: self.generation != generation)
+
+    def solid_stage(self, input_values, qr_data: QRMatrix, layout):
+        # With the mesh preview the solid is only needed on execute, where placement builds it
+        self.solid_status = None
+        if len(qr_data) == 0 or input_values['geometry_strategy'] == STRATEGY_OUTLINE or input_values['mesh_preview']:
+            return None
+
+        side: float = input_values['block_size']
+        height: float = input_values['block_height']
+        base: float = input_values['base_height']
+        key = (qr_data, side, height, base)
+        local_body = solid_cache.get(key)
+        if local_body is not None:
+            return local_body
+
+        clear_graphics(self.graphics_group)
+        placement = get_placement(input_values['sketch_point'][0])
+        local_body, self.solid_status = build_qr_local_geometry(
+            qr_data, layout, side, height, base, self.make_runner(),
+            None if self.executing else lambda bodies: add_chunk_graphics(bodies, placement, self.graphics_group)
+        )
+        if local_body is not None:
+            solid_cache.put(key, local_body)
+        return local_body
+
+    def placement_stage(self, input_values, qr_data: QRMatrix, layout, local_body, mesh) -> bool:
+        # Previews only draw graphics, the features and the combine are made once, on execute.
+        # Returns True when real geometry was made.
+        if len(qr_data) == 0:
+            clear_graphics(self.graphics_group)
+            return False
+
+        if self.executing:
+            clear_graphics(self.graphics_group)
+            make_qr_geometry(input_values, qr_data, layout, local_body)
+            return True
+
+        placement = get_placement(input_values['sketch_point'][0])
+        if mesh is not None:
+            make_mesh_graphics(mesh, placement, self.graphics_group)
+        elif local_body is not None:
+            make_graphics(local_body, placement, self.graphics_group)
+        # Otherwise the chunked build stopped early and the chunks drawn so far stay as the preview
+        return False
+
+    def plan_ready(self, input_values) -> bool:
+        """True when the matrix and layout for the inputs are cached, otherwise asks the worker for them.
+
+        The worker fires the plan event when done, which runs the preview again.  Inputs the worker failed on
+        are left to the preview, which reports the problem.
+        """
+        if self.plan_event is None:
+            return True
+
+        request = (input_values['message'], message_args(input_values), input_values['geometry_strategy'])
+        if request == self.failed_request or is_planned(*request):
+            return True
+
+        self.plan_request = request
+        self.worker.submit(plan_message, *request)
+        return False
+
+    def on_plan_done(self, result: JobResult):
+        # Worker thread, only hands the result over to the main thread
+        self.plan_result = result
+        apper.AppObjects().app.fireCustomEvent(self.plan_event_id, str(result.number))
+
+    def on_plan_ready(self, number: int):
+        result = self.plan_result
+        if self.command is None or result is None or result.number != number or not self.worker.is_current(number):
+            # The inputs changed while the job ran, the newer job reports when it is done
+            return
+        if result.error is not None:
+            self.failed_request = self.plan_request
+        self.make_preview = True
+        self.command.doExecutePreview()
 
     def on_input_changed(self, command, inputs, changed_input, input_values):
         self.make_preview = True
+        self.generation += 1
         if changed_input.id == 'use_user_size':
             if input_values['use_user_size']:
                 inputs.itemById('user_size').isEnabled = True
@@ -296,46 +899,81 @@ class QRCodeMaker(apper.Fusion360CommandBase):
             file_name = browse_for_csv()
             if len(file_name) > 0:
                 inputs.itemById('file_name').value = file_name
+                update_archive_inputs(inputs, file_name)
+        elif changed_input.id == 'file_name':
+            update_archive_inputs(inputs, input_values['file_name'])
+        elif changed_input.id == 'archive_key':
+            find_archive_entry(inputs, input_values['file_name'], input_values['archive_key'])
+        elif changed_input.id == 'archive_entry':
+            show_archive_entry(inputs, input_values['file_name'])
 
     def on_preview(self, command, inputs, args, input_values):
-        if self.make_preview:
-            ao = apper.AppObjects()
-
-            qr_data = []
-            if self.is_make_qr:
-                qr_data = make_qr_from_message(input_values)
-            else:
-                file_name = input_values['file_name']
-                if len(file_name) > 0:
-                    qr_data = import_qr_from_file(file_name)
-
-            if len(qr_data) > 0:
-                temp_body = get_qr_temp_geometry(qr_data, input_values)
-
-                target_body = get_target_body(input_values['sketch_point'][0])
-
-                # TODO Why is custom graphics so slow?
-                make_real_geometry(target_body, temp_body)
-                # make_graphics(t_body, self.graphics_group)
-                args.isValidResult = True
+        if self.previewing:
+            # Fusion handled new input while a chunked build yielded, the running preview picks it up
+            self.pending_values = input_values
+            return
 
+        if self.make_preview and self.plan_ready(input_values):
             self.make_preview = False
+            self.previewing = True
+            try:
+                with tracer.span('preview'):
+                    self.run_preview(input_values)
+            finally:
+                self.previewing = False
+
+    def run_preview(self, input_values):
+        while True:
+            self.pending_values = None
+            results = self.pipeline.run(input_values)
+            if self.solid_status is not None and self.solid_status.state != FINISHED:
+                # Not remembered, so the next run builds the solid again instead of reusing the missing result
+                self.pipeline.invalidate(STAGE_SOLID)
+            if self.pending_values is None:
+                return results
+            input_values = self.pending_values
 
     def on_execute(self, command, inputs, args, input_values):
-        # sketch_point: adsk.fusion.SketchPoint = input_values['sketch_point'][0]
-        # t_body = build_qr(input_values)
-        # make_real_geometry(sketch_point.parentSketch.parentComponent, t_body)
-        pass
+        # The preview is never a valid result, so this always runs.  Only placement has work left, the
+        # other stages return what they made for the last preview
+        self.executing = True
+        try:
+            with tracer.span('execute'):
+                self.pipeline.run(input_values)
+        finally:
+            self.executing = False
 
     def on_destroy(self, command, inputs, reason, input_values):
-        # clear_graphics(self.graphics_group)
-        # self.graphics_group.deleteMe()
-        pass
+        if self.graphics_group is not None and self.graphics_group.isValid:
+            clear_graphics(self.graphics_group)
+            self.graphics_group.deleteMe()
+        self.graphics_group = None
+
+        self.worker.cancel()
+        if self.plan_event is not None:
+            self.plan_event.remove(self.plan_handler)
+            apper.AppObjects().app.unregisterCustomEvent(self.plan_event_id)
+        self.plan_event = None
+        self.plan_handler = None
+        self.command = None
+
+        # The cache keeps lookup counts in memory, write them while the session has nothing else to do
+        disk_cache = _disk_cache.get('cache')
+        if disk_cache is not None:
+            disk_cache.flush()
 
     def on_create(self, command, inputs):
         ao = apper.AppObjects()
-        # self.graphics_group = ao.root_comp.customGraphicsGroups.add()
+        self.graphics_group = ao.root_comp.customGraphicsGroups.add()
         self.make_preview = True
+        self.pipeline.invalidate()
+
+        self.command = command
+        self.failed_request = None
+        if self.is_make_qr and config.background_encode:
+            self.plan_event = ao.app.registerCustomEvent(self.plan_event_id)
+            self.plan_handler = PlanReadyHandler(self)
+            self.plan_event.add(self.plan_handler)
 
         default_block_size = adsk.core.ValueInput.createByString(BLOCK)
         default_block_height = adsk.core.ValueInput.createByString(HEIGHT)
@@ -348,6 +986,8 @@ class QRCodeMaker(apper.Fusion360CommandBase):
         inputs.addValueInput('block_size', 'QR Block Size', default_units, default_block_size)
         inputs.addValueInput('block_height', 'QR Block Height', default_units, default_block_height)
         inputs.addValueInput('base_height', 'Base Height (Can be zero)', default_units, default_base_height)
+        add_strategy_input(inputs)
+        inputs.addBoolValueInput('mesh_preview', 'Fast mesh preview', True, '', False)
 
         group_input = inputs.addGroupCommandInput('group', 'QR Code Definition')
 
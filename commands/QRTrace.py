@@ -0,0 +1,79 @@
+"""
+QRCoder, a Fusion 360 add-in
+================================
+Debug command to switch stage tracing on and off and save the recorded spans.
+
+:copyright: (c) 2021 by Patrick Rainsberry.
+:license: MIT, see LICENSE for more details.
+"""
+import adsk.core
+import adsk.fusion
+import adsk.cam
+
+from ..apper import apper
+from .. import config
+from ..core.trace import tracer
+
+FORMAT_JSON = 'JSON'
+FORMAT_CHROME = 'Chrome trace'
+
+
+def browse_for_trace(chrome: bool):
+    ao = apper.AppObjects()
+
+    file_dialog = ao.ui.createFileDialog()
+    file_dialog.initialDirectory = config.app_path
+    if chrome:
+        file_dialog.filter = "Chrome trace (*.trace.json);;All files (*.*)"
+        file_dialog.initialFilename = 'qrcoder.trace.json'
+    else:
+        file_dialog.filter = "JSON (*.json);;All files (*.*)"
+        file_dialog.initialFilename = 'qrcoder-spans.json'
+    file_dialog.title = 'Save recorded spans'
+    dialog_results = file_dialog.showSave()
+
+    if dialog_results == adsk.core.DialogResults.DialogOK:
+        return file_dialog.filename
+    else:
+        return ''
+
+
+def trace_status() -> str:
+    state = 'on' if tracer.enabled else 'off'
+    memory = ', with memory' if tracer.memory else ''
+    return f'Tracing {state}{memory}, {len(tracer)} of {tracer.capacity} spans recorded'
+
+
+class QRTrace(apper.Fusion360CommandBase):
+    def on_input_changed(self, command, inputs, changed_input, input_values):
+        if changed_input.id == 'save':
+            changed_input.value = False
+            chrome = input_values['trace_format'] == FORMAT_CHROME
+            file_name = browse_for_trace(chrome)
+            if len(file_name) > 0:
+                try:
+                    tracer.dump(file_name, chrome)
+                except OSError as e:
+                    apper.AppObjects().ui.messageBox(f'Could not write {file_name}: {e}')
+        elif changed_input.id == 'clear':
+            changed_input.value = False
+            tracer.clear()
+        inputs.itemById('status').text = trace_status()
+
+    def on_execute(self, command, inputs, args, input_values):
+        tracer.configure(tracer.capacity, input_values['trace_enabled'], input_values['trace_memory'])
+
+    def on_create(self, command, inputs):
+        inputs.addTextBoxCommandInput('status', 'Status', trace_status(), 1, True)
+        inputs.addBoolValueInput('trace_enabled', 'Record preview spans', True, '', tracer.enabled)
+        inputs.addBoolValueInput('trace_memory', 'Record memory changes (slow)', True, '', tracer.memory)
+
+        drop_style = adsk.core.DropDownStyles.TextListDropDownStyle
+        format_input = inputs.addDropDownCommandInput('trace_format', 'File Format', drop_style)
+        format_input.listItems.add(FORMAT_CHROME, True, '')
+        format_input.listItems.add(FORMAT_JSON, False, '')
+
+        save_button = inputs.addBoolValueInput('save', 'Save Spans', False, '', False)
+        save_button.isFullWidth = True
+        clear_button = inputs.addBoolValueInput('clear', 'Clear Spans', False, '', False)
+        clear_button.isFullWidth = True
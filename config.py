@@ -3,8 +3,47 @@ import os.path
 app_name = 'QRCoder'
 company_name = "Autodesk"
 
+# Encoded and imported QR matrices kept in memory between previews
+matrix_cache_entries = 64
+matrix_cache_bytes = 8 * 1024 * 1024
+
+# QR solids built in their local frame, reused when only the placement changes
+solid_cache_entries = 8
+
+# Batch command worker processes, 0 for one per CPU and 1 to encode inside Fusion.  The python interpreter
+# for the workers is found next to Fusion's python when left empty
+batch_workers = 0
+batch_python = ''
+
+# Imported codes are decoded before any geometry is made, files that are not a valid QR code are rejected with
+# the reason.  Switch off to skip the check
+verify_imports = True
+
+# Build imports that fail the check anyway, after showing the reason, for patterns that are not meant to scan
+build_unverified_imports = False
+
+# Encoded matrices and rectangle layouts are also kept in a SQLite file next to the add-in, shared with the batch
+# command line and kept between sessions.  The least recently used entries go once it passes disk_cache_bytes
+disk_cache = True
+disk_cache_bytes = 64 * 1024 * 1024
+
+# Encode messages and plan their layout on a background thread, so typing a long message stays responsive
+background_encode = True
+
+# The box solid preview is built in chunks of about preview_chunk_time seconds, each drawn as it finishes, and
+# input changes are handled in between.  After preview_budget seconds the rest is left for OK, 0 for no limit
+preview_budget = 2.0
+preview_chunk_time = .1
+
+# Timing spans of the preview stages, kept in a ring buffer and saved from the QR Trace command.  Memory
+# changes use tracemalloc, which slows python down noticeably while it is on
+trace_enabled = False
+trace_memory = False
+trace_buffer_size = 4096
+
 
 # ***Ignore Below this line unless you are sure***
 lib_dir = 'lib'
 app_path = os.path.dirname(os.path.abspath(__file__))
 lib_path = os.path.join(app_path, lib_dir, '')
+disk_cache_path = os.path.join(app_path, 'cache', 'qrcoder.sqlite')
@@ -0,0 +1 @@
+"""Pure python QR matrix and geometry planning helpers.  Nothing in this package may import adsk."""
@@ -0,0 +1,222 @@
+"""
+Packed archive of many QR matrices in one file.
+
+Layout, all integers little endian::
+
+    header      magic b'QRCA', format u16, reserved u16, entry count u32, hash slot count u32
+    index       per entry: key offset u32, key length u32, QR version u16, reserved u16, data offset u64
+    hash table  per slot: entry number + 1 as u32, 0 for an empty slot, open addressing on crc32 of the key
+    keys        utf-8 keys back to back
+    data        per entry: modules row major, eight per byte, first module in the most significant bit
+
+The reader memory maps the file and checks the header and every index row once when it is opened, a file
+whose offsets point past its end or whose hash table is malformed is refused with a ValueError.  After that it
+only touches the index row and the data of the entries it is asked for, so fetching one code is O(1) in the
+size of the archive, by position or by key.
+
+    python -m core.archive library.qra QR-*.csv
+"""
+import mmap
+import os
+import struct
+import sys
+import zlib
+from collections import namedtuple
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .importers import read_matrix, validate_size
+from .matrix import QRMatrix, packed_length
+
+MAGIC = b'QRCA'
+FORMAT_VERSION = 1
+EXTENSION = '.qra'
+
+_HEADER = struct.Struct('<4sHHII')
+_ENTRY = struct.Struct('<IIHHQ')
+_SLOT = struct.Struct('<I')
+
+ArchiveEntry = namedtuple('ArchiveEntry', ['key', 'version', 'offset'])
+
+
+def _slot_count(entries: int) -> int:
+    # Power of two at least twice the entry count keeps probe chains short
+    slots = 1
+    while slots < 2 * entries:
+        slots <<= 1
+    return slots
+
+
+def _key_hash(key: bytes) -> int:
+    return zlib.crc32(key)
+
+
+def write_archive(file_name: str, entries: Iterable[Tuple[str, QRMatrix]]):
+    keys: List[bytes] = []
+    versions: List[int] = []
+    blobs: List[bytes] = []
+    seen = set()
+    for key, qr_data in entries:
+        encoded_key = key.encode('utf-8')
+        if encoded_key in seen:
+            raise ValueError(f'Duplicate archive key {key!r}')
+        try:
+            validate_size(qr_data.size)
+        except ValueError as e:
+            raise ValueError(f'Entry {key!r}: {e}')
+        seen.add(encoded_key)
+        keys.append(encoded_key)
+        versions.append((qr_data.size - 17) // 4)
+        blobs.append(qr_data.to_packed_bits())
+
+    count = len(keys)
+    slots = _slot_count(count)
+    key_start = _HEADER.size + count * _ENTRY.size + slots * _SLOT.size
+    data_start = key_start + sum(len(key) for key in keys)
+
+    table = [0] * slots
+    for number, key in enumerate(keys):
+        slot = _key_hash(key) & (slots - 1)
+        while table[slot]:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = number + 1
+
+    temp_name = file_name + '.tmp'
+    with open(temp_name, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, count, slots))
+        key_offset = key_start
+        data_offset = data_start
+        for key, version, blob in zip(keys, versions, blobs):
+            f.write(_ENTRY.pack(key_offset, len(key), version, 0, data_offset))
+            key_offset += len(key)
+            data_offset += len(blob)
+        f.write(struct.pack(f'<{slots}I', *table))
+        f.writelines(keys)
+        f.writelines(blobs)
+    # Readers never see a half written archive
+    os.replace(temp_name, file_name)
+
+
+class ArchiveReader:
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self._file = open(file_name, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f'{file_name} is empty, not a QR archive')
+
+        if len(self._map) < _HEADER.size:
+            self.close()
+            raise ValueError(f'{file_name} is not a QR archive')
+        magic, file_format, _, self._count, self._slots = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or file_format != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f'{file_name} is not a QR archive of format {FORMAT_VERSION}')
+        self._table_start = _HEADER.size + self._count * _ENTRY.size
+        try:
+            self._check_layout()
+        except ValueError:
+            self.close()
+            raise
+
+    def _check_layout(self):
+        # Every offset is checked once here, so a damaged or hostile file fails to open instead of reading
+        # past the end of the map or probing forever
+        file_size = len(self._map)
+        if self._slots & (self._slots - 1) or self._slots < max(self._count, 1):
+            raise ValueError(f'{self.file_name} is damaged, {self._slots} hash slots for {self._count} entries')
+        if self._table_start + self._slots * _SLOT.size > file_size:
+            raise ValueError(f'{self.file_name} is truncated, its index does not fit in {file_size} bytes')
+        index = self._map[_HEADER.size:self._table_start]
+        for number, (key_offset, key_length, version, _, data_offset) in enumerate(_ENTRY.iter_unpack(index)):
+            if not 1 <= version <= 40:
+                raise ValueError(f'{self.file_name} is damaged, entry {number} has QR version {version}')
+            if key_offset + key_length > file_size or data_offset + packed_length(17 + 4 * version) > file_size:
+                raise ValueError(f'{self.file_name} is truncated, entry {number} does not fit in {file_size} bytes')
+
+    def __enter__(self) -> 'ArchiveReader':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, number: int) -> Tuple[int, int, int, int]:
+        if not 0 <= number < self._count:
+            raise IndexError(f'Archive entry {number} out of range, archive has {self._count}')
+        key_offset, key_length, version, _, data_offset = _ENTRY.unpack_from(
+            self._map, _HEADER.size + number * _ENTRY.size
+        )
+        return key_offset, key_length, version, data_offset
+
+    def entry(self, number: int) -> ArchiveEntry:
+        key_offset, key_length, version, data_offset = self._entry(number)
+        return ArchiveEntry(self._map[key_offset:key_offset + key_length].decode('utf-8'), version, data_offset)
+
+    def entries(self) -> Iterator[ArchiveEntry]:
+        for number in range(self._count):
+            yield self.entry(number)
+
+    def keys(self) -> List[str]:
+        return [entry.key for entry in self.entries()]
+
+    def find(self, key: str) -> Optional[int]:
+        """Entry number of key, or None"""
+        if self._count == 0:
+            return None
+        encoded_key = key.encode('utf-8')
+        mask = self._slots - 1
+        slot = _key_hash(encoded_key) & mask
+        for _ in range(self._slots):
+            (value,) = _SLOT.unpack_from(self._map, self._table_start + slot * _SLOT.size)
+            if value == 0:
+                return None
+            if value > self._count:
+                raise ValueError(f'{self.file_name} is damaged, hash slot {slot} points past the last entry')
+            key_offset, key_length, _, _ = self._entry(value - 1)
+            if self._map[key_offset:key_offset + key_length] == encoded_key:
+                return value - 1
+            slot = (slot + 1) & mask
+        # A full table without the key
+        return None
+
+    def matrix(self, number: int) -> QRMatrix:
+        _, _, version, data_offset = self._entry(number)
+        size = 17 + 4 * version
+        return QRMatrix.from_packed_bits(size, self._map[data_offset:data_offset + packed_length(size)])
+
+    def get(self, key: str) -> Optional[QRMatrix]:
+        number = self.find(key)
+        return None if number is None else self.matrix(number)
+
+    def __getitem__(self, key: str) -> QRMatrix:
+        number = self.find(key)
+        if number is None:
+            raise KeyError(key)
+        return self.matrix(number)
+
+    def __contains__(self, key: str) -> bool:
+        return self.find(key) is not None
+
+
+def pack_files(archive_name: str, file_names: Iterable[str]) -> int:
+    """Archive matrix files under their base names, returns the entry count"""
+    entries = [(os.path.splitext(os.path.basename(name))[0], read_matrix(name)) for name in file_names]
+    write_archive(archive_name, entries)
+    return len(entries)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('usage: python -m core.archive ARCHIVE FILE...')
+        raise SystemExit(2)
+    print(f'{pack_files(sys.argv[1], sys.argv[2:])} entries written to {sys.argv[1]}')
@@ -0,0 +1,202 @@
+"""
+Batch encoding of message lists.
+
+Messages come from a CSV file (message, then optional version, error level and mode columns) or a JSONL
+file (one string or one object with ``message`` and optional ``version``, ``error`` and ``mode`` per line).
+They are encoded in a process pool, one result per item in input order, and a failing item is recorded
+rather than stopping the run.  That includes items the file already gets wrong, a version that is not a number
+or a line that is not valid JSON fails its own item only.  When the pool itself fails, the items it did not
+finish are encoded in this process.
+"""
+import csv
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from typing import Callable, List, Optional, Tuple
+
+from . import encoder
+
+# error is set for items that could not be read, they fail without being encoded
+BatchItem = namedtuple('BatchItem', ['index', 'message', 'options', 'error'])
+
+# qr_data is None when the item failed, error holds the reason.  seconds is the encode time of the item
+BatchResult = namedtuple('BatchResult', ['index', 'message', 'qr_data', 'seconds', 'error'])
+
+_OPTION_NAMES = ('version', 'error', 'mode')
+
+
+def _options(values) -> dict:
+    options = {}
+    for name, value in zip(_OPTION_NAMES, values):
+        if value in (None, '', 'Automatic'):
+            continue
+        if name == 'version':
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'Version {value!r} is not a number')
+        options[name] = value
+    return options
+
+
+def _item(index: int, message: str, values) -> BatchItem:
+    try:
+        return BatchItem(index, message, _options(values), None)
+    except ValueError as e:
+        return BatchItem(index, message, {}, str(e))
+
+
+def _read_csv(f) -> List[BatchItem]:
+    items = []
+    for row in csv.reader(f):
+        if len(row) == 0 or (len(items) == 0 and row[0].strip().lower() == 'message'):
+            continue
+        items.append(_item(len(items), row[0], [cell.strip() for cell in row[1:]]))
+    return items
+
+
+def _read_jsonl(f) -> List[BatchItem]:
+    items = []
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            # The line stands in for the message, so the report shows which one it was
+            items.append(BatchItem(len(items), line, {}, f'Line {number} is not valid JSON: {e}'))
+            continue
+        if isinstance(record, str):
+            record = {'message': record}
+        if not isinstance(record, dict) or 'message' not in record:
+            items.append(BatchItem(len(items), line, {}, f'Line {number} needs a message'))
+            continue
+        items.append(_item(len(items), str(record['message']), [record.get(n) for n in _OPTION_NAMES]))
+    return items
+
+
+def read_messages(file_name: str) -> List[BatchItem]:
+    with open(file_name, newline='', encoding='utf-8') as f:
+        if os.path.splitext(file_name)[1].lower() in ('.jsonl', '.ndjson'):
+            return _read_jsonl(f)
+        return _read_csv(f)
+
+
+def _encode_item(item: BatchItem) -> BatchResult:
+    # Runs in the worker processes, so it has to stay a module level function
+    start = time.perf_counter()
+    qr_data = None
+    error = item.error
+    if error is None:
+        try:
+            qr_data = encoder.encode(item.message, **item.options)
+        except (ValueError, TypeError, KeyError) as e:
+            error = str(e)
+    return BatchResult(item.index, item.message, qr_data, time.perf_counter() - start, error)
+
+
+def worker_python() -> Optional[str]:
+    """The interpreter worker processes are started with, None when there is no usable one.
+
+    Embedded hosts like Fusion 360 report their own executable in sys.executable, starting that as a worker
+    would start the host application, so look for the python interpreter that ships with it.
+    """
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+    for directory in (sys.prefix, os.path.join(sys.prefix, 'bin'), os.path.dirname(sys.executable)):
+        for name in ('python.exe', 'python3', 'python'):
+            candidate = os.path.join(directory, name)
+            if os.path.isfile(candidate):
+                return candidate
+    return None
+
+
+def _process_pool(workers: int, python: Optional[str]):
+    python = python or worker_python()
+    if python is None:
+        return None
+
+    # Imported here, they take longer to load than the rest of the add-in and only the batch command needs them
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    context = multiprocessing.get_context('spawn')
+    context.set_executable(python)
+    try:
+        return ProcessPoolExecutor(workers, mp_context=context)
+    except (OSError, ValueError, NotImplementedError):
+        return None
+
+
+def encode_batch(items: List[BatchItem], workers: int = 0, python: Optional[str] = None,
+                 progress: Optional[Callable[[int, int], None]] = None) -> Tuple[List[BatchResult], bool]:
+    """Encode every item, returns the results in input order and whether the process pool encoded all of them.
+
+    workers is the pool size, 0 for one per CPU and 1 to encode in this process.  progress is called with
+    the number of finished items and the total after every item.
+    """
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(items))
+
+    results: List[Optional[BatchResult]] = [None] * len(items)
+    done = 0
+    pool = _process_pool(workers, python) if workers > 1 else None
+
+    if pool is not None:
+        try:
+            with pool:
+                chunk_size = max(1, len(items) // (4 * workers))
+                for result in pool.map(_encode_item, items, chunksize=chunk_size):
+                    results[done] = result
+                    done += 1
+                    if progress is not None:
+                        progress(done, len(items))
+            return results, True
+        except Exception:
+            # Workers that can not start, can not import the add-in, die or can not be sent an item.  Whatever
+            # the pool did not finish is encoded in this process
+            pass
+
+    for index in range(done, len(items)):
+        results[index] = _encode_item(items[index])
+        if progress is not None:
+            progress(index + 1, len(items))
+    return results, False
+
+
+def grid_offsets(sizes: List[int], side: float, gap: float, columns: int) -> List[Tuple[float, float]]:
+    """Centers of codes laid out in rows of columns, relative to the center of the first code.
+
+    Every cell of the grid is as large as the largest code, rows run towards -Y.
+    """
+    if len(sizes) == 0:
+        return []
+    columns = max(1, columns)
+    pitch = max(sizes) * side + gap
+    return [((k % columns) * pitch, -(k // columns) * pitch) for k in range(len(sizes))]
+
+
+def write_report(results: List[BatchResult], file_name: str):
+    with open(file_name, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['index', 'message', 'size', 'seconds', 'error'])
+        for result in results:
+            size = len(result.qr_data) if result.qr_data is not None else ''
+            writer.writerow([result.index, result.message, size, f'{result.seconds:.6f}', result.error or ''])
+
+
+def summary(results: List[BatchResult], elapsed: float, pooled: bool, max_failures: int = 10) -> str:
+    failures = [result for result in results if result.error is not None]
+    encode_time = sum(result.seconds for result in results)
+    lines = [
+        f'{len(results) - len(failures)} of {len(results)} codes encoded in {elapsed:.2f} s '
+        f'({encode_time:.2f} s encoding, {"process pool" if pooled else "single process"})'
+    ]
+    for result in failures[:max_failures]:
+        lines.append(f'  {result.index + 1}: {result.message[:40]!r} failed: {result.error}')
+    if len(failures) > max_failures:
+        lines.append(f'  ... and {len(failures) - max_failures} more')
+    return '\n'.join(lines)
@@ -0,0 +1,104 @@
+"""
+Bounded LRU cache with hit and miss counters.
+
+Used to keep encoded and imported QR matrices between previews, so changing an input that has no effect
+on the matrix (block size, height, base) does not encode or parse again.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional
+
+
+class LRUCache:
+    def __init__(self, max_entries: int = 64, max_bytes: Optional[int] = None,
+                 size_of: Optional[Callable[[Any], int]] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_of = size_of if size_of is not None else (lambda value: 0)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+        self._entries = OrderedDict()
+        self._hooks: List[Callable[[Optional[Hashable]], None]] = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value):
+        size = self.size_of(value)
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            self._evict()
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]):
+        """Return the cached value, or build it with factory and cache it"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        value = factory()
+        self.put(key, value)
+        return value
+
+    def _evict(self):
+        while self._entries and (
+                len(self._entries) > self.max_entries or
+                (self.max_bytes is not None and self.bytes > self.max_bytes and len(self._entries) > 1)
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def add_invalidation_hook(self, hook: Callable[[Optional[Hashable]], None]):
+        """hook(key) is called after invalidate, with None when the whole cache was cleared"""
+        self._hooks.append(hook)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.bytes = 0
+            elif key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+        for hook in self._hooks:
+            hook(key)
+
+    def resize(self, max_entries: int, max_bytes: Optional[int] = None):
+        with self._lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self._evict()
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
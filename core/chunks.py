@@ -0,0 +1,61 @@
+"""
+Time budgeted, cancellable work in chunks.
+
+Long loops on the UI thread, such as creating and joining the boxes of a large code, are split into chunks.
+The first chunk is a single item, so something can be shown right away, later chunks are sized from the
+measured time per item to take about ``chunk_time`` each.  Between chunks ``pause`` is called, which lets
+the host process pending events, and ``cancelled`` is checked, which lets those events stop stale work.
+When the total time passes ``budget`` the run stops early and reports how far it got.  A runner with no
+budget, pause or cancel check does all the work as one chunk.
+"""
+import time
+from collections import namedtuple
+from typing import Callable, Optional
+
+FINISHED = 'finished'
+CANCELLED = 'cancelled'
+OVER_BUDGET = 'over budget'
+
+# done of count items were processed in chunks chunks
+ChunkStatus = namedtuple('ChunkStatus', ['state', 'done', 'count', 'chunks', 'seconds'])
+
+
+class ChunkRunner:
+    def __init__(self, budget: Optional[float] = None, chunk_time: float = .05,
+                 pause: Optional[Callable[[], None]] = None, cancelled: Optional[Callable[[], bool]] = None,
+                 clock: Callable[[], float] = time.perf_counter):
+        self.budget = budget
+        self.chunk_time = chunk_time
+        self.pause = pause
+        self.cancelled = cancelled
+        self.clock = clock
+
+    def run(self, count: int, work: Callable[[int, int], None]) -> ChunkStatus:
+        """Calls work(start, end) on consecutive ranges of range(count) until done, cancelled or over budget"""
+        start_time = self.clock()
+        done = 0
+        chunks = 0
+        # Nothing to interleave with, so all in one go
+        size = count if self.budget is None and self.pause is None and self.cancelled is None else 1
+        while done < count:
+            chunk_start = self.clock()
+            end = min(count, done + size)
+            work(done, end)
+            chunks += 1
+            now = self.clock()
+            per_item = (now - chunk_start) / (end - done)
+            done = end
+            if done == count:
+                break
+
+            if self.pause is not None:
+                self.pause()
+            if self.cancelled is not None and self.cancelled():
+                return ChunkStatus(CANCELLED, done, count, chunks, self.clock() - start_time)
+            if self.budget is not None and self.clock() - start_time >= self.budget:
+                return ChunkStatus(OVER_BUDGET, done, count, chunks, self.clock() - start_time)
+
+            # Grow at most fourfold per chunk, timing one small chunk is too noisy to jump straight to the target
+            size = max(1, min(4 * size, int(self.chunk_time / per_item) if per_item > 0 else 4 * size))
+
+        return ChunkStatus(FINISHED, done, count, chunks, self.clock() - start_time)
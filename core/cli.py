@@ -0,0 +1,293 @@
+"""
+Command line batch driver.
+
+Encodes a message list (csv or jsonl, see ``core.batch``) or reads every entry of a matrix archive, and writes
+one file per code: an STL or 3MF mesh, an SVG outline, or the matrix as csv or bits.  Work is spread over a
+pool of worker processes, each of which encodes and writes its own files.
+
+Output files are named after the message or archive key plus a short hash of the item itself, so names are
+unique and do not depend on where an item sits in the list.  Every finished item is appended to
+``manifest.jsonl`` in the output directory with a hash of everything the output depends on.  A rerun skips
+items whose hash is in the manifest and whose output exists, so an interrupted run picks up where it stopped,
+and a changed, inserted or reordered message or setting only rebuilds what it affects.  Items that are the same
+in every respect, such as a message listed twice with the same options, are built once.
+
+With ``--verify`` every code is decoded (see ``core.decoder``) and checked against its message before it is
+written, a code that does not read back is recorded as failed.
+
+With ``--cache`` encoded matrices are also kept in a shared cache file (see ``core.store``), such as the one of
+the add-in, so messages encoded before, by the add-in or another run, are read back instead of encoded again.
+
+    python -m core.cli tags.csv -o out --format stl --workers 8
+    python -m core.cli library.qra -o out --format 3mf
+    python -m core.cli tags.csv -o out --cache cache/qrcoder.sqlite
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from .archive import EXTENSION as ARCHIVE_EXTENSION, ArchiveReader
+from .batch import read_messages
+from .decoder import verify
+from .export import write_3mf, write_stl
+from .matrix import QRMatrix
+from .outline import svg_document, trace_outlines
+from .store import DiskCache, encode_cached, open_cache
+
+MANIFEST = 'manifest.jsonl'
+FORMATS = ('stl', '3mf', 'svg', 'csv', 'bits')
+
+# Part of every content hash, bump it when the output of an existing format changes
+OUTPUT_VERSION = 1
+
+# message and options for message lists, archive and entry for archives.  error is set for list items that
+# could not be read, they fail without being built
+Task = namedtuple('Task', ['name', 'message', 'options', 'archive', 'entry', 'digest', 'error'])
+# cache_path is None without a cache file
+Settings = namedtuple(
+    'Settings', ['output_dir', 'file_format', 'side', 'height', 'base', 'cache_path', 'cache_bytes', 'verify']
+)
+TaskResult = namedtuple('TaskResult', ['name', 'digest', 'seconds', 'error'])
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9._-]+')
+
+# Archive readers opened by a worker process, kept for the life of the process
+_readers: Dict[str, ArchiveReader] = {}
+
+# Cache files opened by a worker process, None for files that could not be opened
+_caches: Dict[str, Optional[DiskCache]] = {}
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _safe_name(text: str, length: int = 60) -> str:
+    return _UNSAFE.sub('_', text)[:length].strip('_') or 'qr'
+
+
+def _task_name(text: str, identity) -> str:
+    # The hash keeps names apart that only differ in characters the safe name drops or cuts off
+    return f'{_safe_name(text, 40)}-{_digest(identity)[:12]}'
+
+
+def output_path(settings: Settings, name: str) -> str:
+    return os.path.join(settings.output_dir, f'{name}.{settings.file_format}')
+
+
+def make_tasks(input_name: str, settings: Settings) -> List[Task]:
+    geometry = (OUTPUT_VERSION, settings.file_format, settings.side, settings.height, settings.base)
+    tasks = {}
+    if input_name.lower().endswith(ARCHIVE_EXTENSION):
+        with ArchiveReader(input_name) as reader:
+            for number, entry in enumerate(reader.entries()):
+                identity = (entry.key, reader.matrix(number).to_packed_bits().hex())
+                name = _task_name(entry.key, identity)
+                tasks.setdefault(name, Task(name, None, None, input_name, number, _digest(geometry, identity), None))
+        return list(tasks.values())
+
+    for item in read_messages(input_name):
+        identity = (item.message, item.options, item.error)
+        name = _task_name(item.message, identity)
+        tasks.setdefault(
+            name, Task(name, item.message, item.options, None, None, _digest(geometry, identity), item.error)
+        )
+    return list(tasks.values())
+
+
+def read_manifest(output_dir: str) -> Dict[str, str]:
+    """Name of every item that finished without error, by hash.  A torn last line from a crash is ignored"""
+    done = {}
+    try:
+        with open(os.path.join(output_dir, MANIFEST), encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get('error') is None:
+                    done[record['digest']] = record['name']
+                else:
+                    done.pop(record['digest'], None)
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def _close_caches():
+    # Writes the lookup counts the caches keep in memory
+    for cache in _caches.values():
+        if cache is not None:
+            cache.close()
+    _caches.clear()
+
+
+def _init_worker():
+    # Pool workers leave through multiprocessing's exit handling, not atexit
+    multiprocessing.util.Finalize(None, _close_caches, exitpriority=10)
+
+
+def _cache(settings: Settings) -> Optional[DiskCache]:
+    if settings.cache_path is None:
+        return None
+    if settings.cache_path not in _caches:
+        _caches[settings.cache_path] = open_cache(settings.cache_path, settings.cache_bytes)
+    return _caches[settings.cache_path]
+
+
+def _matrix(task: Task, settings: Settings) -> QRMatrix:
+    if task.archive is None:
+        return encode_cached(_cache(settings), task.message, task.options)
+    reader = _readers.get(task.archive)
+    if reader is None:
+        reader = _readers[task.archive] = ArchiveReader(task.archive)
+    return reader.matrix(task.entry)
+
+
+def _write(qr_data: QRMatrix, settings: Settings, file_name: str):
+    file_format = settings.file_format
+    if file_format == 'stl':
+        write_stl(file_name, qr_data, settings.side, settings.height, settings.base)
+    elif file_format == '3mf':
+        write_3mf(file_name, qr_data, settings.side, settings.height, settings.base)
+    else:
+        if file_format == 'svg':
+            text = svg_document(trace_outlines(qr_data), qr_data.size, settings.side, units='mm')
+        elif file_format == 'csv':
+            text = '\n'.join(','.join('1' if col else '0' for col in row) for row in qr_data) + '\n'
+        else:
+            text = qr_data.to_text() + '\n'
+        with open(file_name, 'w', newline='') as f:
+            f.write(text)
+
+
+def run_task(settings: Settings, task: Task) -> TaskResult:
+    start = time.perf_counter()
+    file_name = output_path(settings, task.name)
+    # Written under a temporary name so an interrupted write never looks finished
+    temp_name = f'{file_name}.{os.getpid()}.tmp'
+    try:
+        if task.error is not None:
+            raise ValueError(task.error)
+        qr_data = _matrix(task, settings)
+        if settings.verify:
+            verify(qr_data, task.message)
+        _write(qr_data, settings, temp_name)
+        os.replace(temp_name, file_name)
+        error = None
+    except Exception as e:
+        # Whatever goes wrong fails this item only, the rest of the run and the manifest go on
+        error = f'{type(e).__name__}: {e}'
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+    return TaskResult(task.name, task.digest, time.perf_counter() - start, error)
+
+
+def pending_tasks(tasks: List[Task], settings: Settings, force: bool = False) -> List[Task]:
+    done = {} if force else read_manifest(settings.output_dir)
+    return [
+        task for task in tasks
+        if task.digest not in done or not os.path.exists(output_path(settings, task.name))
+    ]
+
+
+def run(tasks: List[Task], settings: Settings, workers: int = 0, log=sys.stdout) -> Tuple[int, int]:
+    """Runs the tasks and appends them to the manifest, returns the finished and failed counts"""
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    finished = failed = 0
+    start = time.perf_counter()
+    last_report = start
+
+    pool = None
+    if workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(workers, len(tasks)), _init_worker)
+        chunk_size = max(1, min(64, len(tasks) // (8 * workers)))
+        results = pool.imap_unordered(partial(run_task, settings), tasks, chunk_size)
+    else:
+        results = map(partial(run_task, settings), tasks)
+
+    try:
+        with open(os.path.join(settings.output_dir, MANIFEST), 'a', encoding='utf-8') as manifest:
+            for result in results:
+                manifest.write(json.dumps(result._asdict()) + '\n')
+                manifest.flush()
+                if result.error is None:
+                    finished += 1
+                else:
+                    failed += 1
+                    print(f'{result.name}: {result.error}', file=log)
+
+                now = time.perf_counter()
+                if now - last_report >= 5 or finished + failed == len(tasks):
+                    rate = (finished + failed) / max(now - start, 1e-9)
+                    remaining = (len(tasks) - finished - failed) / rate if rate else 0
+                    print(f'{finished + failed}/{len(tasks)} done, {rate:.1f} per s, {remaining:.0f} s left',
+                          file=log)
+                    last_report = now
+        if pool is not None:
+            # Workers that exit on their own close their caches
+            pool.close()
+            pool.join()
+            pool = None
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        _close_caches()
+    return finished, failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m core.cli', description='Encode and export QR codes in bulk')
+    parser.add_argument('input', help=f'message list (.csv or .jsonl) or matrix archive ({ARCHIVE_EXTENSION})')
+    parser.add_argument('-o', '--output-dir', required=True)
+    parser.add_argument('-f', '--format', default='stl', choices=FORMATS)
+    parser.add_argument('-w', '--workers', type=int, default=0, help='worker processes, 0 for one per CPU')
+    parser.add_argument('--force', action='store_true', help='rebuild items that are already done')
+    parser.add_argument('--verify', action='store_true', help='decode every code and check it before writing')
+    parser.add_argument('--cache', metavar='PATH', help='cache file for encoded matrices, shared between runs')
+    parser.add_argument('--cache-mb', type=float, default=64, help='size limit of the cache file')
+    # Defaults match the add-in, .5 in blocks with .25 in height and base, in millimeters
+    parser.add_argument('--block-size', type=float, default=12.7)
+    parser.add_argument('--block-height', type=float, default=6.35)
+    parser.add_argument('--base-height', type=float, default=6.35)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    settings = Settings(args.output_dir, args.format, args.block_size, args.block_height, args.base_height,
+                        args.cache, int(args.cache_mb * 1024 * 1024), args.verify)
+
+    try:
+        tasks = make_tasks(args.input, settings)
+    except (OSError, ValueError) as e:
+        print(f'Could not read {args.input}: {e}', file=sys.stderr)
+        return 2
+
+    pending = pending_tasks(tasks, settings, args.force)
+    print(f'{len(tasks)} items, {len(tasks) - len(pending)} already done')
+    if len(pending) == 0:
+        return 0
+
+    finished, failed = run(pending, settings, args.workers)
+    print(f'{finished} written, {failed} failed')
+    if settings.cache_path is not None:
+        cache = open_cache(settings.cache_path, settings.cache_bytes)
+        if cache is not None:
+            stats = cache.stats
+            cache.close()
+            print(f'Cache: {stats["hits"]} hits, {stats["misses"]} misses ({stats["hit_rate"]:.1%}), '
+                  f'{stats["bytes_read"] / 1e6:.2f} MB read, {stats["seconds_saved"]:.1f} s of encoding saved')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
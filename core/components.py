@@ -0,0 +1,103 @@
+"""
+Connected components of the dark modules of a QR matrix.
+
+Dark modules are 4-connected, modules that only touch at a corner are in different components.  Without a
+base plate every component is a separate solid, so the geometry builders join the boxes of each component
+on their own and never union bodies that do not touch.
+
+Labelling runs a union-find over the dark runs of each row instead of single modules: a run is joined with
+every run of the row above that shares a column.  Components are numbered in the order their first module
+appears, top row first and left to right.
+"""
+from array import array
+from collections import namedtuple
+from typing import List
+
+from .matrix import QRMatrix
+from .rectangles import RectangleCover
+
+
+class ComponentLabels(namedtuple('ComponentLabels', ['size', 'labels', 'sizes'])):
+    """labels: component of every module, row major, -1 for light modules.  sizes: module count per component"""
+    __slots__ = ()
+
+    @property
+    def count(self) -> int:
+        return len(self.sizes)
+
+    def label(self, row: int, col: int) -> int:
+        return self.labels[row * self.size + col]
+
+
+def label_components(qr_data: QRMatrix) -> ComponentLabels:
+    size = len(qr_data)
+    parent: List[int] = []
+    run_rows = []
+
+    def find(node: int) -> int:
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    previous = []
+    for row, runs in enumerate(qr_data.iter_runs()):
+        current = []
+        first = 0
+        for start, end in runs:
+            node = len(parent)
+            parent.append(node)
+            run_rows.append((row, start, end))
+
+            # Runs above are sorted, the ones that end before this run starts can not reach later runs either
+            while first < len(previous) and previous[first][1] <= start:
+                first += 1
+            above = first
+            while above < len(previous) and previous[above][0] < end:
+                a, b = find(previous[above][2]), find(node)
+                if a != b:
+                    # The earlier run stays the root, so roots come first in scan order
+                    parent[max(a, b)] = min(a, b)
+                above += 1
+            current.append((start, end, node))
+        previous = current
+
+    labels = array('i', [-1]) * (size * size)
+    sizes: List[int] = []
+    root_labels = {}
+    for node, (row, start, end) in enumerate(run_rows):
+        root = find(node)
+        label = root_labels.get(root)
+        if label is None:
+            label = root_labels[root] = len(sizes)
+            sizes.append(0)
+        offset = row * size
+        labels[offset + start:offset + end] = array('i', [label]) * (end - start)
+        sizes[label] += end - start
+
+    return ComponentLabels(size, labels, sizes)
+
+
+def rectangle_components(cover: RectangleCover, components: ComponentLabels) -> List[int]:
+    """Component of every rectangle of a cover, a rectangle never spans two components"""
+    return [components.label(rectangle.row, rectangle.col) for rectangle in cover.rectangles]
+
+
+def component_stats(components: ComponentLabels) -> dict:
+    """Component count and size distribution, histogram buckets are powers of two: 1, 2-3, 4-7, ..."""
+    sizes = sorted(components.sizes)
+    histogram = {}
+    for component_size in sizes:
+        low = 1 << (component_size.bit_length() - 1)
+        bucket = '1' if low == 1 else f'{low}-{2 * low - 1}'
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+
+    return {
+        'count': len(sizes),
+        'modules': sum(sizes),
+        'largest': sizes[-1] if sizes else 0,
+        'smallest': sizes[0] if sizes else 0,
+        'median': sizes[len(sizes) // 2] if sizes else 0,
+        'singles': histogram.get('1', 0),
+        'histogram': histogram,
+    }
@@ -0,0 +1,379 @@
+"""
+QR decoder for clean module matrices, to check codes before any geometry is built.
+
+Works on matrices as the encoder writes them or the importers read them, with no image processing: the size
+gives the version, the format field the error level and mask, the data modules are unmasked and read in
+placement order, de-interleaved into their blocks, checked and corrected with Reed-Solomon, and the
+segments are decoded back to the payload.
+
+Being a check and not a camera reader it is strict where a scanner would be lenient: function patterns must
+be exact.  Format and version fields may have up to 3 wrong bits and every block up to half its error
+correction words wrong, as the standard allows; those are corrected and counted.
+
+Unmasking is one XOR over the whole matrix, held in a python int or a NumPy array, and the data modules
+are gathered with a precomputed index per version.  Blocks that check out, which is all of them for an
+encoder's output, cost one remainder on the encoder's GF(256) tables.  Only damaged blocks go through
+syndromes, Berlekamp-Massey, a Chien search and Forney's formula, all on log and antilog tables.
+
+    python -m core.decoder QR-17x.csv library.qra
+"""
+import sys
+import time
+from collections import namedtuple
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Optional, Tuple
+
+from . import qr_tables as tables
+from .encoder import ec_codewords, format_cells, mask_cells, symbol_template
+from .matrix import QRMatrix
+from .optional import load_numpy
+
+_TO_ASCII_BITS = bytes.maketrans(b'\x00\x01', b'01')
+
+_MODE_NAMES = {number: name for name, number in tables.MODES.items()}
+
+# Format field value to (error level, mask)
+_FORMATS = {tables.FORMAT_BITS[error][mask]: (error, mask) for error in 'LMQH' for mask in range(8)}
+
+
+class Decoded(namedtuple('Decoded', ['data', 'version', 'error', 'mask', 'modes', 'corrected'])):
+    """data: the payload bytes.  modes: mode name of every segment.  corrected: wrong bits in the format and
+    version fields plus wrong code words in the data, all fixed
+    """
+    __slots__ = ()
+
+    @property
+    def text(self) -> str:
+        # The encoder's byte mode default, kanji segments hold Shift JIS
+        return self.data.decode('shiftjis' if 'kanji' in self.modes else 'iso-8859-1')
+
+
+def _bit_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+@lru_cache(maxsize=None)
+def _version_reader(version: int):
+    """Everything needed to read a version, computed once per version"""
+    size = tables.version_size(version)
+    modules, region, order = symbol_template(version)
+
+    # Function pattern modules that must match the template, format and version fields are checked on their own
+    fixed = bytearray(1 - value for value in region)
+    format_indices = [row * size + col for row, col in sum(format_cells(size), [])]
+    version_cells = ([], [])
+    if version >= 7:
+        for k in range(18):
+            row, col = k // 3, size - 11 + k % 3
+            version_cells[0].append(row * size + col)
+            version_cells[1].append(col * size + row)
+    for index in format_indices + version_cells[0] + version_cells[1]:
+        fixed[index] = 0
+    fixed_mask = int.from_bytes(fixed, 'big')
+    pattern = int.from_bytes(modules, 'big') & fixed_mask
+
+    data_order = order[:8 * (tables.raw_codewords(version))]
+    return size, fixed_mask, pattern, format_indices, version_cells, itemgetter(*data_order), data_order
+
+
+@lru_cache(maxsize=None)
+def _mask_value(size: int, mask: int) -> int:
+    return int.from_bytes(mask_cells(size)[mask], 'big')
+
+
+@lru_cache(maxsize=None)
+def _block_readers(version: int, error: str):
+    """(data words, getter of the block's code words out of the interleaved sequence) per block"""
+    ec_words, blocks_1, data_1, blocks_2, data_2 = tables.BLOCK_LAYOUT[version][error]
+    sizes = [data_1] * blocks_1 + [data_2] * blocks_2
+    positions = [[] for _ in sizes]
+    index = 0
+    for k in range(max(sizes)):
+        for block, size in enumerate(sizes):
+            if k < size:
+                positions[block].append(index)
+                index += 1
+    for k in range(ec_words):
+        for block in positions:
+            block.append(index)
+            index += 1
+    return [(size, itemgetter(*block)) for size, block in zip(sizes, positions)]
+
+
+def _read_field(bits: bytes, cells: List[int]) -> int:
+    value = 0
+    for index in cells:
+        value = value << 1 | bits[index]
+    return value
+
+
+def _read_format(data: bytes, format_indices: List[int]) -> Tuple[str, int, int]:
+    """(error level, mask, wrong bits) from the better of the two format copies"""
+    best = None
+    for cells in (format_indices[:15], format_indices[15:]):
+        value = _read_field(data, cells)
+        for code, level_mask in _FORMATS.items():
+            distance = _bit_distance(value, code)
+            if best is None or distance < best[0]:
+                best = (distance, level_mask)
+    distance, (error, mask) = best
+    if distance > 3:
+        raise ValueError(f'No valid format information, {distance} bits away from the closest')
+    return error, mask, distance
+
+
+def _check_version(data: bytes, version: int, version_cells) -> int:
+    # Version fields list bit 0 first
+    expected = tables.VERSION_BITS[version]
+    distance = min(_bit_distance(_read_field(data, cells[::-1]), expected) for cells in version_cells)
+    if distance > 3:
+        raise ValueError(f'The version information does not match a {tables.version_size(version)} module code')
+    return distance
+
+
+@lru_cache(maxsize=None)
+def _numpy_order(version: int):
+    numpy = load_numpy()
+    return numpy.array(_version_reader(version)[-1], dtype=numpy.intp)
+
+
+def _unmask(data: bytes, version: int, mask: int, use_numpy: bool) -> bytes:
+    """Data code words in placement order, unmasked"""
+    size, _, _, _, _, getter, _ = _version_reader(version)
+    numpy = load_numpy() if use_numpy else None
+    if numpy is not None:
+        modules = numpy.frombuffer(data, dtype=numpy.uint8) ^ numpy.frombuffer(mask_cells(size)[mask], numpy.uint8)
+        return numpy.packbits(modules[_numpy_order(version)]).tobytes()
+
+    unmasked = (int.from_bytes(data, 'big') ^ _mask_value(size, mask)).to_bytes(size * size, 'big')
+    bits = bytes(getter(unmasked)).translate(_TO_ASCII_BITS)
+    return int(bits, 2).to_bytes(len(bits) // 8, 'big')
+
+
+def _poly_eval(poly: List[int], x: int) -> int:
+    # Highest degree first
+    exp, log = tables.GF_EXP, tables.GF_LOG
+    x_log = log[x]
+    value = 0
+    for coefficient in poly:
+        value = (exp[log[value] + x_log] if value else 0) ^ coefficient
+    return value
+
+
+def _poly_add(a: List[int], b: List[int]) -> List[int]:
+    # Lowest degree first
+    if len(a) < len(b):
+        a, b = b, a
+    return [x ^ y for x, y in zip(a, b)] + a[len(b):]
+
+
+def correct_block(block: bytearray, ec_words: int) -> int:
+    """Reed-Solomon correct a data plus error correction block in place, returns the number of wrong words"""
+    exp, log = tables.GF_EXP, tables.GF_LOG
+    syndromes = [_poly_eval(block, exp[i]) for i in range(ec_words)]
+    if not any(syndromes):
+        return 0
+
+    # Berlekamp-Massey, polynomials lowest degree first
+    locator = [1]
+    previous = [1]
+    length = 0
+    shift = 1
+    previous_log = 0
+    for i in range(ec_words):
+        delta = syndromes[i]
+        for j in range(1, length + 1):
+            if j < len(locator) and locator[j] and syndromes[i - j]:
+                delta ^= exp[log[locator[j]] + log[syndromes[i - j]]]
+        if delta == 0:
+            shift += 1
+            continue
+        # locator -= delta / b * x^shift * previous
+        factor_log = (log[delta] - previous_log) % 255
+        update = [0] * shift + [exp[log[c] + factor_log] if c else 0 for c in previous]
+        old_locator = locator
+        locator = _poly_add(locator, update)
+        if 2 * length <= i:
+            length = i + 1 - length
+            previous = old_locator
+            previous_log = log[delta]
+            shift = 1
+        else:
+            shift += 1
+    while len(locator) > 1 and locator[-1] == 0:
+        locator.pop()
+    count = len(locator) - 1
+    if 2 * count > ec_words:
+        raise ValueError('Too many errors to correct')
+
+    # Chien search: a root at alpha^-p means an error in the coefficient of x^p
+    length = len(block)
+    positions = [p for p in range(length) if _poly_eval(locator[::-1], exp[255 - p]) == 0]
+    if len(positions) != count:
+        raise ValueError('Too many errors to correct')
+
+    # Forney, evaluator = syndromes * locator mod x^ec_words
+    evaluator = [0] * ec_words
+    for i, s in enumerate(syndromes):
+        if s:
+            for j, c in enumerate(locator[:ec_words - i]):
+                if c:
+                    evaluator[i + j] ^= exp[log[s] + log[c]]
+    derivative = [locator[j] if j % 2 else 0 for j in range(1, len(locator))]
+    for p in positions:
+        x_inverse = exp[255 - p]
+        numerator = _poly_eval(evaluator[::-1], x_inverse)
+        denominator = _poly_eval(derivative[::-1], x_inverse)
+        if denominator == 0:
+            raise ValueError('Too many errors to correct')
+        magnitude = exp[(p + log[numerator] - log[denominator]) % 255] if numerator else 0
+        block[length - 1 - p] ^= magnitude
+
+    if any(_poly_eval(block, exp[i]) for i in range(ec_words)):
+        raise ValueError('Too many errors to correct')
+    return count
+
+
+def _read_segments(words: bytes, version: int) -> Tuple[bytes, List[str]]:
+    bits = format(int.from_bytes(words, 'big'), f'0{8 * len(words)}b')
+    data = bytearray()
+    modes = []
+    position = 0
+
+    def take(length: int) -> int:
+        nonlocal position
+        if position + length > len(bits):
+            raise ValueError('A segment runs past the end of the data')
+        value = int(bits[position:position + length], 2)
+        position += length
+        return value
+
+    while len(bits) - position >= 4:
+        mode = take(4)
+        if mode == 0:
+            break
+        if mode not in _MODE_NAMES:
+            raise ValueError(f'Segment mode {mode} is not supported')
+        modes.append(_MODE_NAMES[mode])
+        count = take(tables.length_bits(version, mode))
+
+        if mode == 1:
+            for k in range(0, count, 3):
+                digits = min(3, count - k)
+                value = take((4, 7, 10)[digits - 1])
+                if value >= 10 ** digits:
+                    raise ValueError('Invalid numeric segment')
+                data += str(value).zfill(digits).encode('ascii')
+        elif mode == 2:
+            for k in range(0, count, 2):
+                if count - k >= 2:
+                    value = take(11)
+                    if value >= 45 * 45:
+                        raise ValueError('Invalid alphanumeric segment')
+                    data += (tables.ALPHANUMERIC[value // 45] + tables.ALPHANUMERIC[value % 45]).encode('ascii')
+                else:
+                    value = take(6)
+                    if value >= 45:
+                        raise ValueError('Invalid alphanumeric segment')
+                    data += tables.ALPHANUMERIC[value].encode('ascii')
+        elif mode == 4:
+            data += take(8 * count).to_bytes(count, 'big') if count else b''
+        else:
+            for _ in range(count):
+                value = take(13)
+                value = (value // 0xC0) << 8 | value % 0xC0
+                value += 0x8140 if value < 0x1F00 else 0xC140
+                data += value.to_bytes(2, 'big')
+    return bytes(data), modes
+
+
+def decode(qr_data: QRMatrix, use_numpy: Optional[bool] = None) -> Decoded:
+    """Decode a clean module matrix, raises ValueError when it is not a valid QR code"""
+    size = len(qr_data)
+    if size < 21 or size > 177 or (size - 17) % 4 != 0:
+        raise ValueError(f'{size}x{size} is not a QR code size')
+    version = (size - 17) // 4
+    _, fixed_mask, pattern, format_indices, version_cells, _, _ = _version_reader(version)
+
+    data = qr_data.data
+    wrong = bin((int.from_bytes(data, 'big') & fixed_mask) ^ pattern).count('1')
+    if wrong:
+        raise ValueError(f'{wrong} finder, timing or alignment pattern modules are wrong')
+    error, mask, corrected = _read_format(data, format_indices)
+    if version >= 7:
+        corrected += _check_version(data, version, version_cells)
+
+    if use_numpy is None:
+        # Small codes are faster without the conversions to and from arrays
+        use_numpy = version >= 20
+    codewords = _unmask(data, version, mask, use_numpy)
+
+    ec_words = tables.BLOCK_LAYOUT[version][error][0]
+    data_words = bytearray()
+    for data_size, block_getter in _block_readers(version, error):
+        block = bytes(block_getter(codewords))
+        if ec_codewords(block[:data_size], ec_words) != list(block[data_size:]):
+            block = bytearray(block)
+            corrected += correct_block(block, ec_words)
+        data_words += block[:data_size]
+
+    payload, modes = _read_segments(bytes(data_words), version)
+    return Decoded(payload, version, error, mask, modes, corrected)
+
+
+def verify(qr_data: QRMatrix, expected=None) -> Decoded:
+    """Decode and, when expected is given, check the payload against it.  Raises ValueError on any problem"""
+    decoded = decode(qr_data)
+    if expected is not None:
+        matches = decoded.data == expected if isinstance(expected, bytes) else decoded.text == str(expected)
+        if not matches:
+            raise ValueError(f'The code decodes to {decoded.text!r} instead of {expected!r}')
+    return decoded
+
+
+def _main(argv=None) -> int:
+    import argparse
+    from .archive import EXTENSION as ARCHIVE_EXTENSION, ArchiveReader
+    from .importers import read_matrix
+
+    parser = argparse.ArgumentParser(prog='python -m core.decoder', description='Decode QR matrix files')
+    parser.add_argument('files', nargs='+', help=f'matrix files or archives ({ARCHIVE_EXTENSION})')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only list codes that fail')
+    args = parser.parse_args(argv)
+
+    checked = failed = 0
+    start = time.perf_counter()
+    for file_name in args.files:
+        try:
+            if file_name.lower().endswith(ARCHIVE_EXTENSION):
+                with ArchiveReader(file_name) as reader:
+                    entries = [(f'{file_name}:{entry.key}', reader.matrix(number))
+                               for number, entry in enumerate(reader.entries())]
+            else:
+                entries = [(file_name, read_matrix(file_name))]
+        except (OSError, ValueError) as e:
+            print(f'{file_name}: {e}')
+            checked += 1
+            failed += 1
+            continue
+
+        for name, qr_data in entries:
+            checked += 1
+            try:
+                decoded = decode(qr_data)
+            except ValueError as e:
+                failed += 1
+                print(f'{name}: {e}')
+                continue
+            if not args.quiet:
+                fixed = f', {decoded.corrected} corrected' if decoded.corrected else ''
+                print(f'{name}: version {decoded.version}-{decoded.error}{fixed}: {decoded.text!r}')
+
+    elapsed = time.perf_counter() - start
+    print(f'{checked - failed} of {checked} decoded in {elapsed:.2f} s', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(_main())
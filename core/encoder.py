@@ -0,0 +1,486 @@
+"""
+Built-in QR encoder.
+
+Takes the same ``error``, ``version`` and ``mode`` options as ``pyqrcode.create`` and makes the same choices
+for automatic mode and version selection, so codes match what the add-in produced with pyqrcode.
+
+Reed-Solomon error correction runs on precomputed GF(256) multiplication rows for each generator
+polynomial.  All eight masks are scored in one batched pass, over NumPy arrays when NumPy is installed
+and over row and column bitsets held in python ints otherwise.  NumPy is slow to import, so it is looked
+for on the first encode rather than when the module loads.
+"""
+import math
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from . import qr_tables as tables
+from .matrix import QRMatrix
+from .optional import load_numpy
+
+_TO_ASCII_BITS = bytes.maketrans(b'\x00\x01', b'01')
+_FROM_ASCII_BITS = bytes.maketrans(b'01', b'\x00\x01')
+
+# Penalty rule 3, a finder like pattern with four light modules before or after it
+_FINDER_PATTERNS = ((0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1), (1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0))
+
+
+def _is_kanji(data: bytes) -> bool:
+    if len(data) % 2 != 0:
+        return False
+    for k in range(0, len(data), 2):
+        value = data[k] << 8 | data[k + 1]
+        if not (0x8140 <= value <= 0x9FFC or 0xE040 <= value <= 0xEBBF):
+            return False
+    return True
+
+
+def detect_mode(content, encoding: Optional[str] = 'iso-8859-1') -> Tuple[str, str]:
+    """Guess the most compact mode for the content, returns (mode, encoding)"""
+    try:
+        if str(content).isdigit():
+            return 'numeric', encoding
+    except (TypeError, UnicodeError):
+        pass
+
+    try:
+        if isinstance(content, bytes):
+            data = content.decode('ASCII').encode('ASCII')
+        else:
+            data = str(content).encode('ASCII')
+        if all(value in tables.ALPHANUMERIC_CODES for value in data):
+            return 'alphanumeric', 'ASCII'
+    except (TypeError, UnicodeError):
+        pass
+
+    try:
+        if isinstance(content, bytes):
+            data = content.decode(encoding or 'shiftjis').encode('shiftjis')
+        else:
+            data = content.encode('shiftjis')
+        if _is_kanji(data):
+            return 'kanji', encoding
+        return 'binary', encoding
+    except UnicodeError:
+        pass
+
+    return 'binary', encoding
+
+
+class _BitStream:
+    __slots__ = ('value', 'length')
+
+    def __init__(self):
+        self.value = 0
+        self.length = 0
+
+    def append(self, value: int, length: int):
+        self.value = self.value << length | value
+        self.length += length
+
+
+def _write_numeric(bits: _BitStream, data: bytes):
+    for k in range(0, len(data), 3):
+        group = data[k:k + 3]
+        bits.append(int(group), (4, 7, 10)[len(group) - 1])
+
+
+def _write_alphanumeric(bits: _BitStream, data: bytes):
+    codes = [tables.ALPHANUMERIC_CODES[value] for value in data.upper()]
+    for k in range(0, len(codes) - 1, 2):
+        bits.append(45 * codes[k] + codes[k + 1], 11)
+    if len(codes) % 2:
+        bits.append(codes[-1], 6)
+
+
+def _write_bytes(bits: _BitStream, data: bytes):
+    bits.append(int.from_bytes(data, 'big'), 8 * len(data))
+
+
+def _write_kanji(bits: _BitStream, data: bytes):
+    for k in range(0, len(data), 2):
+        value = data[k] << 8 | data[k + 1]
+        value -= 0x8140 if value <= 0x9FFC else 0xC140
+        bits.append((value >> 8) * 0xC0 + (value & 0xFF), 13)
+
+
+_WRITERS = {1: _write_numeric, 2: _write_alphanumeric, 4: _write_bytes, 8: _write_kanji}
+
+
+def _data_codewords(data: bytes, version: int, mode: int, error: str) -> bytes:
+    capacity = tables.DATA_CAPACITY[version][error][0]
+    length_bits = tables.length_bits(version, mode)
+    count = len(data) // 2 if mode == tables.MODES['kanji'] else len(data)
+    if count >= 1 << length_bits:
+        raise ValueError('The supplied data will not fit within this version of a QRCode.')
+
+    bits = _BitStream()
+    bits.append(mode, 4)
+    bits.append(count, length_bits)
+    _WRITERS[mode](bits, data)
+    if bits.length > capacity:
+        raise ValueError('The supplied data will not fit within this version of a QR code.')
+
+    # Terminator, then pad to a whole byte
+    bits.append(0, min(4, capacity - bits.length))
+    bits.append(0, -bits.length % 8)
+
+    words = bits.value.to_bytes(bits.length // 8, 'big')
+    padding = (capacity - bits.length) // 8
+    return words + (b'\xec\x11' * (padding // 2 + 1))[:padding]
+
+
+@lru_cache(maxsize=None)
+def _multiplication_rows(degree: int) -> List[List[int]]:
+    # rows[f][k] = f * g[k+1] for every field element f, g the generator without its leading 1
+    generator_logs = [tables.GF_LOG[c] for c in tables.GENERATOR_POLYNOMIALS[degree][1:]]
+    rows = [[0] * degree]
+    for factor in range(1, 256):
+        factor_log = tables.GF_LOG[factor]
+        rows.append([tables.GF_EXP[factor_log + g] for g in generator_logs])
+    return rows
+
+
+def ec_codewords(block: bytes, degree: int) -> List[int]:
+    """Reed-Solomon remainder of a data block for the generator of the given degree"""
+    rows = _multiplication_rows(degree)
+    remainder = [0] * degree
+    for value in block:
+        row = rows[value ^ remainder[0]]
+        remainder.append(0)
+        remainder = [r ^ m for r, m in zip(remainder[1:], row)]
+    return remainder
+
+
+def _final_codewords(data: bytes, version: int, error: str) -> bytes:
+    ec_words, blocks_1, data_1, blocks_2, data_2 = tables.BLOCK_LAYOUT[version][error]
+
+    blocks = []
+    offset = 0
+    for size in [data_1] * blocks_1 + [data_2] * blocks_2:
+        blocks.append(data[offset:offset + size])
+        offset += size
+
+    result = bytearray()
+    for k in range(max(data_1, data_2)):
+        for block in blocks:
+            if k < len(block):
+                result.append(block[k])
+    ec_blocks = [ec_codewords(block, ec_words) for block in blocks]
+    for k in range(ec_words):
+        for ec_block in ec_blocks:
+            result.append(ec_block[k])
+    return bytes(result)
+
+
+def format_cells(size: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """(row, col) for the 15 format bits, most significant first, in both copies"""
+    first = [(8, col) for col in (0, 1, 2, 3, 4, 5, 7)] + [(8, 8), (7, 8)] + [
+        (row, 8) for row in (5, 4, 3, 2, 1, 0)]
+    second = [(size - 1 - k, 8) for k in range(7)] + [(8, size - 8 + k) for k in range(8)]
+    return first, second
+
+
+@lru_cache(maxsize=8)
+def symbol_template(version: int) -> Tuple[bytes, bytes, Tuple[int, ...]]:
+    """Function patterns, the data region and the data placement order for a version"""
+    size = tables.version_size(version)
+    modules = bytearray(size * size)
+    reserved = bytearray(size * size)
+
+    def set_module(row, col, dark):
+        modules[row * size + col] = 1 if dark else 0
+        reserved[row * size + col] = 1
+
+    # Finder patterns with separators
+    for top, left in ((0, 0), (0, size - 7), (size - 7, 0)):
+        for r in range(-1, 8):
+            for c in range(-1, 8):
+                row, col = top + r, left + c
+                if 0 <= row < size and 0 <= col < size:
+                    ring = max(abs(r - 3), abs(c - 3))
+                    set_module(row, col, ring != 2 and ring != 4)
+
+    # Timing patterns
+    for k in range(8, size - 8):
+        set_module(6, k, k % 2 == 0)
+        set_module(k, 6, k % 2 == 0)
+
+    # Alignment patterns, except the three corners that would overlap a finder
+    positions = tables.ALIGNMENT_POSITIONS[version]
+    corners = {(positions[0], positions[0]), (positions[0], positions[-1]), (positions[-1], positions[0])} \
+        if positions else set()
+    for row in positions:
+        for col in positions:
+            if (row, col) in corners:
+                continue
+            for r in range(-2, 3):
+                for c in range(-2, 3):
+                    set_module(row + r, col + c, max(abs(r), abs(c)) != 1)
+
+    # Format area is reserved here and written per mask
+    for row, col in sum(format_cells(size), []):
+        set_module(row, col, False)
+    set_module(size - 8, 8, True)
+
+    if version >= 7:
+        bits = tables.VERSION_BITS[version]
+        for k in range(18):
+            dark = (bits >> k) & 1
+            row, col = k // 3, size - 11 + k % 3
+            set_module(row, col, dark)
+            set_module(col, row, dark)
+
+    order = []
+    upward = True
+    col = size - 1
+    while col > 0:
+        if col == 6:
+            col -= 1
+        rows = range(size - 1, -1, -1) if upward else range(size)
+        for row in rows:
+            for c in (col, col - 1):
+                if not reserved[row * size + c]:
+                    order.append(row * size + c)
+        upward = not upward
+        col -= 2
+
+    region = bytes(1 - value for value in reserved)
+    return bytes(modules), region, tuple(order)
+
+
+def _place_data(version: int, codewords: bytes) -> Tuple[bytearray, bytes]:
+    modules, region, order = symbol_template(version)
+    modules = bytearray(modules)
+    bits = format(int.from_bytes(codewords, 'big'), f'0{8 * len(codewords)}b').encode('ascii')
+    bits = bits.translate(_FROM_ASCII_BITS)
+    for index, bit in zip(order, bits):
+        modules[index] = bit
+    return modules, region
+
+
+@lru_cache(maxsize=8)
+def mask_cells(size: int) -> Tuple[bytes, ...]:
+    """The eight mask patterns over the whole symbol, one byte per module, 1 where the mask flips it"""
+    return tuple(
+        bytes(1 if pattern(row, col) else 0 for row in range(size) for col in range(size))
+        for pattern in tables.MASK_PATTERNS
+    )
+
+
+def _format_overlay(size: int, error: str, mask: int) -> List[Tuple[int, int]]:
+    # (index, bit) pairs for the format fields of one mask
+    bits = tables.FORMAT_BITS[error][mask]
+    overlay = []
+    for cells in format_cells(size):
+        for k, (row, col) in enumerate(cells):
+            overlay.append((row * size + col, (bits >> (14 - k)) & 1))
+    return overlay
+
+
+def _penalty_rule_4(dark: int, size: int) -> int:
+    # Matches pyqrcode, 2 points per whole percent away from 50
+    percent = (dark / size ** 2 * 100) - 50
+    return int((abs(int(percent)) / 5) * 10)
+
+
+def _to_bitsets(cells: bytes, size: int) -> Tuple[List[int], List[int]]:
+    # Row and column bitsets, bit k is column (or row) k
+    rows = [
+        int(cells[start:start + size][::-1].translate(_TO_ASCII_BITS), 2) for start in range(0, size * size, size)
+    ]
+    cols = [int(cells[col::size][::-1].translate(_TO_ASCII_BITS), 2) for col in range(size)]
+    return rows, cols
+
+
+def _popcount(value: int) -> int:
+    return bin(value).count('1')
+
+
+def _line_penalties(lines: List[int], size: int) -> Tuple[int, int]:
+    """Rule 1 and rule 3 penalties for a set of rows (or columns) held as bitsets"""
+    full = (1 << size) - 1
+    window_mask = (1 << (size - 4)) - 1
+    finder_mask = (1 << (size - 10)) - 1 if size > 10 else 0
+
+    runs = 0
+    finders = 0
+    for line in lines:
+        same = ~(line ^ (line >> 1)) & (full >> 1)
+        # Five equal modules start at k, the run started at k when k is not equal to the module before it
+        windows = same & (same >> 1) & (same >> 2) & (same >> 3) & window_mask
+        runs += _popcount(windows) + 2 * _popcount(windows & ~(same << 1))
+
+        inverse = ~line & full
+        for pattern in _FINDER_PATTERNS:
+            match = finder_mask
+            for k, dark in enumerate(pattern):
+                match &= (line if dark else inverse) >> k
+                if not match:
+                    break
+            finders += _popcount(match)
+
+    return runs, finders * 40
+
+
+def _block_penalty(rows: List[int], size: int) -> int:
+    full = (1 << (size - 1)) - 1
+    count = 0
+    for upper, lower in zip(rows, rows[1:]):
+        same = ~(upper ^ lower) & ~(upper ^ (upper >> 1)) & ~(lower ^ (lower >> 1))
+        count += _popcount(same & full)
+    return count * 3
+
+
+def _score_masks_python(modules: bytes, region: bytes, size: int, error: str) -> List[int]:
+    base_rows, base_cols = _to_bitsets(modules, size)
+    region_rows, region_cols = _to_bitsets(region, size)
+
+    scores = []
+    for mask, (mask_rows, mask_cols) in enumerate(_mask_bitsets(size)):
+        rows = [b ^ (m & r) for b, m, r in zip(base_rows, mask_rows, region_rows)]
+        cols = [b ^ (m & r) for b, m, r in zip(base_cols, mask_cols, region_cols)]
+        for index, bit in _format_overlay(size, error, mask):
+            row, col = divmod(index, size)
+            if bit:
+                rows[row] |= 1 << col
+                cols[col] |= 1 << row
+
+        row_runs, row_finders = _line_penalties(rows, size)
+        col_runs, col_finders = _line_penalties(cols, size)
+        dark = sum(_popcount(row) for row in rows)
+        scores.append(
+            row_runs + col_runs + _block_penalty(rows, size) + row_finders + col_finders +
+            _penalty_rule_4(dark, size)
+        )
+    return scores
+
+
+@lru_cache(maxsize=8)
+def _mask_bitsets(size: int) -> List[Tuple[List[int], List[int]]]:
+    return [_to_bitsets(cells, size) for cells in mask_cells(size)]
+
+
+def _score_masks_numpy(modules: bytes, region: bytes, size: int, error: str) -> List[int]:
+    numpy = load_numpy()
+    base = numpy.frombuffer(modules, dtype=numpy.uint8).reshape(size, size)
+    data = numpy.frombuffer(region, dtype=numpy.uint8).reshape(size, size)
+    patterns = numpy.frombuffer(b''.join(mask_cells(size)), dtype=numpy.uint8).reshape(8, size, size)
+
+    masked = base[numpy.newaxis] ^ (patterns & data[numpy.newaxis])
+    flat = masked.reshape(8, -1)
+    for mask in range(8):
+        overlay = _format_overlay(size, error, mask)
+        flat[mask, [index for index, _ in overlay]] = [bit for _, bit in overlay]
+
+    def line_penalties(lines):
+        same = lines[..., 1:] == lines[..., :-1]
+        windows = same[..., :-3] & same[..., 1:-2] & same[..., 2:-1] & same[..., 3:]
+        starts = windows.copy()
+        starts[..., 1:] &= ~same[..., :size - 5]
+        runs = windows.sum(axis=(1, 2)) + 2 * starts.sum(axis=(1, 2))
+
+        finders = numpy.zeros(8, dtype=numpy.int64)
+        if size > 10:
+            for pattern in _FINDER_PATTERNS:
+                match = numpy.ones(lines.shape[:2] + (size - 10,), dtype=bool)
+                for k, dark in enumerate(pattern):
+                    match &= lines[..., k:size - 10 + k] == dark
+                finders += match.sum(axis=(1, 2))
+        return runs, finders * 40
+
+    row_runs, row_finders = line_penalties(masked)
+    col_runs, col_finders = line_penalties(masked.transpose(0, 2, 1))
+
+    blocks = (
+        (masked[:, :-1, :-1] == masked[:, 1:, :-1]) &
+        (masked[:, :-1, :-1] == masked[:, :-1, 1:]) &
+        (masked[:, :-1, :-1] == masked[:, 1:, 1:])
+    ).sum(axis=(1, 2)) * 3
+
+    darks = flat.sum(axis=1, dtype=numpy.int64)
+    totals = row_runs + col_runs + blocks + row_finders + col_finders
+    return [int(totals[mask]) + _penalty_rule_4(int(darks[mask]), size) for mask in range(8)]
+
+
+def score_masks(modules: bytes, region: bytes, size: int, error: str, use_numpy: Optional[bool] = None) -> List[int]:
+    """Total penalty of each of the eight masks over unmasked modules and the data region"""
+    if use_numpy is None:
+        use_numpy = load_numpy() is not None
+    if use_numpy:
+        return _score_masks_numpy(modules, region, size, error)
+    return _score_masks_python(modules, region, size, error)
+
+
+def _apply_mask(modules: bytes, region: bytes, size: int, error: str, mask: int) -> QRMatrix:
+    pattern = mask_cells(size)[mask]
+    result = bytearray(m ^ (p & r) for m, p, r in zip(modules, pattern, region))
+    for index, bit in _format_overlay(size, error, mask):
+        result[index] = bit
+    return QRMatrix(size, result)
+
+
+def _pick_version(data: bytes, mode: int, error: str) -> int:
+    for version in range(1, 41):
+        capacity = tables.DATA_CAPACITY[version][error][mode]
+        if mode == tables.MODES['kanji'] and capacity >= math.ceil(len(data) / 2):
+            return version
+        if capacity >= len(data):
+            return version
+    raise ValueError('The data will not fit in any QR code version with the given encoding and error level.')
+
+
+def encode(content, error='H', version: Optional[int] = None, mode: Optional[str] = None,
+           encoding: Optional[str] = 'iso-8859-1', use_numpy: Optional[bool] = None) -> QRMatrix:
+    """Encode content into a QRMatrix, the arguments mean the same as for pyqrcode.create"""
+    guessed_mode, encoding = detect_mode(content, encoding)
+    if encoding is None:
+        encoding = 'iso-8859-1'
+    if guessed_mode == 'kanji':
+        encoding = 'shiftjis'
+
+    if version is not None and not 1 <= version <= 40:
+        raise ValueError(f'Illegal version {version}, version must be between 1 and 40.')
+
+    if isinstance(content, bytes):
+        data = content.decode(encoding).encode(encoding)
+    elif hasattr(content, 'encode'):
+        data = content.encode(encoding)
+    else:
+        data = str(content).encode('ASCII')
+
+    if hasattr(mode, 'lower'):
+        mode = mode.lower()
+    if mode is None:
+        mode = guessed_mode
+    elif mode not in tables.MODES:
+        raise ValueError(f'{mode} is not a valid mode.')
+    elif guessed_mode == 'binary' and mode != 'binary':
+        raise ValueError(
+            f'The content provided cannot be encoded with the mode {mode}, it can only be encoded as binary.'
+        )
+    elif mode == 'numeric' and guessed_mode != 'numeric':
+        raise ValueError('The content cannot be encoded as numeric.')
+    elif mode == 'kanji' and guessed_mode != 'kanji':
+        raise ValueError('The content cannot be encoded as kanji.')
+    mode_number = tables.MODES[mode]
+
+    if error not in tables.ERROR_LEVELS:
+        raise ValueError(f'{error} is not a valid error level.')
+    error = tables.ERROR_LEVELS[error]
+
+    best_fit = _pick_version(data, mode_number, error)
+    if version:
+        if version < best_fit:
+            raise ValueError(
+                f'The data will not fit inside a version {version} code with the given encoding and error '
+                f'level (the code must be at least a version {best_fit}).'
+            )
+    else:
+        version = best_fit
+
+    codewords = _final_codewords(_data_codewords(data, version, mode_number, error), version, error)
+    modules, region = _place_data(version, codewords)
+    size = tables.version_size(version)
+
+    scores = score_masks(bytes(modules), region, size, error, use_numpy)
+    return _apply_mask(bytes(modules), region, size, error, scores.index(min(scores)))
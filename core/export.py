@@ -0,0 +1,300 @@
+"""
+Headless mesh export to binary STL and 3MF.
+
+Builds the same solid as the add-in (see ``core.mesh.module_z_range``) without Fusion 360.  Faces are merged:
+every flat region of the top, base and bottom is covered by rectangles, and side walls along a grid line are
+merged into one strip per height step.  Where a merged face borders smaller faces, the corner points of those
+faces are inserted on its edge and the face is fanned from its center, so no edge ends in the middle of
+another and the mesh stays watertight.
+
+Triangles are generated lazily and written as they are produced.  Only the rectangle cover and the corner
+points are kept in memory, plus the vertex numbers for 3MF.
+
+    python -m core.export code.stl --message "https://tapnair.github.io/QRCoder/"
+"""
+import argparse
+import math
+import struct
+import zipfile
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import BinaryIO, Dict, Iterator, List, Tuple, Union
+
+from .matrix import QRMatrix
+from .mesh import module_z_range
+from .rectangles import merge_rectangles
+
+Point = Tuple[float, float, float]
+Triangle = Tuple[Point, Point, Point]
+
+# Face outlines are walked counter clockwise seen from outside, as (col, row, level) grid points
+_Outline = List[Tuple[int, int, int]]
+
+
+def _level_map(qr_data: QRMatrix, base: float) -> Tuple[bytes, int]:
+    # Level of every module: 0 empty, 1 base top (with a base) and the top level for dark modules
+    top_level = 2 if base > 0 else 1
+    light_level = 1 if base > 0 else 0
+    return qr_data.data.translate(bytes.maketrans(b'\x00\x01', bytes((light_level, top_level)))), top_level
+
+
+class _Faces:
+    """Merged faces of the solid and the corner points that lie on each level"""
+
+    def __init__(self, qr_data: QRMatrix, base: float):
+        self.size = size = qr_data.size
+        levels, self.top_level = _level_map(qr_data, base)
+        self.levels = levels
+
+        # (level, facing up, rectangles) for the flat faces
+        self.flat = []
+        for level in range(1, self.top_level + 1):
+            mask = bytes(1 if value == level else 0 for value in levels)
+            self.flat.append((level, True, merge_rectangles(QRMatrix(size, mask)).rectangles))
+        bottom = bytes(1 if value else 0 for value in levels)
+        self.flat.append((0, False, merge_rectangles(QRMatrix(size, bottom)).rectangles))
+
+        # Walls as (vertical line, line index, start, end, level, solid before line)
+        self.walls = list(self._walls())
+
+        # Corner points per level, sorted along every row and column line for range queries
+        row_points = defaultdict(set)
+        col_points = defaultdict(set)
+
+        def add(col, row, level):
+            row_points[level, row].add(col)
+            col_points[level, col].add(row)
+
+        for level, _, rectangles in self.flat:
+            for rectangle in rectangles:
+                for col in (rectangle.col, rectangle.col + rectangle.width):
+                    for row in (rectangle.row, rectangle.row + rectangle.height):
+                        add(col, row, level)
+        for vertical, line, start, end, level, _ in self.walls:
+            for position in (start, end):
+                for z in (level, level + 1):
+                    if vertical:
+                        add(line, position, z)
+                    else:
+                        add(position, line, z)
+
+        self.row_points: Dict[Tuple[int, int], List[int]] = {key: sorted(value) for key, value in row_points.items()}
+        self.col_points: Dict[Tuple[int, int], List[int]] = {key: sorted(value) for key, value in col_points.items()}
+
+    def level(self, row: int, col: int) -> int:
+        if 0 <= row < self.size and 0 <= col < self.size:
+            return self.levels[row * self.size + col]
+        return 0
+
+    def _walls(self):
+        size = self.size
+        for vertical in (True, False):
+            for line in range(size + 1):
+                # Runs of equal (low, high, solid before) along the line, split per level step
+                open_runs = {}
+                for position in range(size + 1):
+                    if position < size:
+                        if vertical:
+                            before, after = self.level(position, line - 1), self.level(position, line)
+                        else:
+                            before, after = self.level(line - 1, position), self.level(line, position)
+                        steps = {(level, before > after) for level in range(min(before, after), max(before, after))}
+                    else:
+                        steps = set()
+
+                    for step in list(open_runs):
+                        if step not in steps:
+                            yield (vertical, line, open_runs.pop(step), position) + step
+                    for step in steps:
+                        open_runs.setdefault(step, position)
+
+    def _between(self, level: int, vertical: bool, line: int, start: int, end: int) -> List[int]:
+        # Corner points strictly between start and end on a grid line, ordered from start to end
+        points = self.col_points if vertical else self.row_points
+        values = points.get((level, line), [])
+        low, high = min(start, end), max(start, end)
+        inner = values[bisect_right(values, low):bisect_left(values, high)]
+        return inner if start < end else inner[::-1]
+
+    def _edge(self, outline: _Outline, level: int, start: Tuple[int, int], end: Tuple[int, int]):
+        # Appends start and the inner points of the straight edge to end
+        (c0, r0), (c1, r1) = start, end
+        outline.append((c0, r0, level))
+        if c0 == c1:
+            outline.extend((c0, row, level) for row in self._between(level, True, c0, r0, r1))
+        else:
+            outline.extend((col, r0, level) for col in self._between(level, False, r0, c0, c1))
+
+    def outlines(self) -> Iterator[_Outline]:
+        for level, up, rectangles in self.flat:
+            for rectangle in rectangles:
+                c0, r0 = rectangle.col, rectangle.row
+                c1, r1 = c0 + rectangle.width, r0 + rectangle.height
+                # Grid rows run towards -Y, so this order is counter clockwise seen from above
+                corners = [(c0, r0), (c0, r1), (c1, r1), (c1, r0)]
+                if not up:
+                    corners.reverse()
+                outline = []
+                for k in range(4):
+                    self._edge(outline, level, corners[k], corners[(k + 1) % 4])
+                yield outline
+
+        for vertical, line, start, end, level, solid_before in self.walls:
+            # Walked so the solid is on the left seen from above
+            if vertical:
+                p0, p1 = ((line, end), (line, start)) if solid_before else ((line, start), (line, end))
+            else:
+                p0, p1 = ((start, line), (end, line)) if solid_before else ((end, line), (start, line))
+            outline = []
+            self._edge(outline, level, p0, p1)
+            outline.append(p1 + (level,))
+            self._edge(outline, level + 1, p1, p0)
+            outline.append(p0 + (level + 1,))
+            yield outline
+
+
+def iter_triangles(qr_data, side: float, height: float, base: float) -> Iterator[Triangle]:
+    """Triangles of the solid, counter clockwise seen from outside, centered on the origin with z up"""
+    if not isinstance(qr_data, QRMatrix):
+        qr_data = QRMatrix.from_rows(qr_data)
+    if qr_data.size == 0:
+        return
+
+    faces = _Faces(qr_data, base)
+    bottom, top = module_z_range(height, base)
+    z_values = [0.0, bottom, top] if base > 0 else [0.0, top]
+    half = .5 * qr_data.size
+
+    def point(col, row, level) -> Point:
+        return (col - half) * side, (half - row) * side, z_values[level]
+
+    for outline in faces.outlines():
+        points = [point(*grid_point) for grid_point in outline]
+        if len(points) == 4:
+            yield points[0], points[1], points[2]
+            yield points[0], points[2], points[3]
+            continue
+
+        # Fan from the center, which is never collinear with an edge
+        count = len(points)
+        center = tuple(sum(p[axis] for p in points) / count for axis in range(3))
+        for k in range(count):
+            yield center, points[k], points[(k + 1) % count]
+
+
+def _normal(triangle: Triangle) -> Point:
+    (ax, ay, az), (bx, by, bz), (cx, cy, cz) = triangle
+    ux, uy, uz = bx - ax, by - ay, bz - az
+    vx, vy, vz = cx - ax, cy - ay, cz - az
+    nx, ny, nz = uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx
+    length = math.sqrt(nx * nx + ny * ny + nz * nz) or 1.0
+    return nx / length, ny / length, nz / length
+
+
+_STL_TRIANGLE = struct.Struct('<12fH')
+
+
+def _write_stl_triangles(stream: BinaryIO, triangles: Iterator[Triangle]) -> int:
+    count = 0
+    pack = _STL_TRIANGLE.pack
+    for triangle in triangles:
+        a, b, c = triangle
+        stream.write(pack(*_normal(triangle), *a, *b, *c, 0))
+        count += 1
+    return count
+
+
+def write_stl(target: Union[str, BinaryIO], qr_data, side: float, height: float, base: float,
+              name: str = 'QRCoder') -> int:
+    """Binary STL, returns the triangle count.  Non seekable streams get the triangles generated twice"""
+    header = name.encode('ascii', 'replace')[:80].ljust(80, b' ')
+    if isinstance(target, str):
+        with open(target, 'wb') as f:
+            return write_stl(f, qr_data, side, height, base, name)
+
+    if target.seekable():
+        start = target.tell()
+        target.write(header + struct.pack('<I', 0))
+        count = _write_stl_triangles(target, iter_triangles(qr_data, side, height, base))
+        end = target.tell()
+        target.seek(start + 80)
+        target.write(struct.pack('<I', count))
+        target.seek(end)
+        return count
+
+    count = sum(1 for _ in iter_triangles(qr_data, side, height, base))
+    target.write(header + struct.pack('<I', count))
+    return _write_stl_triangles(target, iter_triangles(qr_data, side, height, base))
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+    '</Types>'
+)
+_RELATIONSHIPS = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Target="/3D/3dmodel.model" Id="rel0" '
+    'Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+    '</Relationships>'
+)
+
+
+def write_3mf(target: Union[str, BinaryIO], qr_data, side: float, height: float, base: float,
+              unit: str = 'millimeter') -> int:
+    """3MF package with one mesh object, returns the triangle count.  Triangles are generated twice"""
+    vertices: Dict[Point, int] = {}
+    count = 0
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        package.writestr('_rels/.rels', _RELATIONSHIPS)
+        with package.open('3D/3dmodel.model', 'w') as model:
+            def write(text):
+                model.write(text.encode('utf-8'))
+
+            write(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<model unit="{unit}" xml:lang="en-US" '
+                'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">'
+                '<resources><object id="1" type="model"><mesh><vertices>'
+            )
+            for triangle in iter_triangles(qr_data, side, height, base):
+                for vertex in triangle:
+                    if vertex not in vertices:
+                        vertices[vertex] = len(vertices)
+                        write(f'<vertex x="{vertex[0]:.6g}" y="{vertex[1]:.6g}" z="{vertex[2]:.6g}"/>')
+            write('</vertices><triangles>')
+            for a, b, c in iter_triangles(qr_data, side, height, base):
+                write(f'<triangle v1="{vertices[a]}" v2="{vertices[b]}" v3="{vertices[c]}"/>')
+                count += 1
+            write('</triangles></mesh></object></resources><build><item objectid="1"/></build></model>')
+    return count
+
+
+def _main():
+    from . import encoder
+    from .importers import read_matrix
+
+    parser = argparse.ArgumentParser(prog='python -m core.export', description='Write a QR code as STL or 3MF')
+    parser.add_argument('output', help='.stl or .3mf file to write')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--message', help='text to encode')
+    source.add_argument('--matrix', help='matrix file to read (csv, bits, hex, pbm or png)')
+    parser.add_argument('--error', default='H', help='error correction level for --message')
+    # Defaults match the add-in, .5 in blocks with .25 in height and base, in millimeters
+    parser.add_argument('--block-size', type=float, default=12.7)
+    parser.add_argument('--block-height', type=float, default=6.35)
+    parser.add_argument('--base-height', type=float, default=6.35)
+    args = parser.parse_args()
+
+    qr_data = encoder.encode(args.message, error=args.error) if args.message else read_matrix(args.matrix)
+    writer = write_3mf if args.output.lower().endswith('.3mf') else write_stl
+    count = writer(args.output, qr_data, args.block_size, args.block_height, args.base_height)
+    print(f'{count} triangles written to {args.output}')
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,303 @@
+"""
+Read QR matrices from files.
+
+Supported formats:
+
+- ``csv``: rows of comma separated 1 and 0, the format of the original importer
+- ``bits``: rows of 1 and 0 without separators
+- ``hex``: one hex string per row, most significant bit first, padded to whole digits
+- ``pbm``: portable bitmap, plain (P1) or raw (P4), 1 is dark
+- ``png``: 1 bit grayscale or palette PNG, black is dark
+
+Files are read in one call and decoded with bytes level translations into the packed matrix, so nothing
+is converted module by module.  Image formats may have a quiet zone and several pixels per module, the
+symbol is cropped to its finder patterns and sampled at module centers.  Every format is checked up front
+to be square with the size of a QR version.
+"""
+import os
+import struct
+import zlib
+from typing import List, Optional, Tuple
+
+from .matrix import QRMatrix
+
+FORMATS = ('csv', 'bits', 'hex', 'pbm', 'png')
+
+# Extensions that decide the format, others such as .txt are told apart by their content
+_EXTENSIONS = {
+    '.csv': 'csv', '.bits': 'bits', '.hex': 'hex', '.pbm': 'pbm', '.png': 'png',
+}
+
+_FROM_ASCII_BITS = bytes.maketrans(b'01', b'\x00\x01')
+_WHITESPACE = b' \t\r\n\v\f'
+
+# Byte value to its eight bits, most significant first, one byte per bit
+_BYTE_BITS = [bytes((value >> shift) & 1 for shift in range(7, -1, -1)) for value in range(256)]
+_INVERT = bytes.maketrans(b'\x00\x01', b'\x01\x00')
+
+
+def validate_size(size: int):
+    if size < 21 or size > 177 or (size - 17) % 4 != 0:
+        raise ValueError(f'{size}x{size} is not a QR code size, expected 21 to 177 modules in steps of 4')
+
+
+def detect_format(data: bytes, file_name: str = '') -> str:
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:2] in (b'P1', b'P4'):
+        return 'pbm'
+
+    extension = _EXTENSIONS.get(os.path.splitext(file_name)[1].lower())
+    if extension is not None:
+        return extension
+
+    if b',' in data:
+        return 'csv'
+    lines = data.split()
+    if all(len(line) == len(lines) for line in lines) and len(data.translate(None, b'01' + _WHITESPACE)) == 0:
+        return 'bits'
+    return 'hex'
+
+
+def _text_lines(data: bytes, delete: bytes) -> List[bytes]:
+    return [line for line in data.translate(None, delete).split(b'\n') if len(line) > 0]
+
+
+def _square_bits(lines: List[bytes]) -> QRMatrix:
+    size = len(lines)
+    for number, line in enumerate(lines):
+        if len(line) != size:
+            raise ValueError(f'Row {number} has {len(line)} modules, expected {size} for a square matrix')
+    validate_size(size)
+
+    packed = b''.join(lines)
+    if len(packed.translate(None, b'01')) > 0:
+        raise ValueError('Rows may only contain 1 and 0')
+    return QRMatrix(size, packed.translate(_FROM_ASCII_BITS))
+
+
+def parse_csv(data: bytes) -> QRMatrix:
+    return _square_bits(_text_lines(data, b', \t\r'))
+
+
+def parse_bits(data: bytes) -> QRMatrix:
+    return _square_bits(_text_lines(data, b' \t\r'))
+
+
+def _unpack_bits(raw: bytes, count: int) -> bytes:
+    return b''.join([_BYTE_BITS[value] for value in raw])[:count]
+
+
+def parse_hex(data: bytes) -> QRMatrix:
+    lines = _text_lines(data, b' \t\r')
+    size = len(lines)
+    validate_size(size)
+
+    digits = (size + 3) // 4
+    packed = bytearray()
+    for number, line in enumerate(lines):
+        if len(line) != digits:
+            raise ValueError(f'Row {number} has {len(line)} hex digits, expected {digits} for {size} modules')
+        try:
+            raw = bytes.fromhex((line + b'0' if digits % 2 else line).decode('ascii'))
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError(f'Row {number} is not a hex string')
+        packed += _unpack_bits(raw, size)
+    return QRMatrix(size, packed)
+
+
+def _crop_symbol(pixels: bytes, width: int, height: int) -> QRMatrix:
+    """Cut the symbol out of an image with a quiet zone and square pixel blocks per module"""
+    rows = [pixels[start:start + width] for start in range(0, width * height, width)]
+    dark_rows = [y for y, row in enumerate(rows) if 1 in row]
+    if len(dark_rows) == 0:
+        raise ValueError('Image has no dark pixels')
+    top, bottom = dark_rows[0], dark_rows[-1]
+    left = min(row.find(1) for row in rows[top:bottom + 1] if 1 in row)
+    right = max(row.rfind(1) for row in rows[top:bottom + 1])
+
+    extent = right - left + 1
+    if bottom - top + 1 != extent:
+        raise ValueError(f'Symbol is {extent}x{bottom - top + 1} pixels, QR codes are square')
+
+    # The top left finder pattern starts with a run of 7 dark modules
+    first_row = rows[top]
+    run_end = first_row.find(0, left)
+    run = (run_end if run_end >= 0 else right + 1) - left
+    scale, remainder = divmod(run, 7)
+    if scale == 0 or remainder or extent % scale:
+        raise ValueError(f'Symbol is not a whole number of modules, finder pattern is {run} pixels wide')
+
+    size = extent // scale
+    validate_size(size)
+    center = scale // 2
+    packed = b''.join(
+        [rows[y][left + center:right + 1:scale] for y in range(top + center, bottom + 1, scale)]
+    )
+    return QRMatrix(size, packed)
+
+
+def _pbm_header(data: bytes, count: int) -> Tuple[List[bytes], int]:
+    # Whitespace separated tokens with # comments, returns the tokens and the offset after the last one
+    tokens = []
+    position = 0
+    while len(tokens) < count:
+        while position < len(data) and data[position] in _WHITESPACE:
+            position += 1
+        if position < len(data) and data[position] == ord('#'):
+            end = data.find(b'\n', position)
+            position = len(data) if end < 0 else end + 1
+            continue
+        start = position
+        while position < len(data) and data[position] not in _WHITESPACE:
+            position += 1
+        if start == position:
+            raise ValueError('Truncated PBM header')
+        tokens.append(data[start:position])
+    return tokens, position
+
+
+def parse_pbm(data: bytes) -> QRMatrix:
+    (magic, width, height), position = _pbm_header(data, 3)
+    try:
+        width, height = int(width), int(height)
+    except ValueError:
+        raise ValueError('PBM width and height must be integers')
+
+    if magic == b'P1':
+        pixels = data[position:].translate(None, _WHITESPACE)[:width * height]
+        if len(pixels) != width * height or len(pixels.translate(None, b'01')) > 0:
+            raise ValueError(f'PBM data does not hold {width}x{height} pixels of 1 and 0')
+        return _crop_symbol(pixels.translate(_FROM_ASCII_BITS), width, height)
+
+    if magic == b'P4':
+        row_bytes = (width + 7) // 8
+        raw = data[position + 1:position + 1 + row_bytes * height]
+        if len(raw) != row_bytes * height:
+            raise ValueError(f'PBM data does not hold {width}x{height} pixels')
+        pixels = b''.join(
+            [_unpack_bits(raw[start:start + row_bytes], width) for start in range(0, len(raw), row_bytes)]
+        )
+        return _crop_symbol(pixels, width, height)
+
+    raise ValueError(f'Unsupported PBM type {magic!r}')
+
+
+def _png_chunks(data: bytes):
+    position = 8
+    while position + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[position:position + 8])
+        end = position + 8 + length
+        if end + 4 > len(data):
+            raise ValueError(f'PNG {kind.decode("latin-1")} chunk is truncated')
+        chunk = data[position + 8:end]
+        if zlib.crc32(kind + chunk) != struct.unpack('>I', data[end:end + 4])[0]:
+            raise ValueError(f'PNG {kind.decode("latin-1")} chunk is corrupt, its CRC does not match')
+        yield kind, chunk
+        position = end + 4
+
+
+def _unfilter(raw: bytes, row_bytes: int, height: int) -> List[bytes]:
+    # PNG row filters with one byte per pixel step, which is what 1 bit images use
+    rows = []
+    previous = bytearray(row_bytes)
+    stride = row_bytes + 1
+    if len(raw) < stride * height:
+        raise ValueError('Truncated PNG image data')
+    for y in range(height):
+        kind = raw[y * stride]
+        row = bytearray(raw[y * stride + 1:(y + 1) * stride])
+        if kind == 1:
+            for x in range(1, row_bytes):
+                row[x] = (row[x] + row[x - 1]) & 0xFF
+        elif kind == 2:
+            row = bytearray((a + b) & 0xFF for a, b in zip(row, previous))
+        elif kind == 3:
+            for x in range(row_bytes):
+                left = row[x - 1] if x else 0
+                row[x] = (row[x] + ((left + previous[x]) >> 1)) & 0xFF
+        elif kind == 4:
+            for x in range(row_bytes):
+                a = row[x - 1] if x else 0
+                b = previous[x]
+                c = previous[x - 1] if x else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                predictor = a if pa <= pb and pa <= pc else b if pb <= pc else c
+                row[x] = (row[x] + predictor) & 0xFF
+        elif kind != 0:
+            raise ValueError(f'Unknown PNG filter type {kind}')
+        rows.append(bytes(row))
+        previous = row
+    return rows
+
+
+def parse_png(data: bytes) -> QRMatrix:
+    header = None
+    palette = b''
+    compressed = []
+    for kind, chunk in _png_chunks(data):
+        if kind == b'IHDR':
+            if len(chunk) != 13:
+                raise ValueError(f'PNG header has {len(chunk)} bytes, expected 13')
+            header = struct.unpack('>IIBBBBB', chunk)
+        elif kind == b'PLTE':
+            palette = chunk
+        elif kind == b'IDAT':
+            compressed.append(chunk)
+        elif kind == b'IEND':
+            break
+
+    if header is None:
+        raise ValueError('PNG has no header')
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if bit_depth != 1 or color_type not in (0, 3):
+        raise ValueError(
+            f'Only 1 bit grayscale or palette PNG images are supported, got depth {bit_depth} type {color_type}'
+        )
+    if interlace:
+        raise ValueError('Interlaced PNG images are not supported')
+
+    row_bytes = (width + 7) // 8
+    try:
+        raw = zlib.decompress(b''.join(compressed))
+    except zlib.error as e:
+        raise ValueError(f'Corrupt PNG image data: {e}')
+    rows = _unfilter(raw, row_bytes, height)
+    pixels = b''.join([_unpack_bits(row, width) for row in rows])
+
+    if color_type == 0:
+        dark_value = 0
+    else:
+        luminance = [
+            299 * palette[3 * k] + 587 * palette[3 * k + 1] + 114 * palette[3 * k + 2] for k in range(len(palette) // 3)
+        ]
+        if len(luminance) == 0:
+            raise ValueError('Palette PNG has no palette')
+        dark_value = 0 if luminance[0] <= luminance[-1] else 1
+    if dark_value == 0:
+        pixels = pixels.translate(_INVERT)
+    return _crop_symbol(pixels, width, height)
+
+
+_PARSERS = {
+    'csv': parse_csv,
+    'bits': parse_bits,
+    'hex': parse_hex,
+    'pbm': parse_pbm,
+    'png': parse_png,
+}
+
+
+def parse_matrix(data: bytes, file_format: Optional[str] = None, file_name: str = '') -> QRMatrix:
+    if file_format is None:
+        file_format = detect_format(data, file_name)
+    if file_format not in _PARSERS:
+        raise ValueError(f'Unknown matrix format {file_format!r}, expected one of {", ".join(FORMATS)}')
+    return _PARSERS[file_format](data)
+
+
+def read_matrix(file_name: str, file_format: Optional[str] = None) -> QRMatrix:
+    with open(file_name, 'rb') as f:
+        data = f.read()
+    return parse_matrix(data, file_format, file_name)
@@ -0,0 +1,129 @@
+"""
+Box and module positions for the geometry builders, computed for the whole code at once.
+
+Positions start out in the local frame used for the solids (centered on the origin, rows running towards -Y,
+z up from the bottom of the base) and can be moved into any other frame, such as the one of a sketch, with
+one affine transform over all points.  The work runs on NumPy arrays when NumPy is installed and in plain
+python otherwise, either way the results are flat ``array('d')`` buffers of x, y, z triples that can be
+handed to the solid builders, written to a mesh or passed to ``CustomGraphicsCoordinates.create``.
+"""
+from array import array
+from collections import namedtuple
+from typing import Optional
+
+from .matrix import QRMatrix
+from .optional import load_numpy
+from .rectangles import RectangleCover
+
+# Origin and unit axes, as (x, y, z) tuples in the target space
+Frame = namedtuple('Frame', ['origin', 'x_axis', 'y_axis', 'z_axis'])
+LOCAL_FRAME = Frame((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0))
+
+
+class BoxLayout(namedtuple('BoxLayout', ['centers', 'sizes'])):
+    """centers: flat x, y, z per box.  sizes: flat extent along the frame x, y and z axes per box.
+
+    The base plate, when there is one, is the first box.
+    """
+    __slots__ = ()
+
+    @property
+    def box_count(self) -> int:
+        return len(self.centers) // 3
+
+
+def _use_numpy(use_numpy: Optional[bool]):
+    numpy = load_numpy()
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    return numpy if use_numpy else None
+
+
+def _from_numpy(values) -> array:
+    buffer = array('d')
+    buffer.frombytes(values.astype('float64').tobytes())
+    return buffer
+
+
+def transform_points(points: array, frame: Frame, use_numpy: Optional[bool] = None) -> array:
+    """Map flat x, y, z triples from the local frame into frame, buffers for the local frame are returned as is"""
+    if frame == LOCAL_FRAME:
+        return points
+
+    (ox, oy, oz), (xx, xy, xz), (yx, yy, yz), (zx, zy, zz) = frame
+    numpy = _use_numpy(use_numpy)
+    if numpy is not None:
+        local = numpy.frombuffer(points, dtype=numpy.float64).reshape(-1, 3)
+        axes = numpy.array(frame[1:], dtype=numpy.float64)
+        return _from_numpy(local @ axes + numpy.array(frame.origin, dtype=numpy.float64))
+
+    placed = array('d', points)
+    for k in range(0, len(placed), 3):
+        x, y, z = placed[k], placed[k + 1], placed[k + 2]
+        placed[k] = ox + x * xx + y * yx + z * zx
+        placed[k + 1] = oy + x * xy + y * yy + z * zy
+        placed[k + 2] = oz + x * xz + y * yz + z * zz
+    return placed
+
+
+def box_layout(cover: RectangleCover, qr_size: int, side: float, height: float, base: float,
+               frame: Frame = LOCAL_FRAME, use_numpy: Optional[bool] = None) -> BoxLayout:
+    """Centers and sizes of the base plate and of every rectangle box of a QR solid"""
+    start_x = (.5 * side) * (1 - qr_size)
+    start_y = (.5 * side) * (qr_size - 1)
+    start_z = (.5 * height) + base
+
+    numpy = _use_numpy(use_numpy)
+    if numpy is not None and cover.rectangles:
+        # Columns are row, col, height, width in modules
+        rectangles = numpy.array(cover.rectangles, dtype=numpy.float64)
+        centers = numpy.empty((len(rectangles), 3))
+        centers[:, 0] = start_x + (rectangles[:, 1] + .5 * (rectangles[:, 3] - 1)) * side
+        centers[:, 1] = start_y - (rectangles[:, 0] + .5 * (rectangles[:, 2] - 1)) * side
+        centers[:, 2] = start_z
+        sizes = numpy.empty((len(rectangles), 3))
+        sizes[:, 0] = rectangles[:, 3] * side
+        sizes[:, 1] = rectangles[:, 2] * side
+        sizes[:, 2] = height + base
+        box_centers = _from_numpy(centers)
+        box_sizes = _from_numpy(sizes)
+    else:
+        box_centers = array('d')
+        box_sizes = array('d')
+        box_height = height + base
+        for row, col, rectangle_height, width in cover.rectangles:
+            box_centers.extend((
+                start_x + (col + .5 * (width - 1)) * side, start_y - (row + .5 * (rectangle_height - 1)) * side, start_z
+            ))
+            box_sizes.extend((width * side, rectangle_height * side, box_height))
+
+    if base > 0:
+        full_size = side * qr_size
+        box_centers[0:0] = array('d', (0.0, 0.0, .5 * base))
+        box_sizes[0:0] = array('d', (full_size, full_size, base))
+
+    return BoxLayout(transform_points(box_centers, frame, use_numpy), box_sizes)
+
+
+def module_centers(qr_data: QRMatrix, side: float, z: float = 0.0, frame: Frame = LOCAL_FRAME,
+                   use_numpy: Optional[bool] = None) -> array:
+    """Center of every dark module in row major order, at height z"""
+    size = len(qr_data)
+    half = .5 * (size - 1)
+
+    numpy = _use_numpy(use_numpy)
+    if numpy is not None:
+        index = numpy.flatnonzero(numpy.frombuffer(qr_data.data, dtype=numpy.uint8))
+        centers = numpy.empty((len(index), 3))
+        centers[:, 0] = (index % size - half) * side
+        centers[:, 1] = (half - index // size) * side
+        centers[:, 2] = z
+        local = _from_numpy(centers)
+    else:
+        local = array('d')
+        for index, dark in enumerate(qr_data.data):
+            if dark:
+                row, col = divmod(index, size)
+                local.extend(((col - half) * side, (half - row) * side, z))
+
+    return transform_points(local, frame, use_numpy)
@@ -0,0 +1,128 @@
+"""
+Packed QR module matrix.
+
+Modules are stored one byte per module (0 light, 1 dark) in a single immutable ``bytes`` buffer, row major.
+Rows come back as ``bytes`` slices, so ``matrix[i][j]`` and ``int(col)`` keep working for code written
+against the old list of lists of strings.
+"""
+from typing import Iterable, Iterator, List, Tuple
+
+_TO_ASCII_BITS = bytes.maketrans(b'\x00\x01', b'01')
+_FROM_ASCII_BITS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+class QRMatrix:
+    __slots__ = ('size', '_data', '_hash')
+
+    def __init__(self, size: int = 0, data: bytes = b''):
+        if len(data) != size * size:
+            raise ValueError(f'Expected {size * size} modules for a {size}x{size} matrix, got {len(data)}')
+        self.size = size
+        self._data = bytes(data)
+        self._hash = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable) -> 'QRMatrix':
+        """Build from rows of anything int() understands, for example csv rows or lines of '0' and '1'"""
+        packed = bytearray()
+        size = 0
+        count = 0
+        for row in rows:
+            if len(row) == 0:
+                continue
+            if count == 0:
+                size = len(row)
+            elif len(row) != size:
+                raise ValueError(f'Row {count} has {len(row)} modules, expected {size}')
+            packed.extend(1 if int(col) == 1 else 0 for col in row)
+            count += 1
+
+        if count != size:
+            raise ValueError(f'QR matrix must be square, got {count} rows of {size} modules')
+        return cls(size, packed)
+
+    @classmethod
+    def from_packed_bits(cls, size: int, packed: bytes) -> 'QRMatrix':
+        """Inverse of to_packed_bits"""
+        count = size * size
+        if len(packed) != packed_length(size):
+            raise ValueError(f'Expected {packed_length(size)} bytes for a {size}x{size} matrix, got {len(packed)}')
+        bits = format(int.from_bytes(packed, 'big'), f'0{8 * len(packed)}b')
+        return cls(size, bits[:count].encode('ascii').translate(_FROM_ASCII_BITS))
+
+    @property
+    def data(self) -> bytes:
+        return self._data
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            row, col = index
+            return self._data[row * self.size + col]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('QRMatrix row index out of range')
+        return self._data[index * self.size:(index + 1) * self.size]
+
+    def __iter__(self) -> Iterator[bytes]:
+        size = self.size
+        data = self._data
+        for start in range(0, size * size, size):
+            yield data[start:start + size]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, QRMatrix):
+            return NotImplemented
+        return self.size == other.size and self._data == other._data
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash((self.size, self._data))
+        return self._hash
+
+    def __repr__(self) -> str:
+        return f'QRMatrix(size={self.size}, dark={self.dark_count})'
+
+    @property
+    def dark_count(self) -> int:
+        return self._data.count(1)
+
+    def runs(self, row: int) -> List[Tuple[int, int]]:
+        """(start, end) column pairs, end exclusive, of the dark runs in a row"""
+        data = self._data
+        offset = row * self.size
+        end_of_row = offset + self.size
+        runs = []
+        start = data.find(1, offset, end_of_row)
+        while start >= 0:
+            end = data.find(0, start, end_of_row)
+            if end < 0:
+                end = end_of_row
+            runs.append((start - offset, end - offset))
+            start = data.find(1, end, end_of_row)
+        return runs
+
+    def iter_runs(self) -> Iterator[List[Tuple[int, int]]]:
+        for row in range(self.size):
+            yield self.runs(row)
+
+    def to_rows(self) -> List[List[int]]:
+        return [list(row) for row in self]
+
+    def to_packed_bits(self) -> bytes:
+        """Modules row major, eight per byte with the first in the most significant bit, zero padded"""
+        if self.size == 0:
+            return b''
+        length = packed_length(self.size)
+        padding = 8 * length - self.size * self.size
+        return (int(self._data.translate(_TO_ASCII_BITS), 2) << padding).to_bytes(length, 'big')
+
+    def to_text(self) -> str:
+        return '\n'.join(''.join('1' if col else '0' for col in row) for row in self)
+
+
+def packed_length(size: int) -> int:
+    return (size * size + 7) // 8
@@ -0,0 +1,112 @@
+"""
+Triangle mesh of a QR solid.
+
+The code is treated as a height field on the module grid: dark modules rise to the module top, light modules
+stay at the top of the base plate (or are empty without a base).  Tops and bottoms are one quad per module,
+side walls are only made where neighbouring heights differ, so faces between adjacent modules are culled.
+Walls are split at every height level, which keeps all edges shared and the mesh watertight.
+
+Coordinates are in the local frame used for the solids: centered on the origin, rows running towards -Y,
+z up from the bottom of the base.
+"""
+from array import array
+from collections import namedtuple
+from typing import List, Tuple
+
+from .matrix import QRMatrix
+
+# coordinates: flat x, y, z per vertex.  indices: flat vertex indices, three per triangle
+Mesh = namedtuple('Mesh', ['coordinates', 'indices'])
+
+
+def module_z_range(height: float, base: float) -> Tuple[float, float]:
+    """Bottom and top of a dark module, matching the boxes the solid builders create"""
+    if base > 0:
+        return base, height + 1.5 * base
+    return 0.0, height
+
+
+def outline_extrude_distances(height: float, base: float) -> Tuple[float, float]:
+    """How far the outline strategy extrudes the base plate and the dark profiles, 0 for no plate.
+
+    Both extrudes start at the sketch plane, the dark profiles run through the plate up to the module top of
+    the boxes, so the joined solid is the same as the box one.
+    """
+    return base, module_z_range(height, base)[1]
+
+
+def _grid_coordinates(size: int, side: float, levels: List[float]) -> array:
+    # Every grid corner at every height level, so vertex indices are plain arithmetic.  Corners no face
+    # uses stay in the list, renderers ignore them
+    half = .5 * size
+    xs = [(col - half) * side for col in range(size + 1)]
+    coordinates = array('d')
+    for z in levels:
+        for row in range(size + 1):
+            y = (half - row) * side
+            for x in xs:
+                coordinates.extend((x, y, z))
+    return coordinates
+
+
+def build_mesh(qr_data, side: float, height: float, base: float) -> Mesh:
+    if not isinstance(qr_data, QRMatrix):
+        qr_data = QRMatrix.from_rows(qr_data)
+
+    size = qr_data.size
+    bottom, top = module_z_range(height, base)
+    levels = [0.0, bottom, top] if base > 0 else [0.0, top]
+    top_level = len(levels) - 1
+    light_level = 1 if base > 0 else 0
+
+    # Height level of every module with an empty border around the grid, so neighbours never need bounds checks
+    padded = size + 2
+    level_map = [0] * (padded * padded)
+    for r, row in enumerate(qr_data):
+        offset = (r + 1) * padded + 1
+        for c, dark in enumerate(row):
+            level_map[offset + c] = top_level if dark else light_level
+
+    stride = size + 1
+    layer = stride * stride
+    indices = array('i')
+    quad = indices.extend
+
+    for r in range(size):
+        for c in range(size):
+            cell = (r + 1) * padded + c + 1
+            level = level_map[cell]
+            if level == 0:
+                continue
+
+            # Top faces up, bottom faces down.  Grid rows run towards -Y, so row r + 1 is below row r
+            corner = r * stride + c
+            a, b, d, e = corner, corner + stride, corner + stride + 1, corner + 1
+            t = level * layer
+            quad((t + a, t + b, t + d, t + a, t + d, t + e))
+            quad((a, e, d, a, d, b))
+
+            # Wall edges (from, to) walked so the solid is on the left seen from above
+            for neighbour, p0, p1 in ((cell + 1, d, e), (cell + padded, b, d), (cell - 1, a, b), (cell - padded, e, a)):
+                lower = level_map[neighbour]
+                for z in range(lower, level):
+                    z0 = z * layer
+                    z1 = z0 + layer
+                    quad((z0 + p0, z0 + p1, z1 + p1, z0 + p0, z1 + p1, z1 + p0))
+
+    return Mesh(_grid_coordinates(size, side, levels), indices)
+
+
+def triangle_count(mesh: Mesh) -> int:
+    return len(mesh.indices) // 3
+
+
+def is_watertight(mesh: Mesh) -> bool:
+    """Every directed edge is matched by the same edge in the opposite direction"""
+    edges = {}
+    indices = mesh.indices
+    for k in range(0, len(indices), 3):
+        a, b, c = indices[k], indices[k + 1], indices[k + 2]
+        for edge in ((a, b), (b, c), (c, a)):
+            edges[edge] = edges.get(edge, 0) + 1
+    return all(edges.get((b, a), 0) == count for (a, b), count in edges.items())
@@ -0,0 +1,12 @@
+"""Optional dependencies.  They are slow to import, so each is looked for on first use and remembered."""
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def load_numpy():
+    """The numpy module, or None when it is not installed"""
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    return numpy
@@ -0,0 +1,149 @@
+"""
+Outline tracing for a QR module matrix.
+
+The matrix is traced into closed polygons on the module grid: outer boundaries of dark regions and the
+boundaries of the light holes inside them.  Dark modules are 4-connected, so two dark modules that only
+touch at a corner end up in separate polygons that share a vertex.
+
+Coordinates are module units with x to the right (column) and y downwards (row), the same orientation
+as the matrix rows and an SVG document.  Outer boundaries have a positive signed area, holes negative.
+"""
+from collections import namedtuple
+from typing import Dict, Iterable, List, Tuple
+
+from .matrix import QRMatrix
+
+Polygon = namedtuple('Polygon', ['points', 'is_hole'])
+
+_RIGHT_TURN = {(1, 0): (0, 1), (0, 1): (-1, 0), (-1, 0): (0, -1), (0, -1): (1, 0)}
+
+
+def _is_dark(qr_data, row: int, col: int) -> bool:
+    return 0 <= row < len(qr_data) and 0 <= col < len(qr_data[row]) and int(qr_data[row][col]) == 1
+
+
+def _boundary_edges(qr_data) -> Dict[Tuple[int, int], List[Tuple[int, int]]]:
+    # Every cell side between a dark and a light module becomes a directed edge with the dark module on the
+    # right hand side (in y down coordinates), so each boundary can be walked as a closed loop.
+    edges = {}
+    for r, row in enumerate(qr_data):
+        for c, col in enumerate(row):
+            if int(col) != 1:
+                continue
+            if not _is_dark(qr_data, r - 1, c):
+                edges.setdefault((c, r), []).append((c + 1, r))
+            if not _is_dark(qr_data, r, c + 1):
+                edges.setdefault((c + 1, r), []).append((c + 1, r + 1))
+            if not _is_dark(qr_data, r + 1, c):
+                edges.setdefault((c + 1, r + 1), []).append((c, r + 1))
+            if not _is_dark(qr_data, r, c - 1):
+                edges.setdefault((c, r + 1), []).append((c, r))
+    return edges
+
+
+def _next_vertex(edges, vertex, direction):
+    ends = edges[vertex]
+    if len(ends) > 1:
+        # Two dark modules touch diagonally at this vertex.  Turning right keeps hugging the current
+        # module, which separates the diagonal neighbours into their own polygons.
+        preferred = _RIGHT_TURN[direction]
+        for k, end in enumerate(ends):
+            if (end[0] - vertex[0], end[1] - vertex[1]) == preferred:
+                return ends.pop(k)
+    return ends.pop()
+
+
+def signed_area(points: List[Tuple[int, int]]) -> float:
+    total = 0
+    for k, (x0, y0) in enumerate(points):
+        x1, y1 = points[(k + 1) % len(points)]
+        total += x0 * y1 - x1 * y0
+    return total / 2
+
+
+def _drop_collinear(points: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    corners = []
+    count = len(points)
+    for k, point in enumerate(points):
+        prev = points[k - 1]
+        succ = points[(k + 1) % count]
+        if (point[0] - prev[0], point[1] - prev[1]) != (succ[0] - point[0], succ[1] - point[1]):
+            corners.append(point)
+    return corners
+
+
+def trace_outlines(qr_data) -> List[Polygon]:
+    if not isinstance(qr_data, QRMatrix):
+        qr_data = QRMatrix.from_rows(qr_data)
+    edges = _boundary_edges(qr_data)
+
+    polygons = []
+    for start in sorted(edges):
+        while edges[start]:
+            first = edges[start].pop()
+            direction = (first[0] - start[0], first[1] - start[1])
+            vertex = first
+            points = [start]
+            while True:
+                if vertex == start:
+                    # The loop is only closed if the turn rule leads back onto the first edge, a vertex
+                    # shared by two diagonal modules can be passed once without closing.
+                    edges[start].append(first)
+                    end = _next_vertex(edges, vertex, direction)
+                    if end == first:
+                        break
+                    edges[start].remove(first)
+                else:
+                    end = _next_vertex(edges, vertex, direction)
+                points.append(vertex)
+                direction = (end[0] - vertex[0], end[1] - vertex[1])
+                vertex = end
+
+            corners = _drop_collinear(points)
+            polygons.append(Polygon(corners, signed_area(corners) < 0))
+
+    return polygons
+
+
+def svg_path(polygons: Iterable[Polygon], scale: float = 1.0, flip_y: bool = False, size: int = 0) -> str:
+    """One path string holding every polygon as a closed sub path, use with fill-rule evenodd"""
+    commands = []
+    for polygon in polygons:
+        coords = []
+        for x, y in polygon.points:
+            if flip_y:
+                y = size - y
+            coords.append(f'{x * scale:g} {y * scale:g}')
+        commands.append('M ' + ' L '.join(coords) + ' Z')
+    return ' '.join(commands)
+
+
+def svg_document(polygons: Iterable[Polygon], size: int, scale: float = 1.0, flip_y: bool = False,
+                 units: str = 'cm') -> str:
+    extent = f'{size * scale:g}'
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{extent}{units}" height="{extent}{units}" '
+        f'viewBox="0 0 {extent} {extent}">\n'
+        f'<path fill-rule="evenodd" fill="black" d="{svg_path(polygons, scale, flip_y, size)}"/>\n'
+        '</svg>\n'
+    )
+
+
+def segment_dark_sides(polygons: Iterable[Polygon]) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """
+    Map the doubled midpoint of every polygon segment to the unit normal pointing at its dark side.
+
+    Segments of different polygons never overlap, so any point on a segment identifies it.  Doubling keeps
+    the midpoints on the integer grid.  Used to tell the profiles of a sketch built from the outline apart,
+    a profile is dark if it lies on the dark side of its own outer boundary.
+    """
+    sides = {}
+    for polygon in polygons:
+        points = polygon.points
+        for k, (x0, y0) in enumerate(points):
+            x1, y1 = points[(k + 1) % len(points)]
+            dx = (x1 > x0) - (x1 < x0)
+            dy = (y1 > y0) - (y1 < y0)
+            sides[(x0 + x1, y0 + y1)] = _RIGHT_TURN[(dx, dy)]
+    return sides
@@ -0,0 +1,100 @@
+"""
+Staged recompute for the preview.
+
+Each stage declares the command inputs it reads and the stages it depends on.  A run recomputes a stage
+only when one of its inputs changed or an upstream stage produced a new result, every other stage returns
+its remembered result.  ``run_counts`` records how often each stage actually ran, and every stage that
+runs is recorded as a span on the tracer when one is given and enabled.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+from .trace import Tracer
+
+
+class Stage:
+    __slots__ = ('name', 'function', 'inputs', 'depends', 'always', 'compare')
+
+    def __init__(self, name: str, function: Callable, inputs: Iterable[str] = (), depends: Iterable[str] = (),
+                 always: bool = False, compare: bool = False):
+        self.name = name
+        self.function = function
+        self.inputs = tuple(inputs)
+        self.depends = tuple(depends)
+        # always: run on every pass, for work that does not survive between passes (preview features)
+        self.always = always
+        # compare: stop propagation when a rerun returns a result equal to the previous one
+        self.compare = compare
+
+
+class StagePipeline:
+    def __init__(self, input_keys: Optional[Dict[str, Callable[[Any], Hashable]]] = None,
+                 tracer: Optional[Tracer] = None):
+        self.input_keys = dict(input_keys or {})
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.run_counts: Dict[str, int] = {}
+
+        self._stages: 'OrderedDict[str, Stage]' = OrderedDict()
+        self._results: Dict[str, Any] = {}
+        self._signatures: Dict[str, tuple] = {}
+
+    def add_stage(self, name: str, function: Callable, inputs: Iterable[str] = (), depends: Iterable[str] = (),
+                  always: bool = False, compare: bool = False) -> Stage:
+        """function(input_values, *upstream_results) -> result, stages must be added upstream first"""
+        for upstream in depends:
+            if upstream not in self._stages:
+                raise ValueError(f'Stage {name} depends on unknown stage {upstream}')
+        stage = Stage(name, function, inputs, depends, always, compare)
+        self._stages[name] = stage
+        self.run_counts[name] = 0
+        return stage
+
+    def _signature(self, stage: Stage, input_values: dict) -> tuple:
+        signature = []
+        for input_id in stage.inputs:
+            value = input_values.get(input_id)
+            key = self.input_keys.get(input_id)
+            signature.append(key(value) if key is not None else value)
+        return tuple(signature)
+
+    def run(self, input_values: dict) -> Dict[str, Any]:
+        changed = set()
+        for name, stage in self._stages.items():
+            signature = self._signature(stage, input_values)
+            stale = (
+                stage.always or
+                name not in self._results or
+                signature != self._signatures.get(name) or
+                any(upstream in changed for upstream in stage.depends)
+            )
+            if not stale:
+                continue
+
+            previous = self._results.pop(name, None)
+            with self.tracer.span(f'stage.{name}'):
+                result = stage.function(input_values, *(self._results[upstream] for upstream in stage.depends))
+            self.run_counts[name] += 1
+            self._results[name] = result
+            self._signatures[name] = signature
+
+            if not (stage.compare and previous is not None and previous == result):
+                changed.add(name)
+
+        return self._results
+
+    def result(self, name: str, default=None):
+        return self._results.get(name, default)
+
+    def invalidate(self, name: Optional[str] = None):
+        """Forget a stage and everything downstream of it, or every stage"""
+        if name is None:
+            self._results.clear()
+            self._signatures.clear()
+            return
+
+        dropped = {name}
+        for stage_name, stage in self._stages.items():
+            if stage_name in dropped or dropped.intersection(stage.depends):
+                dropped.add(stage_name)
+                self._results.pop(stage_name, None)
+                self._signatures.pop(stage_name, None)
@@ -0,0 +1,201 @@
+"""
+Tables for the built-in QR encoder.
+
+Everything that depends only on the version and error level is computed once at import: GF(256) log and
+antilog tables, generator polynomials for every error correction block size, block layouts, data
+capacities, alignment pattern positions and the BCH coded format and version fields.
+"""
+from typing import Dict, List, Tuple
+
+MODES = {
+    'numeric': 1,
+    'alphanumeric': 2,
+    'binary': 4,
+    'kanji': 8,
+}
+
+# Same aliases pyqrcode accepts for the error level
+ERROR_LEVELS = {
+    'L': 'L', 'l': 'L', '7%': 'L', .7: 'L',
+    'M': 'M', 'm': 'M', '15%': 'M', .15: 'M',
+    'Q': 'Q', 'q': 'Q', '25%': 'Q', .25: 'Q',
+    'H': 'H', 'h': 'H', '30%': 'H', .30: 'H',
+}
+
+# Two bit error level indicator used in the format field
+ERROR_BITS = {'L': 1, 'M': 0, 'Q': 3, 'H': 2}
+
+ALPHANUMERIC = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:'
+ALPHANUMERIC_CODES = {ord(char): code for code, char in enumerate(ALPHANUMERIC)}
+
+# Error correction code words per block and number of blocks, indexed [error][version]
+_EC_CODEWORDS = {
+    'L': [0, 7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30, 28, 28,
+          28, 28, 30, 30, 26, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30],
+    'M': [0, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26,
+          26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28],
+    'Q': [0, 13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28, 26, 30,
+          28, 30, 30, 30, 30, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30],
+    'H': [0, 17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28, 26, 28,
+          30, 24, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30],
+}
+_EC_BLOCKS = {
+    'L': [0, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8,
+          8, 9, 9, 10, 12, 12, 12, 13, 14, 15, 16, 17, 18, 19, 19, 20, 21, 22, 24, 25],
+    'M': [0, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16,
+          17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49],
+    'Q': [0, 1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20,
+          23, 23, 25, 27, 29, 34, 34, 35, 38, 40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68],
+    'H': [0, 1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25,
+          25, 34, 30, 32, 35, 37, 40, 42, 45, 48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81],
+}
+
+
+def version_size(version: int) -> int:
+    return 17 + 4 * version
+
+
+def _build_gf_tables() -> Tuple[List[int], List[int]]:
+    exp = [0] * 512
+    log = [0] * 256
+    value = 1
+    for power in range(255):
+        exp[power] = value
+        log[value] = power
+        value <<= 1
+        if value & 0x100:
+            value ^= 0x11D
+    # Doubled so exp[log[a] + log[b]] never needs a modulo
+    for power in range(255, 512):
+        exp[power] = exp[power - 255]
+    return exp, log
+
+
+GF_EXP, GF_LOG = _build_gf_tables()
+
+
+def _generator_polynomial(degree: int) -> List[int]:
+    # Coefficients of prod(x - alpha^i) for i < degree, leading 1 first
+    poly = [1]
+    for i in range(degree):
+        factor = GF_EXP[i]
+        result = [0] * (len(poly) + 1)
+        for k, coefficient in enumerate(poly):
+            result[k] ^= coefficient
+            if coefficient:
+                result[k + 1] ^= GF_EXP[GF_LOG[coefficient] + GF_LOG[factor]]
+        poly = result
+    return poly
+
+
+def raw_codewords(version: int) -> int:
+    """Data and error correction code words that fit a version, remainder bits left out"""
+    modules = (16 * version + 128) * version + 64
+    if version >= 2:
+        alignment_count = version // 7 + 2
+        modules -= (25 * alignment_count - 10) * alignment_count - 55
+        if version >= 7:
+            modules -= 36
+    return modules // 8
+
+
+def _block_layout(version: int, error: str) -> Tuple[int, int, int, int, int]:
+    # (ec words per block, group 1 blocks, group 1 data words, group 2 blocks, group 2 data words)
+    ec_words = _EC_CODEWORDS[error][version]
+    blocks = _EC_BLOCKS[error][version]
+    raw = raw_codewords(version)
+    short_blocks = blocks - raw % blocks
+    short_data = raw // blocks - ec_words
+    long_blocks = blocks - short_blocks
+    return ec_words, short_blocks, short_data, long_blocks, short_data + 1 if long_blocks else 0
+
+
+def _alignment_positions(version: int) -> List[int]:
+    if version == 1:
+        return []
+    count = version // 7 + 2
+    step = 26 if version == 32 else (version * 4 + count * 2 + 1) // (count * 2 - 2) * 2
+    positions = [version_size(version) - 7 - k * step for k in range(count - 1)] + [6]
+    return positions[::-1]
+
+
+def length_bits(version: int, mode: int) -> int:
+    """Width of the character count field of a segment"""
+    if version <= 9:
+        return {1: 10, 2: 9, 4: 8, 8: 8}[mode]
+    elif version <= 26:
+        return {1: 12, 2: 11, 4: 16, 8: 10}[mode]
+    return {1: 14, 2: 13, 4: 16, 8: 12}[mode]
+
+
+def _mode_capacity(data_bits: int, version: int, mode: int) -> int:
+    available = data_bits - 4 - length_bits(version, mode)
+    if mode == 1:
+        count = available // 10 * 3
+        remainder = available % 10
+        count += 2 if remainder >= 7 else 1 if remainder >= 4 else 0
+    elif mode == 2:
+        count = available // 11 * 2 + (1 if available % 11 >= 6 else 0)
+    elif mode == 4:
+        count = available // 8
+    else:
+        count = available // 13
+    return min(count, (1 << length_bits(version, mode)) - 1)
+
+
+def _format_bits(error: str, mask: int) -> int:
+    data = ERROR_BITS[error] << 3 | mask
+    remainder = data
+    for _ in range(10):
+        remainder = (remainder << 1) ^ ((remainder >> 9) * 0x537)
+    return (data << 10 | remainder & 0x3FF) ^ 0x5412
+
+
+def _version_bits(version: int) -> int:
+    remainder = version
+    for _ in range(12):
+        remainder = (remainder << 1) ^ ((remainder >> 11) * 0x1F25)
+    return version << 12 | remainder & 0xFFF
+
+
+BLOCK_LAYOUT: Dict[int, Dict[str, Tuple[int, int, int, int, int]]] = {
+    version: {error: _block_layout(version, error) for error in 'LMQH'} for version in range(1, 41)
+}
+
+GENERATOR_POLYNOMIALS: Dict[int, List[int]] = {
+    degree: _generator_polynomial(degree)
+    for degree in sorted({layout[0] for levels in BLOCK_LAYOUT.values() for layout in levels.values()})
+}
+
+
+def _data_bits(version: int, error: str) -> int:
+    ec_words, blocks_1, data_1, blocks_2, data_2 = BLOCK_LAYOUT[version][error]
+    return 8 * (blocks_1 * data_1 + blocks_2 * data_2)
+
+
+# [version][error] -> {0: data bits, mode: character capacity}, laid out like pyqrcode's data_capacity
+DATA_CAPACITY = {
+    version: {
+        error: dict(
+            [(0, _data_bits(version, error))] +
+            [(mode, _mode_capacity(_data_bits(version, error), version, mode)) for mode in MODES.values()]
+        )
+        for error in 'LMQH'
+    }
+    for version in range(1, 41)
+}
+
+ALIGNMENT_POSITIONS = [None] + [_alignment_positions(version) for version in range(1, 41)]
+FORMAT_BITS = {error: [_format_bits(error, mask) for mask in range(8)] for error in 'LMQH'}
+VERSION_BITS = [None] * 7 + [_version_bits(version) for version in range(7, 41)]
+
+MASK_PATTERNS = [
+    lambda row, col: (row + col) % 2 == 0,
+    lambda row, col: row % 2 == 0,
+    lambda row, col: col % 3 == 0,
+    lambda row, col: (row + col) % 3 == 0,
+    lambda row, col: ((row // 2) + (col // 3)) % 2 == 0,
+    lambda row, col: ((row * col) % 2) + ((row * col) % 3) == 0,
+    lambda row, col: (((row * col) % 2) + ((row * col) % 3)) % 2 == 0,
+    lambda row, col: (((row + col) % 2) + ((row * col) % 3)) % 2 == 0,
+]
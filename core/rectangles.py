@@ -0,0 +1,73 @@
+"""
+Rectangle cover for a QR module matrix.
+
+Dark modules are merged into horizontal runs, then identical runs on consecutive rows are stacked
+into a single rectangle.  The geometry builders create one box per rectangle instead of one per module.
+"""
+from collections import namedtuple
+from typing import Iterable, List, Tuple
+
+from .matrix import QRMatrix
+
+# row/col are the top left module, height/width are measured in modules
+Rectangle = namedtuple('Rectangle', ['row', 'col', 'height', 'width'])
+
+
+class RectangleCover(namedtuple('RectangleCover', ['rectangles', 'module_count'])):
+    __slots__ = ()
+
+    @property
+    def box_count(self) -> int:
+        return len(self.rectangles)
+
+    @property
+    def boxes_saved(self) -> int:
+        return self.module_count - len(self.rectangles)
+
+
+def row_runs(row) -> List[Tuple[int, int]]:
+    """Return (start, end) column pairs, end exclusive, for every run of dark modules in a row"""
+    runs = []
+    start = -1
+    for j, col in enumerate(row):
+        if int(col) == 1:
+            if start < 0:
+                start = j
+        elif start >= 0:
+            runs.append((start, j))
+            start = -1
+    if start >= 0:
+        runs.append((start, len(row)))
+    return runs
+
+
+def merge_rectangles(qr_data: Iterable) -> RectangleCover:
+    rectangles = []
+    module_count = 0
+
+    # (start, end) -> [first row, height] for runs that are still growing downwards
+    if isinstance(qr_data, QRMatrix):
+        all_runs = qr_data.iter_runs()
+    else:
+        all_runs = (row_runs(row) for row in qr_data)
+
+    open_runs = {}
+    for i, runs in enumerate(all_runs):
+        next_runs = {}
+        for run in runs:
+            module_count += run[1] - run[0]
+            stack = open_runs.pop(run, None)
+            if stack is None:
+                stack = [i, 0]
+            stack[1] += 1
+            next_runs[run] = stack
+
+        for (start, end), (first_row, height) in open_runs.items():
+            rectangles.append(Rectangle(first_row, start, height, end - start))
+        open_runs = next_runs
+
+    for (start, end), (first_row, height) in open_runs.items():
+        rectangles.append(Rectangle(first_row, start, height, end - start))
+
+    rectangles.sort()
+    return RectangleCover(rectangles, module_count)
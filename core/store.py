@@ -0,0 +1,326 @@
+"""
+Persistent, content addressed cache for matrices and layout plans, kept in a SQLite file.
+
+Keys are SHA-256 hashes of everything a value depends on (see ``make_key``), values are compact byte strings:
+packed matrices (``pack_matrix``) and rectangle covers (``pack_cover``).  The least recently used entries are
+removed once the stored values pass ``max_bytes``.
+
+The file can be shared by the add-in and any number of batch processes: it runs in WAL mode, so readers do not
+block the writer, and writers wait on each other for up to ``timeout`` seconds.  Any database error is treated
+as a miss, a broken or locked cache never stops a code from being built.
+
+Hits, misses, bytes read and the build time the hits saved are counted in the file itself, so they add up
+over sessions and processes.  Lookups only read the file: the counts and the last use times of the entries
+that were hit are kept in memory and written in one transaction every ``flush_every`` lookups, with the next
+``put``, and on ``flush``, ``stats`` and ``close``.
+
+    python -m core.store cache.sqlite          # print the stats
+    python -m core.store cache.sqlite --clear
+"""
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from typing import Optional
+
+from . import encoder
+from .matrix import QRMatrix
+from .rectangles import Rectangle, RectangleCover, merge_rectangles
+
+# Part of every key, bump it when a stored format or what the encoder produces changes
+STORE_VERSION = 1
+
+KIND_MATRIX = 'matrix'
+KIND_COVER = 'cover'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    data BLOB NOT NULL,
+    bytes INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+'''
+
+_COUNTERS = ('hits', 'misses', 'bytes_read', 'seconds_saved', 'evictions')
+
+
+def make_key(kind: str, *parts) -> str:
+    """Hash of the kind of value and everything it is computed from, parts must be JSON serializable"""
+    text = json.dumps([STORE_VERSION, kind, *parts], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def message_identity(message: str, options: dict) -> tuple:
+    """Message, version, mode and error level with the encoder defaults filled in, the same for every request
+    that makes the same code, so it keys the matrix in the disk cache and in the add-in's memory cache"""
+    return message, options.get('version'), options.get('mode'), options.get('error', 'H')
+
+
+def matrix_digest(qr_data: QRMatrix) -> str:
+    """Content hash of a matrix, for keys of values computed from it"""
+    return hashlib.sha256(pack_matrix(qr_data)).hexdigest()
+
+
+def pack_matrix(qr_data: QRMatrix) -> bytes:
+    return struct.pack('<H', len(qr_data)) + qr_data.to_packed_bits()
+
+
+def unpack_matrix(data: bytes) -> QRMatrix:
+    size, = struct.unpack_from('<H', data)
+    if size == 0:
+        return QRMatrix()
+    return QRMatrix.from_packed_bits(size, data[2:])
+
+
+def pack_cover(cover: RectangleCover) -> bytes:
+    # Rows, columns and extents are below 256 for every QR version
+    values = array('B', (value for rectangle in cover.rectangles for value in rectangle))
+    return struct.pack('<I', cover.module_count) + values.tobytes()
+
+
+def unpack_cover(data: bytes) -> RectangleCover:
+    module_count, = struct.unpack_from('<I', data)
+    values = iter(data[4:])
+    return RectangleCover(list(map(Rectangle._make, zip(values, values, values, values))), module_count)
+
+
+class DiskCache:
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, timeout: float = 5.0, flush_every: int = 64):
+        # sqlite3 takes a while to load, only the processes that use the cache pay for it
+        import sqlite3
+        self._errors = (sqlite3.Error,)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.errors = 0
+        self._lock = threading.Lock()
+        # Counts and last use times of hit entries not written yet
+        self._pending = dict.fromkeys(_COUNTERS[:4], 0)
+        self._used = {}
+        self._lookups = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self) -> 'DiskCache':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Later calls fail with sqlite3.ProgrammingError, which counts as a miss like any other database error
+        with self._lock:
+            try:
+                self._flush()
+            except self._errors:
+                self.errors += 1
+            self._connection.close()
+
+    def _count(self, **amounts):
+        for name, amount in amounts.items():
+            if amount:
+                self._connection.execute(
+                    'INSERT INTO counters (name, value) VALUES (?, ?) '
+                    'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+                    (name, amount)
+                )
+
+    def _write_pending(self):
+        # Runs inside the transaction of the caller
+        self._connection.executemany('UPDATE entries SET used = ? WHERE key = ?',
+                                     [(used, key) for key, used in self._used.items()])
+        self._count(**self._pending)
+
+    def _reset_pending(self):
+        self._pending = dict.fromkeys(self._pending, 0)
+        self._used = {}
+        self._lookups = 0
+
+    def _flush(self):
+        if self._lookups == 0:
+            return
+        with self._connection:
+            self._connection.execute('BEGIN IMMEDIATE')
+            self._write_pending()
+        self._reset_pending()
+
+    def flush(self):
+        """Write the counts and use times kept in memory"""
+        with self._lock:
+            try:
+                self._flush()
+            except self._errors:
+                self.errors += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            try:
+                row = self._connection.execute('SELECT data, seconds FROM entries WHERE key = ?', (key,)).fetchone()
+            except self._errors:
+                self.errors += 1
+                return None
+
+            self._lookups += 1
+            if row is None:
+                self._pending['misses'] += 1
+            else:
+                self._pending['hits'] += 1
+                self._pending['bytes_read'] += len(row[0])
+                self._pending['seconds_saved'] += row[1]
+                self._used[key] = time.time()
+            if self._lookups >= self.flush_every:
+                try:
+                    self._flush()
+                except self._errors:
+                    self.errors += 1
+            return None if row is None else bytes(row[0])
+
+    def put(self, key: str, kind: str, data: bytes, seconds: float = 0.0):
+        """Store a value with the time it took to compute, then evict down to max_bytes"""
+        with self._lock:
+            try:
+                with self._connection:
+                    self._connection.execute('BEGIN IMMEDIATE')
+                    self._connection.execute(
+                        'INSERT OR REPLACE INTO entries (key, kind, data, bytes, seconds, used) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (key, kind, data, len(data), seconds, time.time())
+                    )
+                    # Pending use times first, so eviction sees the entries this process read
+                    self._write_pending()
+                    self._evict()
+                self._reset_pending()
+            except self._errors:
+                self.errors += 1
+
+    def _evict(self):
+        total, = self._connection.execute('SELECT COALESCE(SUM(bytes), 0) FROM entries').fetchone()
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._connection.execute('SELECT key, bytes FROM entries ORDER BY used').fetchall():
+            if total <= self.max_bytes:
+                break
+            self._connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        self._count(evictions=evicted)
+
+    def clear(self):
+        with self._lock:
+            try:
+                with self._connection:
+                    self._connection.execute('DELETE FROM entries')
+                    self._connection.execute('DELETE FROM counters')
+                self._connection.execute('VACUUM')
+                self._reset_pending()
+            except self._errors:
+                self.errors += 1
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            try:
+                self._flush()
+                counters = dict(self._connection.execute('SELECT name, value FROM counters').fetchall())
+                entries, stored = self._connection.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries'
+                ).fetchone()
+            except self._errors:
+                self.errors += 1
+                counters, entries, stored = {}, 0, 0
+
+        stats = {name: counters.get(name, 0) for name in _COUNTERS}
+        for name in ('hits', 'misses', 'bytes_read', 'evictions'):
+            stats[name] = int(stats[name])
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'entries': entries,
+            'bytes': stored,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+            'errors': self.errors,
+        })
+        return stats
+
+
+def open_cache(path: str, max_bytes: int) -> Optional[DiskCache]:
+    """The cache at path, or None when it can not be opened, for example from a read only folder"""
+    try:
+        return DiskCache(path, max_bytes)
+    except Exception:
+        return None
+
+
+def encode_cached(cache: Optional[DiskCache], message: str, options: dict) -> QRMatrix:
+    """encoder.encode(message, **options) through the cache, messages that fail to encode are not stored"""
+    if cache is None:
+        return encoder.encode(message, **options)
+
+    key = make_key(KIND_MATRIX, *message_identity(message, options))
+    data = cache.get(key)
+    if data is not None:
+        return unpack_matrix(data)
+    start = time.perf_counter()
+    qr_data = encoder.encode(message, **options)
+    cache.put(key, KIND_MATRIX, pack_matrix(qr_data), time.perf_counter() - start)
+    return qr_data
+
+
+def merge_cached(cache: Optional[DiskCache], qr_data: QRMatrix) -> RectangleCover:
+    """merge_rectangles(qr_data) through the cache"""
+    if cache is None:
+        return merge_rectangles(qr_data)
+
+    key = make_key(KIND_COVER, matrix_digest(qr_data))
+    data = cache.get(key)
+    if data is not None:
+        return unpack_cover(data)
+    start = time.perf_counter()
+    cover = merge_rectangles(qr_data)
+    cache.put(key, KIND_COVER, pack_cover(cover), time.perf_counter() - start)
+    return cover
+
+
+def _main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m core.store', description='Show or clear a QR cache file')
+    parser.add_argument('path')
+    parser.add_argument('--clear', action='store_true')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f'{args.path} does not exist', file=sys.stderr)
+        return 2
+    with DiskCache(args.path) as cache:
+        if args.clear:
+            cache.clear()
+        stats = cache.stats
+    print(
+        f'{stats["entries"]} entries, {stats["bytes"] / 1e6:.2f} MB stored\n'
+        f'{stats["hits"]} hits, {stats["misses"]} misses, hit rate {stats["hit_rate"]:.1%}\n'
+        f'{stats["bytes_read"] / 1e6:.2f} MB read from the cache, {stats["seconds_saved"]:.1f} s of encoding saved\n'
+        f'{stats["evictions"]} evicted'
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(_main())
@@ -0,0 +1,163 @@
+"""
+Lightweight timing spans kept in a fixed size ring buffer.
+
+    with tracer.span('solid', boxes=len(cover.rectangles)) as span:
+        ...
+        span.set(unions=count)
+
+Spans nest, each records its start, duration, depth, thread and any counts passed to it.  With memory
+tracking on, the change in traced python memory is recorded as well.  The buffer keeps the latest
+``capacity`` spans and can be written as plain JSON or as a Chrome trace (chrome://tracing, Perfetto).
+
+When the tracer is disabled ``span`` returns one shared object that does nothing, so instrumented code
+costs an attribute check and a function call.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **values):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+# Only imported once memory tracking is turned on
+_tracemalloc = None
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'args', 'start', 'depth', 'memory')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def set(self, **values):
+        self.args.update(values)
+
+    def __enter__(self):
+        local = self.tracer._local
+        self.depth = getattr(local, 'depth', 0)
+        local.depth = self.depth + 1
+        self.memory = _tracemalloc.get_traced_memory()[0] if self.tracer.memory else None
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter_ns() - self.start
+        self.tracer._local.depth = self.depth
+        if self.memory is not None and _tracemalloc.is_tracing():
+            self.args['memory_delta'] = _tracemalloc.get_traced_memory()[0] - self.memory
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._events.append(
+            (self.name, self.start, duration, self.depth, threading.get_ident(), self.args)
+        )
+        return False
+
+
+class Tracer:
+    def __init__(self, capacity: int = 4096, enabled: bool = False, memory: bool = False):
+        self.enabled = False
+        self.memory = False
+        self._events = deque(maxlen=capacity)
+        self._local = threading.local()
+        if enabled:
+            self.enable(memory)
+
+    @property
+    def capacity(self) -> int:
+        return self._events.maxlen
+
+    def configure(self, capacity: int, enabled: bool, memory: bool = False):
+        if capacity != self._events.maxlen:
+            self._events = deque(self._events, maxlen=capacity)
+        if enabled:
+            self.enable(memory)
+        else:
+            self.disable()
+
+    def enable(self, memory: bool = False):
+        global _tracemalloc
+        if memory:
+            if _tracemalloc is None:
+                import tracemalloc
+                _tracemalloc = tracemalloc
+            if not _tracemalloc.is_tracing():
+                _tracemalloc.start()
+        else:
+            # Tracing memory slows down all python code, so it stops as soon as it is not wanted
+            self._stop_memory()
+        self.memory = memory
+        self.enabled = True
+
+    def disable(self):
+        self._stop_memory()
+        self.enabled = False
+
+    def _stop_memory(self):
+        if _tracemalloc is not None and _tracemalloc.is_tracing():
+            _tracemalloc.stop()
+        self.memory = False
+
+    def span(self, name: str, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, args)
+
+    def clear(self):
+        self._events.clear()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def events(self) -> List[dict]:
+        """Finished spans, oldest first.  Times are in microseconds from the first span in the buffer"""
+        events = list(self._events)
+        origin = min((event[1] for event in events), default=0)
+        return [
+            {
+                'name': name, 'start_us': (start - origin) / 1000, 'duration_us': duration / 1000,
+                'depth': depth, 'thread': thread, 'args': args,
+            }
+            for name, start, duration, depth, thread, args in sorted(events, key=lambda event: event[1])
+        ]
+
+    def chrome_trace(self) -> dict:
+        pid = os.getpid()
+        return {
+            'traceEvents': [
+                {
+                    'name': event['name'], 'ph': 'X', 'ts': event['start_us'], 'dur': event['duration_us'],
+                    'pid': pid, 'tid': event['thread'], 'args': event['args'],
+                }
+                for event in self.events()
+            ],
+            'displayTimeUnit': 'ms',
+        }
+
+    def dump(self, file_name: str, chrome: Optional[bool] = None):
+        """Write the buffer, as a Chrome trace when chrome is set or the name ends in .trace.json"""
+        import json
+        if chrome is None:
+            chrome = file_name.lower().endswith('.trace.json')
+        with open(file_name, 'w') as f:
+            json.dump(self.chrome_trace() if chrome else {'events': self.events()}, f, indent=1, default=str)
+
+
+# Shared by the add-in, configured from config.py when the command module loads
+tracer = Tracer()
@@ -0,0 +1,76 @@
+"""
+Union scheduling for temporary bodies.
+
+Unioning every box into one growing body makes each boolean more expensive than the last.  The balanced
+scheduler combines bodies pairwise so every boolean acts on operands of similar, small size.
+
+A backend only needs a ``union(target, tool)`` method that merges ``tool`` into ``target`` in place,
+which matches ``TemporaryBRepManager.booleanOperation``.
+"""
+import heapq
+from typing import List, Optional, Sequence
+
+
+class UnionBackend:
+    def union(self, target, tool):
+        raise NotImplementedError
+
+
+def sequential_union(bodies: Sequence, backend: UnionBackend) -> Optional[object]:
+    """Accumulate every body into the first one.  Kept for comparison with the balanced scheduler"""
+    if len(bodies) == 0:
+        return None
+
+    target = bodies[0]
+    for tool in bodies[1:]:
+        backend.union(target, tool)
+    return target
+
+
+def balanced_union(bodies: Sequence, backend: UnionBackend) -> Optional[object]:
+    """Union bodies pairwise in a balanced tree, returns the body holding the result"""
+    level: List = list(bodies)
+    if len(level) == 0:
+        return None
+
+    while len(level) > 1:
+        next_level = []
+        for k in range(0, len(level) - 1, 2):
+            backend.union(level[k], level[k + 1])
+            next_level.append(level[k])
+        if len(level) % 2 == 1:
+            next_level.append(level[-1])
+        level = next_level
+
+    return level[0]
+
+
+def batched_union(bodies: Sequence, backend: UnionBackend, batch_size: int = 32) -> Optional[object]:
+    """Union consecutive batches (for example one row of boxes) balanced, then combine the batches balanced"""
+    batches = [
+        balanced_union(bodies[k:k + batch_size], backend)
+        for k in range(0, len(bodies), max(1, batch_size))
+    ]
+    return balanced_union(batches, backend)
+
+
+def smallest_first_union(bodies: Sequence, weights: Sequence[int], backend: UnionBackend) -> Optional[object]:
+    """Always union the two lightest bodies, weights are sizes such as box counts.
+
+    For bodies of very different size, like the connected components of a code, this keeps large bodies out
+    of all but the last few booleans, the same way a Huffman tree keeps rare symbols deep.
+    """
+    if len(bodies) == 0:
+        return None
+
+    # The position breaks ties, bodies themselves are never compared
+    heap = [(weight, position, body) for position, (weight, body) in enumerate(zip(weights, bodies))]
+    heapq.heapify(heap)
+    position = len(heap)
+    while len(heap) > 1:
+        weight, _, target = heapq.heappop(heap)
+        tool_weight, _, tool = heapq.heappop(heap)
+        backend.union(target, tool)
+        heapq.heappush(heap, (weight + tool_weight, position, target))
+        position += 1
+    return heap[0][2]
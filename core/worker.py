@@ -0,0 +1,85 @@
+"""
+Single background thread that only cares about the latest request.
+
+Encoding and planning are pure python and can run off the UI thread.  While the user types, every keystroke
+submits a job, so a job that has not started yet is replaced by the next one and only the newest is run.  A
+job already running can not be interrupted; its result is reported as stale instead, and ``notify`` is only
+called for the latest job.  ``notify`` runs on the worker thread, the host hands the result over to its
+main thread from there (in Fusion 360 by firing a custom event).
+"""
+import threading
+import time
+from collections import namedtuple
+from typing import Any, Callable, Optional
+
+Job = namedtuple('Job', ['number', 'function', 'args'])
+JobResult = namedtuple('JobResult', ['number', 'value', 'error', 'seconds'])
+
+
+class LatestWorker:
+    def __init__(self, notify: Callable[[JobResult], None], name: str = 'qrcoder-worker'):
+        self.notify = notify
+        self.name = name
+        self.latest = 0
+        self.stale = 0
+
+        self._pending: Optional[Job] = None
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def submit(self, function: Callable[..., Any], *args) -> int:
+        """Queue function(*args) in place of any job that has not started, returns the job number"""
+        with self._condition:
+            self.latest += 1
+            if self._pending is not None:
+                self.stale += 1
+            self._pending = Job(self.latest, function, args)
+            self._stopped = False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+            return self.latest
+
+    def is_current(self, number: int) -> bool:
+        return number == self.latest
+
+    def cancel(self):
+        """Drop the pending job and mark the running one stale"""
+        with self._condition:
+            if self._pending is not None:
+                self.stale += 1
+            self._pending = None
+            self.latest += 1
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._condition:
+            self._stopped = True
+            self._pending = None
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                job = self._pending
+                self._pending = None
+
+            start = time.perf_counter()
+            try:
+                result = JobResult(job.number, job.function(*job.args), None, 0.0)
+            except Exception as e:
+                # Handed back to the main thread, which decides how to report it
+                result = JobResult(job.number, None, e, 0.0)
+            result = result._replace(seconds=time.perf_counter() - start)
+
+            if self.is_current(job.number):
+                self.notify(result)
+            else:
+                self.stale += 1
@@ -57,6 +57,20 @@ BASE = .5
 # File assumed to be in script root directory
 FILE_NAME = 'QR-17x.csv'
 
+
+def balanced_union(b_mgr, bodies):
+    # Union pairwise so each boolean works on small operands instead of one ever growing body
+    while len(bodies) > 1:
+        next_bodies = []
+        for k in range(0, len(bodies) - 1, 2):
+            b_mgr.booleanOperation(bodies[k], bodies[k + 1], adsk.fusion.BooleanTypes.UnionBooleanType)
+            next_bodies.append(bodies[k])
+        if len(bodies) % 2 == 1:
+            next_bodies.append(bodies[-1])
+        bodies = next_bodies
+    return bodies[0]
+
+
 def run(context):
     ui = None
     try:
@@ -85,17 +99,16 @@ def run(context):
         y_dir = sketch_point.parentSketch.yDirection
         y_dir.normalize()
 
-        start_point = middle_point.copy()
-        x_start_move = x_dir.copy()
-        x_start_move.scaleBy((.5 * BLOCK) * (1 - qr_size))
-        start_point.translateBy(x_start_move)
-        y_start_move = y_dir.copy()
-        y_start_move.scaleBy((.5 * BLOCK) * (qr_size-1))
-        start_point.translateBy(y_start_move)
+        # Box centers are worked out with plain floats from the sketch frame, one API call per point
+        ox, oy, oz = middle_point.x, middle_point.y, middle_point.z
+        xx, xy, xz = x_dir.x, x_dir.y, x_dir.z
+        yx, yy, yz = y_dir.x, y_dir.y, y_dir.z
+        start_x = (.5 * BLOCK) * (1 - qr_size)
+        start_y = (.5 * BLOCK) * (qr_size - 1)
 
         size = BLOCK * qr_size
         base_t_box = adsk.core.OrientedBoundingBox3D.create(middle_point, x_dir, y_dir, size, size, BASE)
-        base_t_body = b_mgr.createBox(base_t_box)
+        t_bodies = [b_mgr.createBox(base_t_box)]
 
         component = sketch_point.parentSketch.parentComponent
         base_feature = component.features.baseFeatures.add()
@@ -106,22 +119,16 @@ def run(context):
         for i, row in enumerate(qr_data):
             for j, col in enumerate(row):
                 if int(col) == 1:
-                    c_point = start_point.copy()
-                    x_move = x_dir.copy()
-                    y_move = y_dir.copy()
-
-                    x_move.scaleBy(j * BLOCK)
-                    y_move.scaleBy(-1 * i * BLOCK)
-
-                    c_point.translateBy(x_move)
-                    c_point.translateBy(y_move)
+                    u = start_x + j * BLOCK
+                    v = start_y - i * BLOCK
+                    c_point = adsk.core.Point3D.create(ox + u * xx + v * yx, oy + u * xy + v * yy, oz + u * xz + v * yz)
 
                     b_box = adsk.core.OrientedBoundingBox3D.create(c_point, x_dir, y_dir, BLOCK, BLOCK, HEIGHT + BASE)
-                    t_body = b_mgr.createBox(b_box)
-                    b_mgr.booleanOperation(base_t_body, t_body, adsk.fusion.BooleanTypes.UnionBooleanType)
+                    t_bodies.append(b_mgr.createBox(b_box))
                     # real_body = component.bRepBodies.add(t_body, base_feature)
                     # tools.add(real_body)
 
+        base_t_body = balanced_union(b_mgr, t_bodies)
         real_body = component.bRepBodies.add(base_t_body, base_feature)
 
         base_feature.finishEdit()